@@ -3,28 +3,128 @@ import re
 import json  
 import time  
 import asyncio    
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
   
 from dotenv import load_dotenv  
 from logs import logger  
+from pipeline import RecognitionPipeline, PARTIAL, FINAL
+from dispatcher import TranslationDispatcher
+from cache import CacheKey, TranslationCache, PersistentTranslationCache, NearDuplicateIndex, NearDuplicateHit
+from router import AdaptiveRouter
+from memory import TranslationMemory
+from policy import PartialPolicy, TRANSLATE
+from writer import TranscriptWriter
+from captions import CaptionState, CaptionTrack
+from history import TranscriptHistory
+from segments import SegmentStore, FORMATS, export_segments, index_path
+from emitter import AsyncEmitter
+from fanout import CaptionPublisher
+from outbound import ClientOutbox
+from audio import AudioRingBuffer, AudioStreamPump, WavFileSource, MicrophoneSource, BLOCK, DROP_OLDEST
+from recognizers import AzureRecognizer, VoskRecognizer, load_speech_sdk
+from backends import TranslatorBackends
+import metrics
+from sentences import SentenceBuffer, layout_paragraphs, split_into_sentences
 from re import finditer    
 from datetime import timedelta, datetime    
 from threading import Thread, Event, Lock    
   
-import azure.cognitiveservices.speech as speechsdk    
-from azure.ai.translation.text import TextTranslationClient    
-from azure.core.exceptions import HttpResponseError    
-from azure.core.credentials import AzureKeyCredential    
-from google.cloud import translate    
-  
-import deepl    
-  
-from flask import Flask, render_template, jsonify, request
-from flask_socketio import SocketIO    
-from cachetools import TTLCache    
-  
+from flask import Flask, Response, render_template, jsonify, request
+from flask_socketio import SocketIO, join_room, emit    
+  
+# 伺服器模式："asgi" 以單一事件循環同時執行 Socket.IO（python-socketio AsyncServer + uvicorn）與翻譯管線；
+# "threading" 為相容模式，Flask-SocketIO 執行緒模式搭配獨立的翻譯事件循環執行緒
+SERVER_MODE = "asgi"
+HOST = "0.0.0.0"
+PORT = 5015
+# 字幕水平擴展的訊息佇列（None 表示停用）："tcp://主機:埠"（fanout.py 內建的本機代理）或 "redis://主機:埠/0"；
+# 啟用時字幕發布一次，由邊緣節點（python fanout.py edge）各自送給自己的客戶端，本行程的客戶端照常接收
+FANOUT_BROKER = None
+
+# 語音識別器："Azure"（雲端）或 "Vosk"（本機 CPU 串流識別，不需網路）
 RECOGNIZER = "Azure"
+# Vosk 模型目錄，依場次的主要語言選用（模型可至 https://alphacephei.com/vosk/models 下載）
+VOSK_MODELS = {
+    "en-US": "models/vosk-model-small-en-us-0.15",
+    "zh-TW": "models/vosk-model-small-cn-0.22",
+}
 # 翻譯器的類型，可以是 "Azure"、"DeepL" 或 "Google"  
 TRANSLATOR = "Google"  # "Azure", "DeepL", "Google"    
+# 備援翻譯器（依序），None 表示使用 TranslationManager 的預設順序；只有主要與備援翻譯器會載入客戶端
+TRANSLATOR_FALLBACKS = None
+# 開始識別前是否預熱：載入翻譯器客戶端並送出探測請求、預先建立識別服務連線
+TRANSLATOR_WARM_UP = True
+# 預熱探測請求的逾時（秒），逾時的翻譯器仍可使用，只是第一次請求需自行建立連線
+TRANSLATOR_WARM_UP_TIMEOUT = 5.0
+
+# 部分識別結果是否使用前綴穩定翻譯（已結束的句子只翻譯一次）
+PREFIX_STABLE_TRANSLATION = True
+
+# 部分結果翻譯策略：相較上次翻譯至少新增的詞數（中日文以字計）、最短間隔（秒）與最低穩定度；
+# 超過最長等待時間（秒）未翻譯時不看詞數與穩定度
+PARTIAL_MIN_NEW_WORDS = 2
+PARTIAL_MIN_INTERVAL = 0.25
+PARTIAL_MAX_WAIT = 1.0
+PARTIAL_MIN_STABILITY = 0.5
+# 每場次的翻譯請求預算（次/秒，0 表示不限）與突發上限，用盡時降級為只翻譯最終結果
+PARTIAL_BUDGET_PER_SECOND = 4.0
+PARTIAL_BUDGET_BURST = 8.0
+
+# 翻譯請求的微批次收集時間窗（毫秒）與單批最大筆數
+BATCH_WINDOW_MS = 20
+BATCH_MAX_ITEMS = 16
+
+# 持久化翻譯快取的 SQLite 路徑，若為 None 則只使用記憶體快取
+CACHE_DB_PATH = "cache/translations.sqlite3"
+# 部分結果是否允許以近似重複的已快取文字作答（編輯距離上限內）
+CACHE_NEAR_DUPLICATE = True
+
+# 翻譯記憶與術語表的 SQLite 路徑（None 表示停用），已核可的譯文優先於快取與翻譯器
+TRANSLATION_MEMORY_PATH = "data/translation_memory.sqlite3"
+# 啟動時匯入的翻譯記憶 JSONL（格式見 memory.py），None 表示不匯入
+TRANSLATION_MEMORY_IMPORT = None
+
+# 對沖請求：主要翻譯器超過近期延遲的此百分位仍未回應時，改向下一個翻譯器同時請求
+HEDGE_PERCENTILE = 0.95
+# 對沖預算：最多對此比例的請求發出對沖（0 表示停用）
+HEDGE_BUDGET = 0.05
+
+# 逐字稿寫入：批次寫入的時間間隔（秒）、大小門檻（位元組），以及每批寫入後是否 fsync
+TRANSCRIPT_FLUSH_INTERVAL = 1.0
+TRANSCRIPT_FLUSH_BYTES = 64 * 1024
+TRANSCRIPT_FSYNC = False
+
+# 是否錄製識別事件（logs/{date}_events.jsonl），供 replay.py 離線重播
+RECORD_EVENTS = False
+
+# 各場次額外提供的目標語言字幕軌（語言對中的語言一定提供），只翻譯有客戶端訂閱的語言
+TARGET_LANGUAGES = ("ja-JP", "ko-KR", "es-ES")
+
+# 每場次保留的已完成語句數（環形紀錄，供 /sessions/<id>/history 分頁查詢）
+HISTORY_SEGMENTS = 2000
+
+# 字幕協定："delta" 只傳送變動的段落（含序號），"full" 為相容模式，每次傳送完整 HTML
+CAPTION_PROTOCOL = "delta"
+
+# 每位客戶端的傳送佇列：join 時宣告 ack 的客戶端（client.js）每收到 CLIENT_SEND_WINDOW 則字幕確認一次，等待確認時
+# 新的字幕在佇列中與尚未送出的字幕合併；佇列最多 CLIENT_QUEUE_DEPTH 則，ack 逾時 CLIENT_ACK_TIMEOUT 秒；False 時一律以房間廣播
+CLIENT_SEND_QUEUES = True
+CLIENT_SEND_WINDOW = 4
+CLIENT_QUEUE_DEPTH = 8
+CLIENT_ACK_TIMEOUT = 10.0
+
+# 網路音訊串流（Socket.IO audio_chunk）的 PCM 格式：(取樣率, 取樣位元數, 聲道數)
+AUDIO_INGEST_FORMAT = (16000, 16, 1)
+# 音訊環形緩衝區長度（秒）與緩衝區滿時的處理方式："drop_oldest" 丟棄最舊的音訊，"block" 讓傳送端等待
+AUDIO_BUFFER_SECONDS = 5.0
+AUDIO_BACKPRESSURE = DROP_OLDEST
+# 音訊檔是否分段串流送入識別器，以及串流速度（相對於實際時間的倍率，0 表示不限速）
+STREAM_AUDIO_FILES = True
+FILE_STREAM_SPEED = 1.0
+# 透過 /sessions 建立場次時，file_name 只能指向此目錄內的音訊檔
+AUDIO_FILE_DIR = "data"
 
 # 音訊檔案名稱，若為 None 則使用默認麥克風  
 FILE_NAME = None    
@@ -52,168 +152,665 @@ app.config['SECRET_KEY'] = 'secret!'
 # 初始化 SocketIO，允許所有的跨域請求，使用 threading 模式  
 socketio = SocketIO(app, cors_allowed_origins='*', async_mode='threading')  # 使用 threading 模式    
   
-class TranslationCache:    
-    """    
-    使用 cachetools 的 TTLCache 實現快取，提高效能    
-    """    
-    def __init__(self, max_size=1000, expire_time=300):    
-        self.cache = TTLCache(maxsize=max_size, ttl=expire_time)    
-  
-    def get(self, key):    
-        return self.cache.get(key)    
-  
-    def set(self, key, value):    
-        self.cache[key] = value    
-  
+# 各翻譯器使用的語言代碼：{語系: (作為源語言, 作為目標語言)}
+LANGUAGE_CODES = {
+    "DeepL": {
+        "en-US": ("EN", "EN-US"),
+        "zh-TW": ("ZH", "ZH"),
+        "ja-JP": ("JA", "JA"),
+        "ko-KR": ("KO", "KO"),
+        "es-ES": ("ES", "ES"),
+    },
+    "Azure": {
+        "en-US": ("en", "en"),
+        "zh-TW": ("zh-Hans", "zh-Hans"),
+        "ja-JP": ("ja", "ja"),
+        "ko-KR": ("ko", "ko"),
+        "es-ES": ("es", "es"),
+    },
+    "Google": {
+        "en-US": ("en", "en-US"),
+        "zh-TW": ("zh-TW", "zh-TW"),
+        "ja-JP": ("ja", "ja"),
+        "ko-KR": ("ko", "ko"),
+        "es-ES": ("es", "es"),
+    },
+}
+
+
+def valid_session_id(session_id):
+    """場次 ID 會成為逐字稿檔名的一部分，只允許英數字、底線與連字號"""
+    return isinstance(session_id, str) and re.fullmatch(r"[\w-]+", session_id) is not None
+
+
+def audio_file_path(file_name):
+    """遠端指定的音訊檔路徑，位於 AUDIO_FILE_DIR 之外時回傳 None"""
+    root = os.path.realpath(AUDIO_FILE_DIR)
+    path = os.path.realpath(file_name)
+    return path if os.path.commonpath([root, path]) == root else None
+
+
+def transcript_prefix(session_id):
+    """場次逐字稿檔案的路徑前綴，{date} 於寫入時代入當天日期；預設場次沿用原本的檔名"""
+    return "logs/{date}_" if session_id == "default" else f"logs/{{date}}_{session_id}_"
+
+# 場次處理一個識別事件時設定的計數器（單元素串列），記錄實際送往翻譯器的請求數供部分結果預算計費；
+# asyncio 任務會複製 context，gather 出的子任務共用同一個計數器
+backend_requests = ContextVar("backend_requests", default=None)
+
+
+def _count_backend_request():
+    counter = backend_requests.get()
+    if counter is not None:
+        counter[0] += 1
+
+
 class TranslationManager:    
     """    
     翻譯管理器，負責管理翻譯請求、快取以及故障轉移機制    
     """    
-    def __init__(self, max_workers=4, cache_size=1000):    
+    def __init__(self, primary, max_workers=4, cache_size=1000, cache_path=None, near_duplicate=False,
+                 hedge_percentile=0.95, hedge_budget=0.05, batch_window=0.02, batch_max_items=16,
+                 memory=None, fallbacks=None):    
         self.semaphore = asyncio.Semaphore(max_workers)    
-        self.cache = TranslationCache(max_size=cache_size)    
-        self.error_counts = {}    
+        # 翻譯器 SDK 的阻塞呼叫使用固定大小的執行緒池，大小與並發上限相同
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="translator")
+        persistent = PersistentTranslationCache(cache_path) if cache_path else None
+        self.cache = TranslationCache(
+            max_size=cache_size,
+            persistent=persistent,
+            near_duplicate=NearDuplicateIndex() if near_duplicate else None
+        )    
+        # 翻譯記憶與術語表（可為 None）
+        self.memory = memory
         self.error_threshold = 3    
         self.fallback_order = {
             "Azure": ["Google", "DeepL"],    
             "Google": ["Azure", "DeepL"],    
             "DeepL": ["Azure", "Google"]    
         }    
-        self.translation_lock = Lock()    
+        if fallbacks is not None:
+            self.fallback_order[primary] = list(fallbacks)
         self.stop_flag = False    
+
+        # 翻譯器路由：各翻譯器的熔斷器與 EWMA 延遲、錯誤率
+        self.router = AdaptiveRouter(
+            primary,
+            self.fallback_order,
+            failure_threshold=self.error_threshold
+        )
+
+        # 對沖請求設定：限制對沖比例的令牌桶
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = 20
+        self.hedge_budget = hedge_budget
+        self.hedge_tokens = 1.0
+        # hedge_wins：對沖請求在首選仍未回應時先成功；failovers：首選失敗後改用下一個翻譯器成功
+        self.hedge_stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "failovers": 0, "budget_denied": 0}
+
+        # 預熱：所有場次共用同一次預熱，warm_up_seconds 記錄各翻譯器探測請求的耗時（失敗為 None）
+        self.warm_up_task = None
+        self.warm_up_seconds = {}
+
+        # 初始化翻譯服務（各場次共用翻譯器客戶端）    
+        self._setup_translation_service()    
+
+        # 初始化微批次調度器，批次呼叫仍經由 translate_with_fallback 的並發限制與錯誤處理
+        self.dispatcher = TranslationDispatcher(
+            self,
+            self.translators,
+            window=batch_window,
+            max_items=batch_max_items
+        )
+
+    def hedge_delay(self, backend):
+        """
+        回傳發出對沖請求前應等待的秒數（近期延遲的百分位），
+        樣本不足或未啟用對沖時回傳 None
+        """
+        self.hedge_stats["requests"] += 1
+        # 每個請求累積預算比例的令牌，上限避免長時間閒置後爆量對沖
+        self.hedge_tokens = min(self.hedge_tokens + self.hedge_budget, 10.0)
+        health = self.router.health.get(backend)
+        if not self.hedge_budget or not health or len(health.samples) < self.hedge_min_samples:
+            return None
+        return health.percentile(self.hedge_percentile)
+
+    def try_hedge(self):
+        """在對沖預算內時消耗一個令牌並回傳 True"""
+        if self.hedge_tokens >= 1.0:
+            self.hedge_tokens -= 1.0
+            self.hedge_stats["hedged"] += 1
+            return True
+        self.hedge_stats["budget_denied"] += 1
+        return False
+  
+    def _setup_translation_service(self):    
+        """設定翻譯服務：客戶端只登錄主要與備援翻譯器，第一次使用或預熱時才建立"""    
+        self.translators = {    
+            "DeepL": self._translate_with_deepl,
+            "Azure": self._translate_with_azure,
+            "Google": self._translate_with_google
+        }    
+        self.backends = TranslatorBackends(self.router.backends)
+
+    async def warm_up(self, source_language, target_language, timeout=5.0):
+        """
+        預熱翻譯器：在執行緒池中載入客戶端，並以一筆探測請求建立連線池中的連線，
+        避免第一句字幕承擔 TLS 與連線建立的延遲；多個場次同時呼叫時共用同一次預熱
+        """
+        if self.warm_up_task is None:
+            self.warm_up_task = asyncio.ensure_future(
+                self._warm_up_backends(source_language, target_language, timeout)
+            )
+        return await asyncio.shield(self.warm_up_task)
+
+    async def _warm_up_backends(self, source_language, target_language, timeout):
+        loop = asyncio.get_running_loop()
+
+        async def probe(backend):
+            start = time.perf_counter()
+            try:
+                await loop.run_in_executor(self.executor, self.backends.get, backend)
+                source_lang, target_lang = self._switch_language_code(backend, source_language, target_language)
+                result = await asyncio.wait_for(
+                    self.translators[backend](["Hello"], source_lang, target_lang), timeout
+                )
+            except Exception as e:
+                result = None
+                logger.warning(f"{backend} warm-up failed: {e!r}")
+            seconds = time.perf_counter() - start
+            self.warm_up_seconds[backend] = seconds if result else None
+            if result:
+                logger.info(f"{backend} translator warmed up in {seconds:.2f}s")
+            return backend, self.warm_up_seconds[backend]
+
+        return dict(await asyncio.gather(*(probe(backend) for backend in self.router.backends)))
   
-    async def translate_with_fallback(self, translator_func, text, source_lang, target_lang):    
+    async def translate(self, text, source_language, target_language, partial=False):    
         """    
-        使用翻譯函數進行翻譯，並在發生錯誤時嘗試故障轉移    
+        優化的翻譯實現，包含快取、錯誤處理和故障轉移機制，回傳譯文（失敗時為空字串）    
+        partial 為 True 時（部分結果）允許近似重複的快取命中，命中時回傳 NearDuplicateHit    
+        """    
+        try:    
+            if not text or not text.strip():    
+                return ""    
+
+            # 翻譯記憶中已核可的譯文優先，不經過快取與翻譯器
+            approved = self._lookup_memory(text, source_language, target_language)
+            if approved:
+                return approved
+
+            # 術語以佔位符保護，快取與翻譯器都使用受保護的文字
+            text, terms = self._protect(text, source_language)
+  
+            # 依路由器選出的順序嘗試翻譯器（最快且健康者優先）    
+            route = self.router.route()    
+
+            result = await self._lookup_cache(text, source_language, target_language, route, partial)
+            if result:
+                return self._restore(result, terms, source_language, target_language)
+  
+            # 嘗試首選翻譯器，回應過慢時以對沖請求競速    
+            languages = (source_language, target_language)
+            result, cache_key = await self._translate_with_hedge(text, languages, route)    
+  
+            # 如果首選翻譯失敗，依序嘗試其餘翻譯器    
+            if not result:    
+                for fallback_translator in route[2:]:    
+                    result, cache_key = await self._request_backend(fallback_translator, text, languages)    
+                    if result:    
+                        metrics.FALLBACKS.labels(fallback_translator).inc()
+                        logger.info(f"Fallback to {fallback_translator} successful")    
+                        break    
+  
+            if not result:    
+                metrics.ERRORS.labels("translation").inc()
+                logger.error("All translation attempts failed")    
+                return ""    
+  
+            # 更新快取，以實際產生譯文的翻譯器為鍵    
+            self.cache.set(cache_key, result)    
+  
+            return self._restore(result, terms, source_language, target_language)    
+  
+        except Exception as e:    
+            metrics.ERRORS.labels("translation").inc()
+            logger.error(f"Translation error: {str(e)}")    
+            return ""    
+
+    def _lookup_memory(self, text, source_language, target_language):
+        """查詢翻譯記憶，未啟用或未命中時回傳 None"""
+        if self.memory is None:
+            return None
+        return self.memory.lookup(text, source_language, target_language)
+
+    def _protect(self, text, source_language):
+        """以佔位符保護術語，回傳 (文字, 術語列表)"""
+        if self.memory is None:
+            return text, ()
+        return self.memory.protect(text, source_language)
+
+    def _restore(self, translation, terms, source_language, target_language):
+        """將譯文中的佔位符換回術語譯名；近似重複命中的譯文保留 NearDuplicateHit 標記"""
+        if not terms:
+            return translation
+        restored = self.memory.restore(translation, terms, source_language, target_language)
+        return NearDuplicateHit(restored) if isinstance(translation, NearDuplicateHit) else restored
+
+    async def _lookup_cache(self, text, source_language, target_language, route, partial):
+        """依路由順序查詢各翻譯器的快取，未命中時回傳 None"""
+        start = time.perf_counter()
+        for backend in route:
+            source_lang, target_lang = self._switch_language_code(backend, source_language, target_language)    
+            result = await self.cache.get(CacheKey(text, source_lang, target_lang, backend), fuzzy=partial)    
+            if result:    
+                metrics.CACHE_LOOKUP_SECONDS.observe(time.perf_counter() - start)
+                metrics.CACHE_HITS.inc()
+                return result    
+        metrics.CACHE_LOOKUP_SECONDS.observe(time.perf_counter() - start)
+        metrics.CACHE_MISSES.inc()
+        return None
+
+    async def translate_many(self, text, source_language, target_languages, partial=False):
+        """
+        將文字翻譯成多個目標語言，回傳 {目標語言: 譯文}（失敗時為空字串）
+        各語言分別快取；首選翻譯器為 Azure 時以單一請求攜帶所有未命中的目標語言，
+        其餘情況（或 Azure 失敗時）各語言經由 translate 並行翻譯
+        """
+        results = {}
+        pending = []
+        route = self.router.route()
+        protected, terms = self._protect(text, source_language) if text else (text, ())
+        for target_language in target_languages:
+            if target_language == source_language:
+                results[target_language] = text
+            elif not text or not text.strip():
+                results[target_language] = ""
+            else:
+                cached = (self._lookup_memory(text, source_language, target_language)
+                          or self._restore(
+                              await self._lookup_cache(protected, source_language, target_language, route, partial),
+                              terms, source_language, target_language))
+                if cached:
+                    results[target_language] = cached
+                else:
+                    pending.append(target_language)
+
+        if len(pending) > 1 and route[0] == "Azure":
+            translations = await self._translate_azure_multi(protected, source_language, pending)
+            results.update(
+                (language, self._restore(translation, terms, source_language, language))
+                for language, translation in translations.items()
+            )
+            pending = [language for language in pending if not results.get(language)]
+
+        if pending:
+            translations = await asyncio.gather(
+                *(self.translate(text, source_language, language, partial) for language in pending)
+            )
+            results.update(zip(pending, translations))
+        return results
+
+    async def _translate_azure_multi(self, text, source_language, target_languages):
+        """以一次 Azure 請求翻譯成多個目標語言，經由調度器與其他相同請求合併"""
+        source_lang = self._switch_language_code("Azure", source_language, target_languages[0])[0]
+        codes = tuple(
+            self._switch_language_code("Azure", source_language, language)[1]
+            for language in target_languages
+        )
+        self.router.acquire("Azure")
+        _count_backend_request()
+        translations = await self.dispatcher.translate("Azure", text, source_lang, codes)
+        results = {}
+        for language, code, translation in zip(target_languages, codes, translations or ()):
+            if translation:
+                self.cache.set(CacheKey(text, source_lang, code, "Azure"), translation)
+                results[language] = translation
+        return results
+
+    async def _request_backend(self, backend, text, languages):
+        """經由微批次調度器向指定翻譯器送出請求，回傳 (譯文, 快取鍵)"""
+        source_lang, target_lang = self._switch_language_code(backend, *languages)
+        self.router.acquire(backend)
+        _count_backend_request()
+        result = await self.dispatcher.translate(backend, text, source_lang, target_lang)
+        return result, CacheKey(text, source_lang, target_lang, backend)
+
+    async def _translate_with_hedge(self, text, languages, route):
+        """
+        對沖請求：首選翻譯器超過其近期延遲百分位仍未回應時，
+        在預算允許下向路由中的下一個翻譯器發出相同請求，
+        採用最先成功的結果並取消另一個；首選失敗時也立即改用下一個
+        """
+        primary = route[0]
+        hedge_backend = route[1] if len(route) > 1 else None
+        primary_task = asyncio.ensure_future(self._request_backend(primary, text, languages))
+        tasks = {primary_task: primary}
+        try:
+            delay = self.hedge_delay(primary) if hedge_backend else None
+            if delay is not None:
+                # 調度器的收集時間窗也計入等待時間
+                done, _ = await asyncio.wait(set(tasks), timeout=delay + self.dispatcher.window)
+                if not done and self.try_hedge():
+                    logger.info(f"Hedging {primary} request with {hedge_backend} after {delay:.3f}s")
+                    tasks[asyncio.ensure_future(self._request_backend(hedge_backend, text, languages))] = hedge_backend
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # 同時完成時優先採用首選的結果
+                for task in sorted(done, key=lambda task: task is not primary_task):
+                    result, cache_key = task.result()
+                    if result:
+                        if task is not primary_task:
+                            # 首選仍在等待才算對沖勝出，首選已失敗則是一般的故障轉移
+                            self.hedge_stats["failovers" if primary_task.done() else "hedge_wins"] += 1
+                            metrics.FALLBACKS.labels(tasks[task]).inc()
+                        return result, cache_key
+                # 首選失敗且尚未對沖時，改向下一個翻譯器請求
+                if not pending and hedge_backend and hedge_backend not in tasks.values():
+                    task = asyncio.ensure_future(self._request_backend(hedge_backend, text, languages))
+                    tasks[task] = hedge_backend
+                    pending = {task}
+            return None, None
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _switch_language_code(translator, source_language, target_language):    
+        """    
+        根據語言代碼與翻譯器設定源語言和目標語言    
+        """    
+        codes = LANGUAGE_CODES.get(translator, {})
+        # 未列出的語言使用語系的主要部分，例如 "fr-FR" -> "fr"
+        default = source_language.split("-")[0]
+        source_lang = codes.get(source_language, (default, default))[0]
+        default = target_language.split("-")[0]
+        target_lang = codes.get(target_language, (default, default))[1]
+        return source_lang, target_lang    
+  
+    async def _translate_with_deepl(self, texts, source_lang, target_lang):    
+        """使用 DeepL 進行批次翻譯"""    
+        try:    
+            config = {
+                "text": texts,    
+                "source_lang": source_lang,    
+                "target_lang": target_lang,
+                "model_type": "prefer_quality_optimized"
+            }
+            
+            response = await asyncio.get_running_loop().run_in_executor(    
+                self.executor,    
+                lambda: self.backends.get("DeepL").translate_text(    
+                    **config
+                )    
+            )    
+            return [result.text for result in response]    
+        except Exception as e:    
+            logger.error(f"DeepL translation error: {e}")    
+            return []    
+  
+    async def _translate_with_azure(self, texts, source_lang, target_lang):    
+        """
+        使用 Azure 翻譯服務進行批次翻譯
+        target_lang 為元組時一次翻譯成多個語言，每段文字回傳依序對應的譯文元組
+        """    
+        from azure.core.exceptions import HttpResponseError
+        try:    
+            from_language = source_lang
+            multiple = isinstance(target_lang, tuple)
+            to_language = list(target_lang) if multiple else [target_lang]
+            input_text_elements = list(texts) 
+            response = await asyncio.get_running_loop().run_in_executor(    
+                self.executor,    
+                lambda: self.backends.get("Azure").translate(    
+                    body=input_text_elements,    
+                    to_language=to_language,    
+                    from_language=from_language    
+                )    
+            )    
+            if multiple:
+                results = []
+                for translation in response or []:
+                    texts_by_language = {t.to: t.text for t in (translation.translations if translation else [])}
+                    results.append(tuple(texts_by_language.get(code, "") for code in to_language))
+                return results
+            return [
+                translation.translations[0].text if translation and translation.translations else ""
+                for translation in response or []
+            ]    
+        except HttpResponseError as exception:    
+            if exception.error is not None:    
+                logger.error(f"Error Code: {exception.error.code}")    
+                logger.error(f"Message: {exception.error.message}")    
+            return []    
+  
+    async def _translate_with_google(self, texts, source_lang, target_lang):    
+        """使用 Google 翻譯進行批次翻譯"""    
+        try:  
+            
+            config = {    
+                    "parent": PARENT,    
+                    "contents": list(texts),    
+                    "mime_type": "text/plain", 
+                    "source_language_code": source_lang,    
+                    "target_language_code": target_lang
+                } 
+            response = await asyncio.get_running_loop().run_in_executor(    
+                self.executor,    
+                lambda: self.backends.get("Google").translate_text(    
+                    request=config
+                )    
+            )    
+            return [translation.translated_text for translation in response.translations]    
+        except Exception as e:    
+            logger.error(f"Google translation error: {e}")    
+            return []    
+  
+    def close(self):
+        """停止翻譯並關閉快取"""
+        self.stop_flag = True
+        logger.info(f"Translation cache stats: {self.cache.get_stats()}")
+        self.cache.close()
+        if self.memory is not None:
+            logger.info(f"Translation memory stats: {self.memory.get_stats()}")
+            self.memory.close()
+        self.executor.shutdown(wait=False)
+
+    async def translate_with_fallback(self, translator_func, texts, source_lang, target_lang):    
+        """    
+        使用翻譯函數進行批次翻譯，並限制並發數量，回傳 (結果, 秒數)；發生錯誤時結果為 None，
+        秒數只計算取得並發額度後的翻譯器呼叫（不含排隊等待），停止中未送出時為 None    
         """    
         async with self.semaphore:    
+            if self.stop_flag:    
+                return None, None    
+            start = time.perf_counter()
             try:    
-                if self.stop_flag:    
-                    return None    
-                return await translator_func(text, source_lang, target_lang)    
+                results = await translator_func(texts, source_lang, target_lang)
             except Exception as e:    
                 if not self.stop_flag:    
                     logger.error(f"Translation error with {translator_func.__name__}: {e}")    
-                return None    
+                results = None
+            return results, time.perf_counter() - start
   
 class ContinuousTranslation:    
     """    
     持續翻譯服務類    
     負責語音識別、翻譯處理和信號傳送    
     """    
-    def __init__(self, socketio):    
+    def __init__(self, socketio, translation_manager, session_id="default",
+                 languages=("en-US", "zh-TW"), file_name=None, targets=TARGET_LANGUAGES,
+                 audio_stream=False):    
         self.socketio = socketio    
         self.stop_flag = False    
-        self.current_transcriber = RECOGNIZER    
-        self.current_translator = TRANSLATOR    
-  
-        # 初始化翻譯管理器    
-        self.translation_manager = TranslationManager(    
-            max_workers=4,    
-            cache_size=1000    
-        )    
+        self.current_transcriber = RECOGNIZER
+        # 開始識別前是否預熱翻譯器與識別服務連線
+        self.warm_up = TRANSLATOR_WARM_UP
+        self.session_id = session_id
+        # 語言對：第一個為主要語言，識別出的語言會翻譯成另一個
+        self.languages = tuple(languages)
+        self.file_name = file_name
+        # 是否由網路接收音訊串流（取代麥克風與音訊檔）
+        self.audio_stream = audio_stream
+        self.audio_ring = None
+        self.loop = None
+        self.recognizer = None
+        self.done_event = None
+  
+        # 共用的翻譯管理器（快取、翻譯器客戶端、路由）    
+        self.translation_manager = translation_manager    
   
         # 初始化狀態變數    
         self.last_text = {"ch": "", "en": ""}    
-        self.current_language = "en-US"  # 默認為英語    
+        self.current_language = self.languages[0]    
   
         # 臨時數據    
         self.previous_text = {"mix": ""}    
         self.previous_completed = {"mix": "", "prev_prev": ""}    
+
+        # 已完成段落的最大長度（字元）
+        self.max_completed_length = 19 * 12
+
+        # 增量字幕協定的段落狀態
+        self.captions = CaptionState()
+
+        # 顯示段落的增量句子切分狀態
+        self.sentence_buffer = SentenceBuffer()
+
+        # 各目標語言的字幕軌，客戶端訂閱後才翻譯並送往 "{場次}:{語言}" 房間
+        self.tracks = {
+            language: CaptionTrack(language, f"{session_id}:{language}")
+            for language in dict.fromkeys(self.languages + tuple(targets))
+        }
+
+        # 部分結果翻譯策略與每場次的請求預算
+        self.partial_policy = PartialPolicy(
+            min_new_words=PARTIAL_MIN_NEW_WORDS,
+            min_interval=PARTIAL_MIN_INTERVAL,
+            max_wait=PARTIAL_MAX_WAIT,
+            min_stability=PARTIAL_MIN_STABILITY,
+            budget_per_second=PARTIAL_BUDGET_PER_SECOND,
+            budget_burst=PARTIAL_BUDGET_BURST,
+            name=session_id
+        )
+
+        # 部分結果的前綴翻譯狀態：已結束句子的翻譯與最後一次部分結果
+        self.partial_state = {"language": None, "sentences": {}, "text": "", "result": None}
   
-        # 完整文本記錄    
-        self.full_text = {"en": "", "ch": ""}    
+        # 已完成語句的環形紀錄（時間、原文與各語言譯文），容量固定    
+        self.history = TranscriptHistory(HISTORY_SEGMENTS)    
   
-        # 文件路徑設定    
-        timestamp = datetime.now().strftime('%Y%m%d')    
+        # 文件路徑範本，{date} 於寫入時代入當天日期以支援換日    
+        prefix = transcript_prefix(session_id)
         self.file_paths = {    
-            "log": f"logs/{timestamp}_log.txt",    
-            "text": f"logs/{timestamp}_texts.txt",    
-            "translation": f"logs/{timestamp}_translations.txt"    
+            "log": prefix + "log.txt",    
+            "text": prefix + "texts.txt",    
+            "translation": prefix + "translations.txt",
+            "events": prefix + "events.jsonl",
+            "segments": prefix + "segments.jsonl"
         }    
-  
-        # 初始化翻譯服務    
-        self._setup_translation_service()    
-  
-    def _setup_translation_service(self):    
-        """設定翻譯服務"""    
-        try:    
-            self.translators = {    
-                "DeepL": self._translate_with_deepl,
-                "Azure": self._translate_with_azure,
-                "Google": self._translate_with_google
-            }    
-  
-            # 設定 DeepL 翻譯器    
-            self.DeepL_translator = deepl.Translator(    
-                auth_key=os.getenv('DEEPL_KEY')    
-            )
-  
-            # 設定 Azure 翻譯服務  
-            self.azure_credential = AzureKeyCredential(os.getenv('AZURE_TRANSLATOR_KEY'))    
-            self.azure_translator = TextTranslationClient(
-                region=os.getenv('AZURE_TRANSLATOR_REGION'),
-                credential=self.azure_credential
-            )
-  
-            self.google_translator = translate.TranslationServiceClient()    
-  
-        except Exception as e:    
-            logger.error(f"Translation service setup error: {e}")    
-            raise    
+
+        # 逐字稿寫入器，檔案 I/O 在背景執行緒批次進行；語句存放區附有索引，供字幕匯出
+        self.transcript_writer = TranscriptWriter(
+            self.file_paths,
+            flush_interval=TRANSCRIPT_FLUSH_INTERVAL,
+            flush_bytes=TRANSCRIPT_FLUSH_BYTES,
+            fsync=TRANSCRIPT_FSYNC,
+            sinks={"segments": SegmentStore()}
+        )
   
     async def translation_continuous(self):    
         """    
         持續進行語音識別與翻譯的主循環    
         """    
         self.loop = asyncio.get_running_loop()  # 獲取當前運行的事件循環    
-        recognizer = self._init_recognizer()    
+        try:
+            # 載入模型、匯入 SDK 與建立連線可能需要數秒，在執行緒上進行，不阻塞所有場次共用的事件循環
+            recognizer = self.recognizer = await asyncio.to_thread(self._prepare_recognizer)
 
-        self._add_custom_phrases(recognizer)    
-  
-        done_event = asyncio.Event()    
-  
-        self._connect_recognizer_events(recognizer, done_event)    
+            # 開始識別前預熱翻譯器，第一句字幕不必承擔連線建立的延遲
+            if self.warm_up:
+                await self.translation_manager.warm_up(*self.languages, timeout=TRANSLATOR_WARM_UP_TIMEOUT)
+        except Exception:
+            # 識別器無法啟動時關閉寫入器與音訊緩衝，場次由場次管理器移除
+            await self.cleanup()
+            raise
+  
+        done_event = self.done_event = asyncio.Event()    
+        if self.stop_flag:
+            # 準備期間場次已被停止
+            await self.cleanup()
+            return
+  
+        # 識別事件管線，識別器回呼只負責排入事件
+        self.pipeline = RecognitionPipeline(self.loop, {
+            PARTIAL: self._process_recognizing,
+            FINAL: self._process_recognized
+        })
+        consumer = asyncio.create_task(self.pipeline.run())
 
-        recognizer.start_continuous_recognition_async()    
+        recognizer.start(    
+            self._handle_event,    
+            lambda reason: self._handle_recognition_stop(reason, done_event)    
+        )    
   
         await done_event.wait()    
-  
+
+        # 處理完剩餘的最終結果後結束
+        self.pipeline.close()
+        await consumer
+        logger.info(f"Recognition pipeline stats ({self.session_id}): {self.pipeline.stats}")
+        await self.cleanup()
+  
+    def _prepare_recognizer(self):
+        """在執行緒上初始化識別器、加入自訂詞彙並預熱識別服務連線"""
+        recognizer = self._init_recognizer()
+        self._add_custom_phrases(recognizer)
+        if self.warm_up:
+            recognizer.warm_up()
+        return recognizer
+
     def _init_recognizer(self):    
-        """初始化語音識別器"""    
+        """依 RECOGNIZER 初始化語音識別器"""    
         try:    
-            speech_config = self._create_speech_config()    
-            audio_config = self._create_audio_config()    
-            language_config = speechsdk.languageconfig.AutoDetectSourceLanguageConfig(    
-                languages=["en-US", "zh-TW"]    
-            )    
-
-            return speechsdk.SpeechRecognizer(    
-                speech_config=speech_config,    
-                audio_config=audio_config,    
-                auto_detect_source_language_config=language_config    
-            )    
+            if self.current_transcriber == "Azure":    
+                return AzureRecognizer(    
+                    self._create_speech_config(),    
+                    self._create_audio_config(),    
+                    self.languages    
+                )    
+            if self.current_transcriber == "Vosk":    
+                audio_format, speed = self._create_audio_ring(microphone=True)    
+                return VoskRecognizer(    
+                    VOSK_MODELS[self.languages[0]],    
+                    self.audio_ring,    
+                    audio_format,    
+                    self.languages,    
+                    speed=speed    
+                )    
+            raise ValueError(f"Invalid recognizer type: {self.current_transcriber}")    
   
         except Exception as e:    
             logger.error(f"Recognizer initialization error: {e}")    
             raise    
   
     def _create_speech_config(self):    
-        """創建語音配置"""    
-        if self.current_transcriber == "Azure":    
-            config = speechsdk.SpeechConfig(    
-                subscription=speech_key,    
-                region=service_region    
-            ) 
-        else:    
-            raise ValueError("Invalid recognizer type")    
+        """創建 Azure 語音配置"""    
+        speechsdk = load_speech_sdk()
+        config = speechsdk.SpeechConfig(    
+            subscription=speech_key,    
+            region=service_region    
+        ) 
         timestamp = datetime.now().strftime('%Y%m%d')  
   
-        config.speech_recognition_language = "en-US"    
+        config.speech_recognition_language = self.languages[0]    
         config.enable_dictation()    
         config.set_property(    
             speechsdk.PropertyId.Speech_LogFilename,    
-            f"logs/{timestamp}_speech_log.txt"    
+            self.file_paths["log"].replace("log.txt", "speech_log.txt").format(date=timestamp)    
         )    
         config.set_property(    
             speechsdk.PropertyId.SpeechServiceResponse_PostProcessingOption,    
@@ -228,334 +825,357 @@ class ContinuousTranslation:
   
     def _create_audio_config(self):    
         """創建音訊配置"""    
-        return (speechsdk.audio.AudioConfig(filename=FILE_NAME)
-                if FILE_NAME    
+        if self.audio_stream or (self.file_name and STREAM_AUDIO_FILES):
+            return self._create_stream_audio_config()
+        speechsdk = load_speech_sdk()
+        return (speechsdk.audio.AudioConfig(filename=self.file_name)
+                if self.file_name    
                 else speechsdk.audio.AudioConfig(use_default_microphone=True))    
+
+    def _create_stream_audio_config(self):
+        """
+        以推送串流作為音訊來源：網路傳入的音訊或分段讀取的音訊檔先寫入環形緩衝區，
+        再由推送執行緒依實際時間送入識別器
+        """
+        speechsdk = load_speech_sdk()
+        (rate, bits, channels), speed = self._create_audio_ring()
+        stream_format = speechsdk.audio.AudioStreamFormat(
+            samples_per_second=rate, bits_per_sample=bits, channels=channels
+        )
+        push_stream = speechsdk.audio.PushAudioInputStream(stream_format=stream_format)
+        AudioStreamPump(self.audio_ring, push_stream, rate * bits // 8 * channels, speed=speed).start()
+        return speechsdk.audio.AudioConfig(stream=push_stream)
+
+    def _create_audio_ring(self, microphone=False):
+        """
+        建立音訊環形緩衝區並啟動寫入來源（網路串流由 write_audio 寫入），
+        microphone 為 True 時沒有音訊檔也沒有網路串流則擷取麥克風；
+        回傳 ((取樣率, 取樣位元數, 聲道數), 推送倍率)
+        """
+        if self.audio_stream or not self.file_name:
+            rate, bits, channels = AUDIO_INGEST_FORMAT
+            policy, block_timeout, speed = AUDIO_BACKPRESSURE, 1.0, 1.0
+        else:
+            rate, bits, channels = WavFileSource.read_format(self.file_name)
+            # 音訊檔不丟棄資料，讀取速度由推送限速決定
+            policy, block_timeout, speed = BLOCK, None, FILE_STREAM_SPEED
+        alignment = bits // 8 * channels
+        self.audio_ring = AudioRingBuffer(
+            int(rate * alignment * AUDIO_BUFFER_SECONDS),
+            policy=policy,
+            block_timeout=block_timeout,
+            alignment=alignment
+        )
+        if self.file_name and not self.audio_stream:
+            WavFileSource(self.file_name, self.audio_ring).start()
+        elif microphone and not self.audio_stream:
+            MicrophoneSource(self.audio_ring, rate, channels).start()
+        return (rate, bits, channels), speed
+
+    def write_audio(self, data):
+        """寫入網路傳入的 PCM 音訊，回傳 (是否完整寫入, 緩衝區填充比例)"""
+        if self.audio_ring is None or self.stop_flag:
+            return False, None
+        accepted = self.audio_ring.write(data)
+        return accepted, self.audio_ring.fill
+
+    def end_audio(self):
+        """網路音訊串流結束，識別器處理完剩餘音訊後場次結束"""
+        if self.audio_ring is not None:
+            self.audio_ring.close()
   
     def _add_custom_phrases(self, recognizer):    
         """添加自訂詞彙"""    
         try:    
-            phrase_list = speechsdk.PhraseListGrammar.from_recognizer(recognizer)    
-            for phrase in custom_phrases:    
-                phrase_list.addPhrase(phrase)    
+            recognizer.add_phrases(custom_phrases)    
         except Exception as e:    
             logger.error(f"Add custom phrases error: {e}")    
   
-    def _connect_recognizer_events(self, recognizer, done_event):    
-        """連接識別器事件"""    
-        recognizer.session_started.connect(    
-            lambda evt: logger.info(f'Session started: {evt}')    
-        )    
-        recognizer.session_stopped.connect(    
-            lambda evt: self._handle_recognition_stop(evt, done_event)    
-        )    
-        recognizer.canceled.connect(    
-            lambda evt: self._handle_recognition_stop(evt, done_event)    
-        )    
-        recognizer.recognizing.connect(self._handle_recognizing)    
-        recognizer.recognized.connect(self._handle_recognized)    
-  
-    def _handle_recognition_stop(self, evt, done_event):    
+    def _handle_recognition_stop(self, reason, done_event):    
         """處理識別停止事件"""    
-        logger.info(f"Recognition stopped: {evt}")    
         self.loop.call_soon_threadsafe(done_event.set)   
   
-    def _handle_recognizing(self, evt):    
-        """處理識別中事件"""    
+    def _handle_event(self, event):    
+        """處理識別事件：只排入管線，不在識別器回呼執行緒上等待翻譯"""    
         try: 
-            if self.stop_flag:    
+            if self.stop_flag and event.kind == PARTIAL:    
                 return    
-            if evt.result.reason == speechsdk.ResultReason.RecognizingSpeech:    
-  
-                text = evt.result.text
-                if self.current_transcriber == "Azure":    
-                    language = json.loads(evt.result.json)["PrimaryLanguage"]["Language"]    
-                else:    
-                    language = "en-US"    
-  
-                # 執行翻譯    
-                future = asyncio.run_coroutine_threadsafe(    
-                    self._translate_text(text, language),    
-                    self.loop    
-                )    
-                ch_text, en_text = future.result()    
-  
-                display_text = ch_text if language == "en-US" else en_text    
-  
-                current_text, prev_text = self.format_mixed_text(display_text)  
-                display_text = prev_text + "<br>" + current_text if prev_text else current_text    
-                self.socketio.emit('update_text', {'text': display_text, 'lang': language})    
-  
-                # 保存當前語言信息    
-                self.current_language = language    
+            self._record_event(event)
+            self.pipeline.submit(event.kind, event)
   
         except Exception as e:    
             if not self.stop_flag:    
-                logger.error(f"Recognizing handler error: {e}")    
-  
-    def _handle_recognized(self, evt):    
-        """處理識別完成事件"""    
-        try:    
-            if evt.result.reason == speechsdk.ResultReason.RecognizedSpeech:    
-                # 獲取時間和文本信息    
-                start_time = evt.result.offset / 10**7    
-                end_time = (evt.result.offset + evt.result.duration) / 10**7    
-                text = evt.result.text
-                if self.current_transcriber == "Azure":    
-                    language = json.loads(evt.result.json)["PrimaryLanguage"]["Language"]    
-                else:    
-                    language = "en-US"    
-  
-                # 執行翻譯    
-                future = asyncio.run_coroutine_threadsafe(    
-                    self._translate_text(text, language),    
-                    self.loop    
-                )    
-                ch_text, en_text = future.result()    
-  
-                # 更新完成的文本    
-                self.previous_completed["prev_prev"] = self.previous_completed["mix"]
-                if language == "en-US":
-                    self.previous_completed["mix"] = ch_text
-                    text = en_text
-                else:
-                    self.previous_completed["mix"] = en_text    
-                    text = ch_text
-  
-                # 更新完整文本    
-                self._update_full_text(ch_text, en_text)    
-  
-                # 寫入文件    
-                self._write_to_files(start_time, end_time, text, self.previous_completed["mix"])    
-  
-        except Exception as e:    
-            logger.error(f"Recognition handler error: {e}")    
-  
-    async def _translate_text(self, text, language):    
-        """    
-        優化的翻譯實現，包含快取、錯誤處理和故障轉移機制    
-        """    
-        try:    
-            if not text or not text.strip():    
-                return "", ""    
-  
-            cache_key = f"{text}_{language}_{self.current_translator}"    
-  
-            cached_result = self.translation_manager.cache.get(cache_key)    
-            if cached_result:    
-                return cached_result    
-  
-            source_lang, target_lang = self._switch_language_code(language)    
-  
-            # 獲取當前翻譯器    
-            current_translator = self.current_translator    
-            translator_func = self.translators[current_translator]    
-  
-            # 嘗試主要翻譯器    
-            result = await self.translation_manager.translate_with_fallback(    
-                translator_func, text, source_lang, target_lang    
-            )    
-  
-            # 如果主要翻譯失敗，嘗試故障轉移    
-            if result is None:    
-                with self.translation_manager.translation_lock:    
-                    self.translation_manager.error_counts[current_translator] = self.translation_manager.error_counts.get(current_translator, 0) + 1    
-  
-                    if self.translation_manager.error_counts[current_translator] >= self.translation_manager.error_threshold:    
-  
-                        for fallback_translator in self.translation_manager.fallback_order[current_translator]:    
-                            translator_func = self.translators[fallback_translator]    
-                            result = await self.translation_manager.translate_with_fallback(    
-                                translator_func, text, source_lang, target_lang    
-                            )    
-                            if result:    
-                                logger.info(f"Fallback to {fallback_translator} successful")    
-                                break    
-  
-            if not result:    
-                logger.error("All translation attempts failed")    
-                return "", ""    
-  
-            if language == "en-US":    
-                final_result = (result, text)    
-            else:    
-                final_result = (text, result)    
-  
-            # 更新快取    
-            self.translation_manager.cache.set(cache_key, final_result)    
-  
-            # 重置成功翻譯器的錯誤計數    
-            with self.translation_manager.translation_lock:    
-                self.translation_manager.error_counts[self.current_translator] = 0    
-  
-            return final_result    
-  
-        except Exception as e:    
-            logger.error(f"Translation error: {str(e)}")    
-            return "", ""    
-  
-    def _switch_language_code(self, language):    
-        """    
-        根據語言代碼設定源語言和目標語言    
-        """    
-        if language == "en-US":    
-            if self.current_translator == "DeepL":    
-                source_lang = "EN"    
-                target_lang = "ZH"    
-            elif self.current_translator in ["Azure"]:    
-                source_lang = "en"    
-                target_lang = "zh-Hans"    
-            elif self.current_translator == "Google":    
-                source_lang = "en"    
-                target_lang = "zh-TW"    
-        elif language == "zh-TW":    
-            if self.current_translator == "DeepL":    
-                source_lang = "ZH"    
-                target_lang = "EN-US"    
-            elif self.current_translator in ["Azure"]:
-                source_lang = "zh-Hans"
-                target_lang = "en"
-            elif self.current_translator == "Google":
-                source_lang = "zh-TW"
-                target_lang = "en-US"
-        else:    
-            # 默認為英語到中文    
-            source_lang = "en"    
-            target_lang = "zh-Hans"    
-        return source_lang, target_lang    
-  
-    async def _translate_with_deepl(self, text, source_lang, target_lang):    
-        """使用 DeepL 進行翻譯"""    
-        try:    
-            config = {
-                "text": text,    
-                "source_lang": source_lang,    
-                "target_lang": target_lang,
-                "model_type": "prefer_quality_optimized"
-            }
-            
-            response = await asyncio.get_event_loop().run_in_executor(    
-                None,    
-                lambda: self.DeepL_translator.translate_text(    
-                    **config
-                )    
-            )    
-            return response.text    
-        except Exception as e:    
-            logger.error(f"DeepL translation error: {e}")    
-            return ""    
-  
-    async def _translate_with_azure(self, text, source_lang, target_lang):    
-        """使用 Azure 翻譯服務進行翻譯"""    
-        try:    
-            from_language = source_lang
-            to_language = [target_lang]
-            input_text_elements = [text] 
-            response = await asyncio.get_event_loop().run_in_executor(    
-                None,    
-                lambda: self.azure_translator.translate(    
-                    body=input_text_elements,    
-                    to_language=to_language,    
-                    from_language=from_language    
-                )    
-            )    
-            translation = response[0] if response else None    
-  
-            if translation:    
-                return translation.translations[0].text    
-            return ""    
-        except HttpResponseError as exception:    
-            if exception.error is not None:    
-                logger.error(f"Error Code: {exception.error.code}")    
-                logger.error(f"Message: {exception.error.message}")    
-            return ""    
-  
-    async def _translate_with_google(self, text, source_lang, target_lang):    
-        """使用 Google 翻譯進行翻譯"""    
-        try:  
-            
-            config = {    
-                    "parent": PARENT,    
-                    "contents": [text],    
-                    "mime_type": "text/plain", 
-                    "source_language_code": source_lang,    
-                    "target_language_code": target_lang
-                } 
-            response = await asyncio.get_event_loop().run_in_executor(    
-                None,    
-                lambda: self.google_translator.translate_text(    
-                    request=config
-                )    
-            )    
-            if response.translations:    
-                return response.translations[0].translated_text    
-            return ""    
-        except Exception as e:    
-            logger.error(f"Google translation error: {e}")    
-            return ""    
-  
-    def _update_full_text(self, ch_text, en_text):    
-        """更新完整文本"""    
-        self.full_text["ch"] += ch_text    
-        self.full_text["en"] += en_text    
-  
-        # 限制文本長度    
-        max_length = 19 * 12    
-        self.full_text["ch"] = self.full_text["ch"][-max_length:]    
-        self.full_text["en"] = self.full_text["en"][-max_length:]    
-  
-        self.previous_completed["mix"] = self.previous_completed["mix"][-max_length:]    
+                metrics.ERRORS.labels("recognizer").inc()
+                logger.error(f"Recognition handler error: {e}")    
+
+    def _record_event(self, event):
+        """錄製識別事件供離線重播（replay.py），經由逐字稿寫入器寫入 JSONL"""
+        if not RECORD_EVENTS:
+            return
+        self.transcript_writer.write("events", json.dumps(event.to_dict(), ensure_ascii=False) + "\n")
+
+    async def _process_recognizing(self, event):
+        """在事件循環上翻譯部分結果並傳送至前端"""
+        if self.stop_flag:
+            return
+        text = event.text
+        language = event.language
+
+        # 不值得翻譯或預算用盡的部分結果直接略過，字幕等下一次更新
+        cost = 1 + len(self._track_targets(language))
+        if self.partial_policy.decide(text, event.stability, cost) != TRANSLATE:
+            return
+
+        # 執行翻譯，同時翻譯有訂閱者的其他目標語言；被較新的部分結果取消時，已送出的請求仍計費
+        requests = [0]
+        token = backend_requests.set(requests)
+        try:
+            if PREFIX_STABLE_TRANSLATION:
+                # 混合字幕只翻譯尚未穩定的尾句，與字幕軌翻譯的全文不同，無法併入同一個請求
+                (ch_text, en_text), translations = await asyncio.gather(
+                    self._translate_partial(text, language), self._translate_tracks(text, language, partial=True)
+                )
+            else:
+                (ch_text, en_text), translations = await self._translate_with_tracks(text, language, partial=True)
+        finally:
+            backend_requests.reset(token)
+            self.partial_policy.charge(requests[0])
+
+        display_text = ch_text if language == self.languages[0] else en_text    
+        self._emit_caption(display_text, language)
+        metrics.CAPTION_LATENCY_SECONDS.observe(time.monotonic() - event.received)
+        self._emit_track_captions(self._with_mixed_translation(translations, language, display_text))
   
-    def format_mixed_text(self, current_text: str) -> tuple:  
-        MAX_SENTENCES_PER_PARAGRAPH = 4  
-
-        def split_into_sentences(text):
-            sentences = re.split(r'(?<=[.!?。！？])\s*', text)
-            sentences = [s for s in sentences if s.strip()]  
-            return sentences  
-        
-        def join_sentences(sentences):  
-            return ''.join(sentences)  
-
-        prev_prev_sentences = []   
-        prev_sentences = []  
-
-        current_sentences = split_into_sentences(current_text)  
-
-        prev_text = self.previous_completed.get("mix", "")
-        prev_text_sentences = split_into_sentences(prev_text)  
-        prev_prev_text = self.previous_completed.get("prev_prev", "")
-        prev_prev_text_sentences = split_into_sentences(prev_prev_text)  
-
-        if len(current_sentences) > MAX_SENTENCES_PER_PARAGRAPH:  
-            sentences_to_move = current_sentences[:MAX_SENTENCES_PER_PARAGRAPH]  
-            current_sentences = current_sentences[MAX_SENTENCES_PER_PARAGRAPH:]  
-            prev_sentences.extend(sentences_to_move)  
-    
-            if len(prev_sentences) > MAX_SENTENCES_PER_PARAGRAPH:  
-                num_extra = len(prev_sentences) - MAX_SENTENCES_PER_PARAGRAPH  
-                extra_sentences = prev_sentences[:num_extra]  
-                prev_sentences = prev_sentences[num_extra:]  
-    
-                prev_prev_sentences.extend(extra_sentences)  
-    
-                if len(prev_prev_sentences) > MAX_SENTENCES_PER_PARAGRAPH:  
-                    prev_prev_sentences = prev_prev_sentences[-MAX_SENTENCES_PER_PARAGRAPH:]  
+        # 保存當前語言信息    
+        self.current_language = language    
+
+    def _subscribed_languages(self):
+        """有客戶端訂閱的目標語言"""
+        return [language for language, track in self.tracks.items() if track.subscribers]
+
+    def _track_targets(self, language):
+        """需要另外翻譯的字幕軌語言：與語言對翻譯方向相同的語言會沿用混合字幕的譯文，不另外請求"""
+        mixed_target = self.languages[1] if language == self.languages[0] else self.languages[0]
+        return [target for target in self._subscribed_languages() if target != mixed_target]
+
+    async def _translate_tracks(self, text, language, partial=False):
+        """翻譯有訂閱者的字幕軌語言，回傳 {語言: 譯文}"""
+        targets = self._track_targets(language)
+        if not targets:
+            return {}
+        return await self.translation_manager.translate_many(text, language, targets, partial)
+
+    async def _translate_with_tracks(self, text, language, partial=False):
+        """
+        翻譯混合字幕與有訂閱者的字幕軌，回傳 ((中文, 英文), {語言: 譯文})
+        有字幕軌時混合字幕的目標語言與字幕軌語言一起交給 translate_many，
+        首選翻譯器為 Azure 時所有未命中快取的語言以同一個多目標請求翻譯
+        """
+        targets = self._track_targets(language)
+        if not targets:
+            return await self._translate_text(text, language, partial), {}
+        mixed_target = self.languages[1] if language == self.languages[0] else self.languages[0]
+        translations = await self.translation_manager.translate_many(text, language, [mixed_target] + targets, partial)
+        mixed_translation = translations.pop(mixed_target, "")
+        if not mixed_translation:
+            return ("", ""), translations
+        return self._to_result_pair(mixed_translation, text, language), translations
+
+    def _with_mixed_translation(self, translations, language, mixed_translation):
+        """補上與混合字幕相同方向的字幕軌譯文"""
+        mixed_target = self.languages[1] if language == self.languages[0] else self.languages[0]
+        if self.tracks[mixed_target].subscribers:
+            translations = dict(translations, **{mixed_target: mixed_translation})
+        return translations
+
+    def _emit_track_captions(self, translations):
+        """將各語言的譯文送往對應字幕軌的房間，翻譯失敗的語言維持原本的字幕"""
+        for language, translation in translations.items():
+            if not translation:
+                continue
+            track = self.tracks[language]
+            if CAPTION_PROTOCOL == "delta":
+                delta = track.update(translation)
+                if delta:
+                    self.socketio.emit('caption_delta', delta, to=track.room)
+            else:
+                display_text = '<br>'.join(filter(None, track.paragraphs(translation)))
+                self.socketio.emit('update_text', {'text': display_text, 'lang': language}, to=track.room)
+
+    def _emit_caption(self, display_text, language):
+        """依字幕協定傳送字幕：增量模式只送出變動的尾端段落，完整模式送出整段 HTML"""
+        start = time.perf_counter()
+        if CAPTION_PROTOCOL == "delta":
+            delta = self.captions.update(self.format_mixed_paragraphs(display_text), language)
+            metrics.FORMAT_SECONDS.observe(time.perf_counter() - start)
+            if delta:
+                self._emit_timed('caption_delta', delta)
+            return
+
+        current_text, prev_text = self.format_mixed_text(display_text)  
+        display_text = prev_text + "<br>" + current_text if prev_text else current_text    
+        metrics.FORMAT_SECONDS.observe(time.perf_counter() - start)
+        self._emit_timed('update_text', {'text': display_text, 'lang': language})
+
+    def _emit_timed(self, event, data):
+        """
+        送出場次字幕；threading 模式的 emit 直接交給 Flask-SocketIO，在此計時，
+        asgi 模式的 emit 只是排入佇列，由 AsyncEmitter 計時實際送出的時間
+        """
+        if SERVER_MODE == "asgi":
+            self.socketio.emit(event, data, to=self.session_id)
+            return
+        start = time.perf_counter()
+        self.socketio.emit(event, data, to=self.session_id)
+        metrics.EMIT_SECONDS.observe(time.perf_counter() - start)
+
+    async def _process_recognized(self, event):
+        """在事件循環上翻譯最終結果、更新狀態並寫入文件"""
+        # 獲取時間和文本信息    
+        start_time = event.offset / 10**7    
+        end_time = (event.offset + event.duration) / 10**7    
+        text = event.text
+        language = event.language
+        self.partial_policy.final()
+
+        # 最終結果與最後一次部分結果相同時直接沿用其翻譯；只有實際送往翻譯器的請求計入預算
+        requests = [0]
+        token = backend_requests.set(requests)
+        try:
+            promoted = self._take_partial_translation(text, language)
+            if promoted:
+                ch_text, en_text = promoted
+                translations = await self._translate_tracks(text, language)
             else:
-                prev_prev_sentences = prev_text_sentences
-        else:  
-            prev_sentences = prev_text_sentences
-            prev_prev_sentences = prev_prev_text_sentences
-
-    
-        combined_prev_text = '<br>'.join(filter(None, [  
-            join_sentences(prev_prev_sentences[-MAX_SENTENCES_PER_PARAGRAPH:]),  
-            join_sentences(prev_sentences[-MAX_SENTENCES_PER_PARAGRAPH:])  
-        ]))  
-    
-        current_paragraph = join_sentences(current_sentences)  
-    
-        return current_paragraph, combined_prev_text  
+                (ch_text, en_text), translations = await self._translate_with_tracks(text, language)
+        finally:
+            backend_requests.reset(token)
+            self.partial_policy.charge(requests[0])
+        mixed_target = self.languages[1] if language == self.languages[0] else self.languages[0]
+        mixed_translation = ch_text if language == self.languages[0] else en_text
+        translations = self._with_mixed_translation(translations, language, mixed_translation)
+        for track_language, translation in translations.items():
+            self.tracks[track_language].commit(translation)
+        # 記錄已完成的語句：原文與所有翻譯成功的語言
+        recorded = dict(translations, **{mixed_target: mixed_translation})
+        recorded = {lang: value for lang, value in recorded.items() if value}
+        self.history.append(start_time, end_time, language, event.text, recorded)
+        self.transcript_writer.write("segments", {
+            "start": start_time,
+            "end": end_time,
+            "language": language,
+            "text": event.text,
+            "translations": recorded,
+        })
+
+        # 更新完成的文本    
+        self.previous_completed["prev_prev"] = self.previous_completed["mix"]
+        if language == self.languages[0]:
+            self.previous_completed["mix"] = ch_text
+            text = en_text
+        else:
+            self.previous_completed["mix"] = en_text    
+            text = ch_text
+  
+        # 限制已完成段落的長度    
+        self.previous_completed["mix"] = self.previous_completed["mix"][-self.max_completed_length:]    
+        self.sentence_buffer.commit(self.previous_completed["mix"], self.previous_completed["prev_prev"])
+  
+        # 寫入文件    
+        self._write_to_files(start_time, end_time, text, self.previous_completed["mix"])    
+  
+    async def _translate_text(self, text, language, partial=False):
+        """
+        將識別結果翻譯成語言對中的另一個語言，回傳 (中文, 英文) 元組
+        非預設語言對時，元組依序為 (次要語言, 主要語言)
+        """
+        target_language = self.languages[1] if language == self.languages[0] else self.languages[0]
+        translation = await self.translation_manager.translate(text, language, target_language, partial)
+        if not translation:
+            return "", ""
+        return self._to_result_pair(translation, text, language)
+
+    def _to_result_pair(self, translation, text, language):
+        """將譯文與原文組成 (中文, 英文) 元組"""
+        if language == self.languages[0]:    
+            return translation, text    
+        return text, translation    
+  
+    async def _translate_partial(self, text, language):
+        """
+        前綴穩定的部分結果翻譯
+        已結束的句子只翻譯一次並重複使用，只有尚未穩定的尾句送往翻譯服務
+        """
+        state = self.partial_state
+        if state["language"] != language:
+            state["language"] = language
+            state["sentences"] = {}
+
+        sentences = split_into_sentences(text)
+        if not sentences:
+            return "", ""
+
+        # 最後一句仍可能被識別器修改，視為不穩定
+        closed, tail = sentences[:-1], sentences[-1]
+        reused = state["sentences"]
+        pending = [s for s in dict.fromkeys(closed) if s not in reused]
+
+        results = await asyncio.gather(
+            *(self._translate_text(s, language, partial=True) for s in pending + [tail])
+        )
+        translated = dict(zip(pending, results[:-1]))
+        tail_result = results[-1]
+
+        # 譯文在結果元組中的位置，英文來源取中文譯文，反之取英文譯文
+        index = 0 if language == self.languages[0] else 1
+        # 中日韓文的譯文句子之間不加空白
+        target_language = self.languages[1] if index == 0 else self.languages[0]
+        joiner = "" if target_language.split("-")[0] in ("zh", "ja", "ko") else " "
+
+        # 只保留仍出現在前綴中且翻譯成功的句子；近似重複的譯文只用於這次顯示，不被沿用
+        state["sentences"] = {}
+        parts = []
+        for sentence in closed:
+            result = reused.get(sentence) or translated.get(sentence, ("", ""))
+            if result[index] and not isinstance(result[index], NearDuplicateHit):
+                state["sentences"][sentence] = result
+            parts.append(result[index])
+        parts.append(tail_result[index])
+        translation = joiner.join(p for p in parts if p)
+
+        final_result = self._to_result_pair(translation, text, language)
+        state["text"] = text
+        # 只有所有句子都翻譯成功且都是精確命中或翻譯器的譯文時，才可被最終結果沿用
+        exact = all(p and not isinstance(p, NearDuplicateHit) for p in parts)
+        state["result"] = final_result if exact else None
+        return final_result
+
+    def _take_partial_translation(self, text, language):
+        """
+        取出與最終結果相同的部分結果翻譯，並重置前綴狀態
+        """
+        state = self.partial_state
+        result = None
+        if (PREFIX_STABLE_TRANSLATION and state["result"]
+                and state["language"] == language and state["text"] == text):
+            result = state["result"]
+        self.partial_state = {"language": None, "sentences": {}, "text": "", "result": None}
+        return result
+
+    def format_mixed_text(self, current_text: str) -> tuple:  
+        """回傳 (當前段落, 以 <br> 連接的前兩段)，供完整文字模式使用"""
+        prev_prev_paragraph, prev_paragraph, current_paragraph = self.format_mixed_paragraphs(current_text)
+        combined_prev_text = '<br>'.join(filter(None, [prev_prev_paragraph, prev_paragraph]))
+        return current_paragraph, combined_prev_text
+
+    def format_mixed_paragraphs(self, current_text: str) -> list:  
+        """將已完成的文本與當前文本整理為 [前前段, 前段, 當前段]"""
+        buffer = self.sentence_buffer
+        return layout_paragraphs(
+            buffer.partial_sentences(current_text),
+            buffer.completed["mix"],
+            buffer.completed["prev_prev"],
+        )
   
     def _write_to_files(self, start_time, end_time, text, translate_text):    
         """寫入文件"""    
@@ -564,14 +1184,14 @@ class ContinuousTranslation:
             end_timestamp = self._format_time(end_time)    
   
             # 寫入原文    
-            self._write_to_file(    
-                self.file_paths["text"],    
+            self.transcript_writer.write(    
+                "text",    
                 f"{timestamp}-{end_timestamp} {text}\n"    
             )    
   
             # 寫入翻譯    
-            self._write_to_file(    
-                self.file_paths["translation"],    
+            self.transcript_writer.write(    
+                "translation",    
                 f"{timestamp}-{end_timestamp} {translate_text}\n"    
             )    
   
@@ -585,45 +1205,579 @@ class ContinuousTranslation:
         formatted = str(delta).split('.')[0]    
         return formatted[2:] if formatted.startswith("0:") else formatted    
   
-    def _write_to_file(self, file_path, content):    
-        """寫入文件的輔助方法"""    
-        with open(file_path, 'a', encoding='utf-8') as f:    
-            f.write(content)    
-  
-    def cleanup(self):    
-        """清理資源"""    
+    def stop(self):
+        """停止語音識別，剩餘的最終結果處理完後 translation_continuous 即結束"""
+        self.stop_flag = True
+        if self.audio_ring is not None:
+            self.audio_ring.close()
+        if self.recognizer is not None:
+            self.recognizer.stop()
+        if self.loop is not None and self.done_event is not None:
+            self.loop.call_soon_threadsafe(self.done_event.set)
+
+    def describe(self):
+        """場次資訊"""
+        return {
+            "session_id": self.session_id,
+            "languages": list(self.languages),
+            "targets": list(self.tracks),
+            "audio": "stream" if self.audio_stream else self.file_name or "microphone",
+            "running": not self.stop_flag,
+            "history_segments": self.history.size,
+        }
+
+    async def cleanup(self):    
+        """清理資源；等待寫入器寫完剩餘內容時在執行緒中等待，不阻塞其他場次"""    
         try:    
             self.stop_flag = True    
-            self.translation_manager.stop_flag = True    
-            logger.info("Translation service cleaned up successfully")    
+            if self.audio_ring is not None:
+                self.audio_ring.close()
+            await asyncio.to_thread(self.transcript_writer.close)
+            logger.info(f"Translation service {self.session_id} cleaned up successfully")    
         except Exception as e:    
             logger.error(f"Translation service cleanup error: {e}")    
   
+class SessionManager:
+    """
+    場次管理器：建立、停止與列出同時進行的翻譯場次
+    所有場次共用同一個翻譯管理器（快取、翻譯器客戶端）與同一個事件循環；
+    未指定事件循環時（threading 模式）自行建立事件循環執行緒
+    """
+    def __init__(self, socketio, translation_manager, loop=None):
+        self.socketio = socketio
+        self.translation_manager = translation_manager
+        self.sessions = {}
+        self.lock = Lock()
+        self.owns_loop = loop is None
+        if self.owns_loop:
+            self.loop = asyncio.new_event_loop()
+            self.thread = Thread(target=self.loop.run_forever, name="translation-loop", daemon=True)
+            self.thread.start()
+        else:
+            self.loop = loop
+
+    def create(self, session_id=None, languages=("en-US", "zh-TW"), file_name=None, targets=TARGET_LANGUAGES,
+               audio_stream=False):
+        """建立並啟動新場次，回傳場次物件"""
+        session_id = session_id or uuid.uuid4().hex[:8]
+        if not valid_session_id(session_id):
+            raise ValueError(f"Invalid session id {session_id!r}")
+        with self.lock:
+            current = self.sessions.get(session_id)
+            if current and not current[1].done():
+                raise ValueError(f"Session {session_id} already exists")
+            service = ContinuousTranslation(
+                self.socketio,
+                self.translation_manager,
+                session_id=session_id,
+                languages=languages,
+                file_name=file_name,
+                targets=targets,
+                audio_stream=audio_stream
+            )
+            future = asyncio.run_coroutine_threadsafe(service.translation_continuous(), self.loop)
+            self.sessions[session_id] = (service, future)
+        # 在鎖外註冊：場次已失敗時回呼會立即在此執行緒執行，並需要取得鎖
+        future.add_done_callback(lambda f: self._session_ended(session_id, f))
+        logger.info(f"Session {session_id} started: {service.describe()}")
+        return service
+
+    def stop(self, session_id):
+        """停止場次，回傳是否存在該場次"""
+        with self.lock:
+            entry = self.sessions.pop(session_id, None)
+        if entry is None:
+            return False
+        entry[0].stop()
+        return True
+
+    def get(self, session_id):
+        entry = self.sessions.get(session_id)
+        return entry[0] if entry else None
+
+    def list(self):
+        with self.lock:
+            return [service.describe() for service, _ in self.sessions.values()]
+
+    def unsubscribe(self, sid):
+        """客戶端斷線時自所有字幕軌移除"""
+        for service, _ in list(self.sessions.values()):
+            for track in service.tracks.values():
+                track.subscribers.discard(sid)
+
+    def _session_ended(self, session_id, future):
+        """場次以錯誤結束（例如識別器無法建立）時記錄錯誤並自場次列表移除"""
+        if future.cancelled() or not future.exception():
+            return
+        logger.error(f"Session {session_id} error: {future.exception()}")
+        with self.lock:
+            entry = self.sessions.get(session_id)
+            if entry is not None and entry[1] is future:
+                del self.sessions[session_id]
+
+    def _stop_all(self):
+        with self.lock:
+            entries = list(self.sessions.values())
+            self.sessions.clear()
+        for service, _ in entries:
+            service.stop()
+        return [future for _, future in entries]
+
+    def shutdown(self, timeout=10.0):
+        """停止所有場次並關閉共用資源（不可在事件循環上呼叫）"""
+        for future in self._stop_all():
+            try:
+                future.result(timeout)
+            except Exception as e:
+                logger.error(f"Session shutdown error: {e}")
+        self.translation_manager.close()
+        if self.owns_loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def shutdown_async(self, timeout=10.0):
+        """在事件循環上停止所有場次並關閉共用資源（asgi 模式）"""
+        futures = [asyncio.wrap_future(future) for future in self._stop_all()]
+        if futures:
+            _, pending = await asyncio.wait(futures, timeout=timeout)
+            if pending:
+                logger.error(f"{len(pending)} sessions did not stop within {timeout}s")
+        # 關閉快取會等待寫入執行緒寫完剩餘內容
+        await asyncio.to_thread(self.translation_manager.close)
+
 @app.route('/')    
 def index():    
     """渲染主頁面"""    
     return render_template('index.html')    
-  
+
+@app.route('/routing')
+def routing():
+    """回傳翻譯器路由狀態（熔斷器狀態、EWMA 延遲與錯誤率）"""
+    if session_manager is None:
+        return jsonify({"error": "Translation service not started"}), 503
+    return jsonify(session_manager.translation_manager.router.snapshot())
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """以 Prometheus 文字格式輸出各階段延遲直方圖與計數器"""
+    return metrics.REGISTRY.render(), 200, {"Content-Type": metrics.CONTENT_TYPE}
+
+def collect_service_metrics():
+    """抓取時才讀取的狀態指標：各場次管線、調度器、對沖與快取統計"""
+    if session_manager is None:
+        return []
+    manager = session_manager.translation_manager
+    sessions = [service for service, _ in list(session_manager.sessions.values())]
+    pipelines = [service for service in sessions if getattr(service, "pipeline", None)]
+    cache_stats = manager.cache.get_stats()
+    manager_emitter = session_manager.socketio
+    return [
+        ("livescribe_sessions", "Running translation sessions", [({}, len(sessions))]),
+        ("livescribe_pipeline_events", "Recognition pipeline counters by session",
+         [({"session": service.session_id, "stat": name}, value)
+          for service in pipelines for name, value in service.pipeline.stats.items()]),
+        ("livescribe_dispatcher_events", "Translation dispatcher counters",
+         [({"stat": name}, value) for name, value in manager.dispatcher.stats.items()]),
+        ("livescribe_hedge_events", "Hedged request counters",
+         [({"stat": name}, value) for name, value in manager.hedge_stats.items()]),
+        ("livescribe_cache_events", "Translation cache counters by tier",
+         [({"tier": tier, "stat": name}, value)
+          for tier, stats in cache_stats.items() for name, value in stats.items()]),
+        ("livescribe_audio_buffer", "Audio ingest ring buffer state by session",
+         [({"session": service.session_id, "stat": name}, value)
+          for service in sessions if service.audio_ring is not None
+          for name, value in service.audio_ring.snapshot().items()]),
+        ("livescribe_backend_ewma_latency_seconds", "EWMA latency per translation backend",
+         [({"backend": name}, health.latency) for name, health in manager.router.health.items()]),
+        ("livescribe_backend_startup_seconds", "Translation backend client load and warm-up probe time",
+         [({"backend": name, "phase": "load"}, value) for name, value in manager.backends.load_seconds.items()]
+         + [({"backend": name, "phase": "warm_up"}, value) for name, value in manager.warm_up_seconds.items()]),
+        ("livescribe_partial_policy", "Partial translation policy state and decisions by session",
+         [({"session": service.session_id, "stat": name}, value)
+          for service in sessions for name, value in service.partial_policy.snapshot().items()]),
+        ("livescribe_partial_policy_settings", "Partial translation policy thresholds by session",
+         [({"session": service.session_id, "setting": name}, value)
+          for service in sessions for name, value in service.partial_policy.settings().items()]),
+        ("livescribe_fanout", "Caption fan-out publisher counters",
+         [({"stat": name}, value) for name, value in
+          (manager_emitter.snapshot_stats() if isinstance(manager_emitter, CaptionPublisher) else {}).items()]),
+        ("livescribe_client_queues", "Per-client send queue state and counters",
+         [({"stat": name}, value) for name, value in
+          (client_outbox.snapshot_stats() if client_outbox is not None else {}).items()]),
+        ("livescribe_memory_events", "Translation memory and glossary counters",
+         [({"stat": name}, value) for name, value in (manager.memory.get_stats() if manager.memory else {}).items()]),
+    ]
+
+metrics.REGISTRY.register_collector(collect_service_metrics)
+
+@app.route('/sessions', methods=['GET'])
+def list_sessions():
+    """列出所有場次"""
+    if session_manager is None:
+        return jsonify({"error": "Translation service not started"}), 503
+    return jsonify(session_manager.list())
+
+@app.route('/sessions', methods=['POST'])
+def create_session():
+    """
+    建立場次，參數：session_id、languages（語言對）、file_name（音訊檔，省略則使用麥克風）、
+    targets（額外的目標語言，省略則使用 TARGET_LANGUAGES）、audio（"stream" 表示由 Socket.IO 接收音訊）
+    """
+    if session_manager is None:
+        return jsonify({"error": "Translation service not started"}), 503
+    params = request.get_json(silent=True) or {}
+    session_id = params.get("session_id")
+    if session_id is not None and not valid_session_id(session_id):
+        return jsonify({"error": "invalid session_id"}), 400
+    languages = params.get("languages") or ["en-US", "zh-TW"]
+    if (not isinstance(languages, list) or len(languages) != 2
+            or not all(isinstance(language, str) for language in languages)):
+        return jsonify({"error": "languages must be a pair"}), 400
+    targets = params.get("targets") or TARGET_LANGUAGES
+    if not isinstance(targets, (list, tuple)) or not all(isinstance(target, str) for target in targets):
+        return jsonify({"error": "targets must be a list"}), 400
+    file_name = params.get("file_name")
+    if file_name is not None:
+        file_name = audio_file_path(file_name) if isinstance(file_name, str) else None
+        if file_name is None:
+            return jsonify({"error": f"file_name must be inside {AUDIO_FILE_DIR}"}), 400
+    try:
+        service = session_manager.create(
+            session_id=session_id,
+            languages=languages,
+            file_name=file_name,
+            targets=targets,
+            audio_stream=params.get("audio") == "stream"
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return jsonify(service.describe()), 201
+
+@app.route('/sessions/<session_id>', methods=['DELETE'])
+def stop_session(session_id):
+    """停止場次"""
+    if session_manager is None or not session_manager.stop(session_id):
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify({"session_id": session_id, "stopped": True})
+
+def _query_number(name, convert):
+    """讀取數值查詢參數，省略時回傳 None，格式錯誤時拋出 ValueError"""
+    value = request.args.get(name)
+    return convert(value) if value else None
+
+@app.route('/sessions/<session_id>/history')
+def session_history(session_id):
+    """
+    分頁查詢場次已完成的語句，參數（擇一）：after=ID 往新的方向、before=ID 往舊的方向、
+    since=秒數 從該時間位移開始；皆省略時回傳最新的語句。limit 預設 50，上限 500
+    """
+    service = session_manager.get(session_id) if session_manager else None
+    if service is None:
+        return jsonify({"error": "Session not found"}), 404
+    try:
+        after = _query_number("after", int)
+        before = _query_number("before", int)
+        since = _query_number("since", float)
+        limit = min(_query_number("limit", int) or 50, 500)
+    except ValueError:
+        return jsonify({"error": "invalid pagination parameters"}), 400
+    return jsonify(service.history.page(after=after, before=before, since=since, limit=limit))
+
+@app.route('/sessions/<session_id>/export')
+def export_session(session_id):
+    """
+    從語句存放區串流匯出字幕，參數：format（srt、vtt、json，預設 srt）、date（YYYYMMDD，預設今天）、
+    start/end（秒數範圍）、language（字幕語言，省略時為原文；json 一律包含原文與所有譯文）
+    場次結束後仍可匯出
+    """
+    fmt = request.args.get("format", "srt")
+    date = request.args.get("date") or datetime.now().strftime('%Y%m%d')
+    language = request.args.get("language")
+    if fmt not in FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(FORMATS)}"}), 400
+    if (not valid_session_id(session_id) or not re.fullmatch(r"\d{8}", date)
+            or language and not re.fullmatch(r"[\w-]+", language)):
+        return jsonify({"error": "invalid session_id, date or language"}), 400
+    try:
+        start = _query_number("start", float)
+        end = _query_number("end", float)
+    except ValueError:
+        return jsonify({"error": "invalid time range"}), 400
+    path = (transcript_prefix(session_id) + "segments.jsonl").format(date=date)
+    if not os.path.exists(index_path(path)):
+        return jsonify({"error": "No segments for this session and date"}), 404
+    filename = f"{session_id}_{date}" + (f"_{language}" if language and fmt != "json" else "") + f".{fmt}"
+    return Response(
+        export_segments(path, fmt, start, end, language),
+        mimetype=FORMATS[fmt],
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
+def _translation_memory():
+    if session_manager is None:
+        return None
+    return session_manager.translation_manager.memory
+
+@app.route('/memory', methods=['GET'])
+def export_memory():
+    """以 JSONL 匯出翻譯記憶的句段與術語"""
+    memory = _translation_memory()
+    if memory is None:
+        return jsonify({"error": "Translation memory not enabled"}), 503
+    return Response(memory.export_lines(), mimetype="application/x-ndjson")
+
+@app.route('/memory', methods=['POST'])
+def import_memory():
+    """匯入 JSONL 格式的句段與術語（請求主體每行一筆），回傳各類筆數"""
+    memory = _translation_memory()
+    if memory is None:
+        return jsonify({"error": "Translation memory not enabled"}), 503
+    counts = memory.import_lines(request.get_data(as_text=True).splitlines())
+    return jsonify(counts), 400 if counts["errors"] and not (counts["segments"] or counts["terms"]) else 200
+
+@app.route('/memory/stats')
+def memory_stats():
+    """翻譯記憶的命中統計"""
+    memory = _translation_memory()
+    if memory is None:
+        return jsonify({"error": "Translation memory not enabled"}), 503
+    return jsonify(memory.get_stats())
+  
+def _find_session(data):
+    """依事件參數取得場次 ID 與場次物件"""
+    session_id = (data or {}).get("session_id") or "default"
+    return session_id, session_manager.get(session_id) if session_manager else None
+
+def subscribe_client(sid, data):
+    """
+    處理 join：回傳客戶端應加入的房間
+    指定 language 時只訂閱該語言的字幕軌，否則接收語言對的混合字幕
+    """
+    session_id, service = _find_session(data)
+    language = (data or {}).get("language")
+    track = service.tracks.get(language) if service is not None and language else None
+    if track is not None:
+        track.subscribers.add(sid)
+        logger.info(f"Client {sid} joined session {session_id} ({language})")
+        return track.room
+    if language:
+        logger.warning(f"Session {session_id} has no {language} track, using mixed captions")
+    logger.info(f"Client {sid} joined session {session_id}")
+    return session_id
+
+def caption_snapshot(data):
+    """
+    處理 join 與 caption_resync：回傳完整字幕快照
+    場次尚不存在時回傳空白快照，場次建立後客戶端即可依序號接收增量
+    """
+    _, service = _find_session(data)
+    if service is None:
+        return CaptionState().snapshot()
+    language = (data or {}).get("language")
+    track = service.tracks.get(language) if language else None
+    return (track.captions if track is not None else service.captions).snapshot()
+
+def write_audio_chunk(data):
+    """
+    處理 audio_chunk：寫入網路音訊串流的 PCM 片段（格式見 AUDIO_INGEST_FORMAT），
+    回傳 ack：accepted 為 False 表示有音訊被丟棄，傳送端可依 fill 放慢
+    """
+    _, service = _find_session(data)
+    if service is None or not service.audio_stream:
+        return {"accepted": False, "error": "Session does not accept audio"}
+    accepted, fill = service.write_audio(data.get("audio") or b"")
+    return {"accepted": accepted, "fill": fill}
+
+def end_audio_stream(data):
+    """處理 audio_end：網路音訊串流結束"""
+    _, service = _find_session(data)
+    if service is not None and service.audio_stream:
+        service.end_audio()
+
+def unsubscribe_client(sid):
+    """處理 disconnect：自所有字幕軌與傳送佇列移除"""
+    if session_manager is not None:
+        session_manager.unsubscribe(sid)
+    if client_outbox is not None:
+        client_outbox.leave(sid)
+
+def join_client_queue(sid, data, room, snapshot):
+    """宣告 ack 的客戶端改由自己的傳送佇列接收房間的字幕，快照為佇列中的第一則；回傳是否使用佇列"""
+    if client_outbox is None or not (data or {}).get("ack"):
+        return False
+    client_outbox.join(sid, room, 'caption_delta', snapshot)
+    return True
+
 @socketio.on('connect')
 def handle_connect():
     client_ip = request.remote_addr
     logger.info(f"Client connected: {request.sid}, IP: {client_ip}")
 
+@socketio.on('join')
+def handle_join(data):
+    """客戶端依場次 ID 加入對應的房間，並立即收到目前的字幕快照"""
+    room = subscribe_client(request.sid, data)
+    snapshot = caption_snapshot(data)
+    if not join_client_queue(request.sid, data, room, snapshot):
+        join_room(room)
+        emit('caption_delta', snapshot)
+
+@socketio.on('caption_resync')
+def handle_caption_resync(data):
+    """客戶端偵測到序號不連續時要求完整快照，使用佇列的客戶端由佇列送出以維持順序"""
+    snapshot = caption_snapshot(data)
+    if client_outbox is None or not client_outbox.send(request.sid, 'caption_delta', snapshot):
+        emit('caption_delta', snapshot)
+
+@socketio.on('audio_chunk')
+def handle_audio_chunk(data):
+    """接收網路音訊串流的 PCM 片段"""
+    return write_audio_chunk(data)
+
+@socketio.on('audio_end')
+def handle_audio_end(data):
+    """網路音訊串流結束"""
+    end_audio_stream(data)
+
 @socketio.on('disconnect')
 def handle_disconnect():
+    unsubscribe_client(request.sid)
     logger.info(f"Client disconnected: {request.remote_addr}")
-  
-def start_translation_service(service):    
-    """啟動翻譯服務"""    
-    asyncio.run(service.translation_continuous())    
-  
-if __name__ == '__main__':    
-    service = ContinuousTranslation(socketio)    
-    recognition_thread = Thread(target=start_translation_service, args=(service,), daemon=True)    
-    recognition_thread.start()
+
+def register_async_handlers(sio):
+    """在 python-socketio AsyncServer 上註冊與 threading 模式相同的事件處理"""
+    @sio.event
+    async def connect(sid, environ):
+        logger.info(f"Client connected: {sid}, IP: {environ.get('REMOTE_ADDR')}")
+
+    @sio.event
+    async def join(sid, data):
+        room = subscribe_client(sid, data)
+        snapshot = caption_snapshot(data)
+        if not join_client_queue(sid, data, room, snapshot):
+            await sio.enter_room(sid, room)
+            await sio.emit('caption_delta', snapshot, to=sid)
+
+    @sio.event
+    async def caption_resync(sid, data):
+        snapshot = caption_snapshot(data)
+        if client_outbox is None or not client_outbox.send(sid, 'caption_delta', snapshot):
+            await sio.emit('caption_delta', snapshot, to=sid)
+
+    @sio.event
+    async def audio_chunk(sid, data):
+        # 阻塞式背壓會等待緩衝區空間，改在執行緒中寫入以免卡住事件循環
+        if AUDIO_BACKPRESSURE == BLOCK:
+            return await asyncio.to_thread(write_audio_chunk, data)
+        return write_audio_chunk(data)
+
+    @sio.event
+    async def audio_end(sid, data):
+        end_audio_stream(data)
+
+    @sio.event
+    async def disconnect(sid):
+        unsubscribe_client(sid)
+        logger.info(f"Client disconnected: {sid}")
+
+def create_translation_manager():
+    """依設定建立共用的翻譯管理器"""
+    memory = TranslationMemory(TRANSLATION_MEMORY_PATH) if TRANSLATION_MEMORY_PATH else None
+    if memory is not None and TRANSLATION_MEMORY_IMPORT:
+        memory.import_file(TRANSLATION_MEMORY_IMPORT)
+    return TranslationManager(    
+        TRANSLATOR,
+        max_workers=4,    
+        cache_size=1000,
+        cache_path=CACHE_DB_PATH,
+        near_duplicate=CACHE_NEAR_DUPLICATE,
+        hedge_percentile=HEDGE_PERCENTILE,
+        hedge_budget=HEDGE_BUDGET,
+        batch_window=BATCH_WINDOW_MS / 1000,
+        batch_max_items=BATCH_MAX_ITEMS,
+        memory=memory,
+        fallbacks=TRANSLATOR_FALLBACKS
+    )    
+
+def create_client_outbox(local):
+    """設定 CLIENT_SEND_QUEUES 時以每位客戶端的傳送佇列包裝本行程的傳送器"""
+    global client_outbox
+    if not CLIENT_SEND_QUEUES:
+        return local
+    client_outbox = ClientOutbox(local, CLIENT_SEND_WINDOW, CLIENT_QUEUE_DEPTH, CLIENT_ACK_TIMEOUT)
+    return client_outbox
+
+def create_caption_emitter(local, loop=None):
+    """
+    設定 FANOUT_BROKER 時以發布端包裝本行程的傳送器，邊緣節點的加入與離開交給相同的訂閱處理，
+    並在場次的事件循環 loop 上執行
+    """
+    if not FANOUT_BROKER:
+        return local
+    logger.info(f"Publishing captions to {FANOUT_BROKER}")
+    return CaptionPublisher(local, FANOUT_BROKER, subscribe_client, caption_snapshot, unsubscribe_client, loop=loop)
+
+def run_threading():
+    """相容模式：Flask-SocketIO 執行緒模式，翻譯管線在獨立的事件循環執行緒"""
+    global session_manager
+    emitter = create_caption_emitter(create_client_outbox(socketio))
+    session_manager = SessionManager(emitter, create_translation_manager())
+    if isinstance(emitter, CaptionPublisher):
+        # 事件循環由場次管理器建立，之後邊緣節點的控制訊息改在事件循環上處理
+        emitter.loop = session_manager.loop
+    session_manager.create("default", languages=("en-US", "zh-TW"), file_name=FILE_NAME)
     try:
-        socketio.run(app, host='0.0.0.0', port=5015)
+        # 沒有終端機時（systemd、容器、負載測試的子行程）Flask-SocketIO 預設拒絕以 Werkzeug 啟動
+        socketio.run(app, host=HOST, port=PORT, allow_unsafe_werkzeug=True)
     except KeyboardInterrupt:
         logger.info("Exiting...")
     finally:
-        service.cleanup()
\ No newline at end of file
+        session_manager.shutdown()
+        if isinstance(emitter, CaptionPublisher):
+            emitter.close()
+
+def create_asgi_app(sio):
+    """Socket.IO 由 AsyncServer 處理，其餘 HTTP 路由交給 Flask（在 WSGI 執行緒池中執行）"""
+    import socketio as python_socketio
+    from uvicorn.middleware.wsgi import WSGIMiddleware
+
+    register_async_handlers(sio)
+    return python_socketio.ASGIApp(sio, other_asgi_app=WSGIMiddleware(app))
+
+async def serve_asgi():
+    """
+    asgi 模式：uvicorn、Socket.IO 與翻譯管線共用同一個事件循環，
+    識別器回呼以 call_soon_threadsafe 進入事件循環，字幕直接在事件循環上送出
+    """
+    global session_manager
+    import socketio as python_socketio
+    import uvicorn
+
+    sio = python_socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+    loop = asyncio.get_running_loop()
+    emitter = AsyncEmitter(sio, loop)
+    captions = create_caption_emitter(create_client_outbox(emitter), loop)
+    session_manager = SessionManager(captions, create_translation_manager(), loop=loop)
+    session_manager.create("default", languages=("en-US", "zh-TW"), file_name=FILE_NAME)
+
+    server = uvicorn.Server(uvicorn.Config(create_asgi_app(sio), host=HOST, port=PORT, lifespan="off"))
+    try:
+        await server.serve()
+    finally:
+        await session_manager.shutdown_async()
+        await emitter.close()
+        if isinstance(captions, CaptionPublisher):
+            captions.close()
+
+# 場次管理器，於主程式啟動時建立
+session_manager = None
+# 每位客戶端的傳送佇列（CLIENT_SEND_QUEUES），於主程式啟動時建立
+client_outbox = None
+
+if __name__ == '__main__':    
+    if SERVER_MODE == "asgi":
+        try:
+            asyncio.run(serve_asgi())
+        except KeyboardInterrupt:
+            logger.info("Exiting...")
+    else:
+        run_threading()
@@ -0,0 +1,226 @@
+import time
+import wave
+from threading import Condition, Thread
+
+from logs import logger
+
+# 緩衝區滿時的處理方式
+DROP_OLDEST = "drop_oldest"  # 丟棄最舊的音訊，延遲維持有界（適合現場串流）
+BLOCK = "block"  # 寫入端等待空間，逾時後才丟棄最舊的音訊（讓傳送端放慢）
+
+
+class AudioRingBuffer:
+    """
+    預先配置的音訊環形緩衝區
+    寫入端（Socket.IO 處理函數或檔案讀取執行緒）與讀取端（推送執行緒）之間的有界佇列，
+    丟棄時以取樣對齊的大小為單位，避免 PCM 取樣錯位
+    """
+    def __init__(self, capacity, policy=DROP_OLDEST, block_timeout=1.0, alignment=2):
+        self.alignment = alignment
+        self.capacity = capacity - capacity % alignment
+        self.buffer = bytearray(self.capacity)
+        self.policy = policy
+        self.block_timeout = block_timeout  # None 表示無限等待
+        self.start = 0  # 讀取位置
+        self.size = 0
+        self.closed = False
+        self.condition = Condition()
+        self.stats = {
+            "written_bytes": 0,
+            "read_bytes": 0,
+            "dropped_bytes": 0,
+            "blocked_seconds": 0.0,
+            "max_fill": 0.0,
+        }
+
+    @property
+    def fill(self):
+        """目前的填充比例"""
+        return self.size / self.capacity
+
+    def write(self, data):
+        """寫入音訊，回傳是否沒有丟棄任何資料；關閉後的寫入一律丟棄"""
+        with self.condition:
+            if self.closed:
+                return False
+            accepted = True
+            if len(data) > self.capacity:
+                overflow = len(data) - self.capacity
+                self.stats["dropped_bytes"] += overflow
+                data = data[overflow:]
+                accepted = False
+
+            if len(data) > self.capacity - self.size and self.policy == BLOCK:
+                started = time.monotonic()
+                self.condition.wait_for(
+                    lambda: self.closed or len(data) <= self.capacity - self.size,
+                    self.block_timeout
+                )
+                self.stats["blocked_seconds"] += time.monotonic() - started
+                if self.closed:
+                    return False
+
+            overflow = len(data) - (self.capacity - self.size)
+            if overflow > 0:
+                # 仍沒有空間時丟棄最舊的音訊，保持延遲有界
+                overflow = min(self.size, -(-overflow // self.alignment) * self.alignment)
+                self.start = (self.start + overflow) % self.capacity
+                self.size -= overflow
+                self.stats["dropped_bytes"] += overflow
+                accepted = False
+
+            end = (self.start + self.size) % self.capacity
+            first = min(len(data), self.capacity - end)
+            self.buffer[end:end + first] = data[:first]
+            self.buffer[:len(data) - first] = data[first:]
+            self.size += len(data)
+            self.stats["written_bytes"] += len(data)
+            self.stats["max_fill"] = max(self.stats["max_fill"], self.fill)
+            self.condition.notify_all()
+            return accepted
+
+    def read(self, max_bytes, timeout=None):
+        """讀取最多 max_bytes 的音訊（取樣對齊），逾時或已關閉且讀完時回傳空位元組"""
+        with self.condition:
+            if not self.size and not self.closed:
+                self.condition.wait(timeout)
+            count = min(max_bytes, self.size)
+            # 未關閉時只讀出完整的取樣
+            if not self.closed:
+                count -= count % self.alignment
+            if not count:
+                return b""
+            end = self.start + count
+            if end <= self.capacity:
+                data = bytes(self.buffer[self.start:end])
+            else:
+                data = bytes(self.buffer[self.start:]) + bytes(self.buffer[:end - self.capacity])
+            self.start = end % self.capacity
+            self.size -= count
+            self.stats["read_bytes"] += count
+            self.condition.notify_all()
+            return data
+
+    def drained(self):
+        """已關閉且資料已讀完"""
+        with self.condition:
+            return self.closed and not self.size
+
+    def close(self):
+        """停止接收寫入，讀取端讀完剩餘資料後結束"""
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def snapshot(self):
+        """緩衝區狀態，供指標輸出"""
+        return dict(self.stats, fill=self.fill, capacity_bytes=self.capacity)
+
+
+class AudioStreamPump:
+    """
+    推送執行緒：以固定長度的音框將環形緩衝區的音訊推入 Speech SDK 的 PushAudioInputStream，
+    或其他提供 write/close 的推送目標（例如本機識別器）
+    speed 為相對於實際時間的最高推送倍率（0 表示不限速），識別器不會收到快於此倍率的音訊；
+    傳送端中斷後補送的音訊會立即追上，不受限速影響
+    """
+    def __init__(self, ring, push_stream, bytes_per_second, frame_ms=100, speed=1.0):
+        self.ring = ring
+        self.push_stream = push_stream
+        self.bytes_per_second = bytes_per_second
+        frame = int(bytes_per_second * frame_ms / 1000)
+        self.frame_bytes = max(ring.alignment, frame - frame % ring.alignment)
+        self.speed = speed
+        self.thread = Thread(target=self._run, name="audio-pump", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        started = time.monotonic()
+        pushed = 0
+        try:
+            while True:
+                data = self.ring.read(self.frame_bytes, timeout=0.5)
+                if not data:
+                    if self.ring.drained():
+                        break
+                    continue
+                self.push_stream.write(data)
+                pushed += len(data)
+                if self.speed:
+                    delay = started + pushed / (self.bytes_per_second * self.speed) - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        except Exception as e:
+            logger.error(f"Audio pump error: {e}")
+        finally:
+            # 關閉推送串流，識別器讀完後結束場次
+            self.push_stream.close()
+
+
+class WavFileSource:
+    """
+    分段讀取 WAV 檔並寫入環形緩衝區，長錄音不需一次載入或作為單一阻塞來源
+    緩衝區應使用 BLOCK 且不設逾時，讀取速度由推送執行緒的限速決定
+    """
+    def __init__(self, path, ring, chunk_ms=100):
+        self.path = path
+        self.ring = ring
+        self.chunk_ms = chunk_ms
+        self.thread = Thread(target=self._run, name="wav-reader", daemon=True)
+
+    @staticmethod
+    def read_format(path):
+        """回傳 (取樣率, 取樣位元數, 聲道數)"""
+        with wave.open(path, 'rb') as wav:
+            return wav.getframerate(), wav.getsampwidth() * 8, wav.getnchannels()
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        try:
+            with wave.open(self.path, 'rb') as wav:
+                frames = max(1, wav.getframerate() * self.chunk_ms // 1000)
+                while not self.ring.closed:
+                    data = wav.readframes(frames)
+                    if not data:
+                        break
+                    self.ring.write(data)
+        except Exception as e:
+            logger.error(f"Audio file read error: {e}")
+        finally:
+            self.ring.close()
+
+
+class MicrophoneSource:
+    """
+    以 PyAudio 擷取預設麥克風並寫入環形緩衝區，供沒有內建音訊擷取的本機識別器使用
+    """
+    def __init__(self, ring, rate=16000, channels=1, chunk_ms=100):
+        self.ring = ring
+        self.rate = rate
+        self.channels = channels
+        self.frames = max(1, rate * chunk_ms // 1000)
+        self.thread = Thread(target=self._run, name="microphone", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def _run(self):
+        import pyaudio
+        audio = pyaudio.PyAudio()
+        stream = None
+        try:
+            stream = audio.open(format=pyaudio.paInt16, channels=self.channels, rate=self.rate,
+                                input=True, frames_per_buffer=self.frames)
+            while not self.ring.closed:
+                self.ring.write(stream.read(self.frames, exception_on_overflow=False))
+        except Exception as e:
+            logger.error(f"Microphone capture error: {e}")
+        finally:
+            if stream is not None:
+                stream.close()
+            audio.terminate()
+            self.ring.close()
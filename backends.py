@@ -0,0 +1,63 @@
+import os
+import time
+from threading import Lock
+
+from logs import logger
+
+
+def _create_deepl():
+    import deepl
+    return deepl.Translator(auth_key=os.getenv('DEEPL_KEY'))
+
+
+def _create_azure():
+    from azure.ai.translation.text import TextTranslationClient
+    from azure.core.credentials import AzureKeyCredential
+    return TextTranslationClient(
+        region=os.getenv('AZURE_TRANSLATOR_REGION'),
+        credential=AzureKeyCredential(os.getenv('AZURE_TRANSLATOR_KEY'))
+    )
+
+
+def _create_google():
+    from google.cloud import translate
+    return translate.TranslationServiceClient()
+
+
+# 各翻譯器的客戶端建立函數，SDK 在函數內才匯入
+FACTORIES = {
+    "DeepL": _create_deepl,
+    "Azure": _create_azure,
+    "Google": _create_google,
+}
+
+
+class TranslatorBackends:
+    """
+    翻譯器客戶端的延遲載入登錄表
+    只登錄啟用的翻譯器（主要翻譯器與其備援），SDK 的匯入與客戶端建立延到第一次使用或預熱時，
+    未使用的翻譯器不會拖慢啟動；客戶端建立後保留重用，連線池因此維持在已預熱的狀態
+    """
+    def __init__(self, names, factories=None):
+        factories = factories or FACTORIES
+        self.factories = {name: factories[name] for name in names}
+        self.clients = {}
+        self.load_seconds = {}  # {翻譯器: 匯入與建立客戶端的秒數}
+        self.lock = Lock()
+
+    def get(self, name):
+        """取得翻譯器客戶端，第一次呼叫時匯入 SDK 並建立（會阻塞，應在執行緒池中呼叫）"""
+        client = self.clients.get(name)
+        if client is not None:
+            return client
+        if name not in self.factories:
+            raise KeyError(f"Translator {name} is not enabled")
+        with self.lock:
+            client = self.clients.get(name)
+            if client is None:
+                start = time.perf_counter()
+                client = self.factories[name]()
+                self.load_seconds[name] = time.perf_counter() - start
+                self.clients[name] = client
+                logger.info(f"Loaded {name} translator client in {self.load_seconds[name]:.2f}s")
+        return client
@@ -0,0 +1,138 @@
+"""
+字幕水平擴展負載測試：本機代理 + N 個邊緣節點（各為獨立行程）+ 模擬觀眾，量測邊緣節點數增加時的送達延遲
+發布端在本行程以固定速率送出 caption_delta（內含送出時間），觀眾平均分配到各邊緣節點；
+延遲 = 觀眾收到的時間 - 發布的時間，包含代理轉送與邊緣節點送出
+
+用法：
+    python benchmarks/bench_fanout.py --edges 1 2 4 --clients 400 --rate 10 --duration 10
+    python benchmarks/bench_fanout.py --json > fanout.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from threading import Thread
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fanout import CaptionPublisher  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Port {port} did not open")
+
+
+def spawn(*args, **kwargs):
+    return subprocess.Popen([sys.executable, *args], cwd=ROOT, **kwargs)
+
+
+def run(edges, clients, rate, duration, session="bench"):
+    """以 edges 個邊緣節點測試一次，回傳報告"""
+    broker_port = free_port()
+    processes = [spawn("fanout.py", "broker", "--port", str(broker_port), stderr=subprocess.DEVNULL)]
+    try:
+        wait_for_port(broker_port)
+        broker_url = f"tcp://127.0.0.1:{broker_port}"
+        edge_ports = [free_port() for _ in range(edges)]
+        for port in edge_ports:
+            processes.append(spawn("fanout.py", "edge", "--broker", broker_url, "--host", "127.0.0.1",
+                                   "--port", str(port), stderr=subprocess.DEVNULL))
+        for port in edge_ports:
+            wait_for_port(port)
+
+        empty = {"v": 1, "seq": 0, "full": True, "segments": [], "lang": None}
+        publisher = CaptionPublisher(None, broker_url, subscribe=lambda client, data: data["session_id"],
+                                     snapshot=lambda data: empty, unsubscribe=lambda client: None)
+
+        # 觀眾在獨立行程，全部連線後開始發布；接收時間比發布時間多留 2 秒
+        viewer = spawn(os.path.join("benchmarks", "sio_clients.py"),
+                       *[arg for port in edge_ports for arg in ("--url", f"http://127.0.0.1:{port}")],
+                       "--clients", str(clients), "--duration", str(duration + 2), "--session", session,
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        processes.append(viewer)
+        for line in viewer.stderr:
+            if line.strip() == "ready":
+                break
+        Thread(target=lambda: viewer.stderr.read(), daemon=True).start()
+        time.sleep(1.0)  # 等待 join 經由代理往返完成
+
+        sent = 0
+        start = time.monotonic()
+        while time.monotonic() - start < duration:
+            sent += 1
+            publisher.emit('caption_delta', {
+                "v": 1, "seq": sent, "full": False, "base": 0, "keep": 0,
+                "segments": [f"partial hypothesis number {sent}"], "lang": "en-US", "sent": time.time()
+            }, to=session)
+            time.sleep(max(0.0, start + sent / rate - time.monotonic()))
+
+        output, _ = viewer.communicate(timeout=duration + 60)
+        stats = json.loads(output)
+        publisher.close()
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    latencies = stats["latencies_ms"]
+    expected = sent * stats["connected"]
+    return {
+        "edges": edges,
+        "clients": clients,
+        "connected": stats["connected"],
+        "published": sent,
+        "delivered": len(latencies),
+        "delivery_ratio": round(len(latencies) / expected, 4) if expected else None,
+        "gaps": stats["gaps"],
+        "late": stats["late"],
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": max(latencies) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Caption fan-out latency as the edge worker count grows")
+    parser.add_argument("--edges", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=400)
+    parser.add_argument("--rate", type=float, default=10.0, help="caption messages per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of publishing per run")
+    parser.add_argument("--json", action="store_true", help="print the reports as JSON")
+    args = parser.parse_args()
+
+    reports = [run(edges, args.clients, args.rate, args.duration) for edges in args.edges]
+    if args.json:
+        print(json.dumps({"cpus": os.cpu_count(), "rate": args.rate, "runs": reports}, indent=2))
+        return
+    print(f"{args.clients} clients, {args.rate} msg/s, {args.duration}s per run, {os.cpu_count()} CPUs")
+    for report in reports:
+        print(f"edges {report['edges']}: p50 {report['p50_ms']} ms  p95 {report['p95_ms']} ms  "
+              f"p99 {report['p99_ms']} ms  delivered {report['delivery_ratio']}  gaps {report['gaps']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+識別延遲基準：以音訊檔離線量測識別器的延遲，不經過翻譯與 Socket.IO
+音訊依 --speed 倍率餵入（1 為實際時間），最終結果延遲 = 事件到達時間 - 該語句音訊送完的時間；
+--speed 0 時不限速，只回報即時率（處理時間 / 音訊長度）
+
+用法：
+    python benchmarks/bench_recognizer.py data/test.wav --recognizer Vosk
+    python benchmarks/bench_recognizer.py data/test.wav --recognizer Azure --languages en-US zh-TW
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import wave
+from threading import Event
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app  # noqa: E402
+from metrics import percentile  # noqa: E402
+from pipeline import FINAL  # noqa: E402
+
+
+def run(path, recognizer_name, languages, speed):
+    app.FILE_STREAM_SPEED = speed
+    service = app.ContinuousTranslation(None, None, session_id="bench", languages=languages, file_name=path)
+    service.current_transcriber = recognizer_name
+    with wave.open(path, 'rb') as wav:
+        audio_seconds = wav.getnframes() / wav.getframerate()
+
+    events = []
+    done = Event()
+    recognizer = service._init_recognizer()
+    start = time.monotonic()
+    recognizer.start(events.append, lambda reason: done.set())
+    done.wait()
+    elapsed = time.monotonic() - start
+    asyncio.run(service.cleanup())
+
+    finals = [event for event in events if event.kind == FINAL]
+    partials = [event for event in events if event.kind != FINAL]
+    report = {
+        "audio_s": round(audio_seconds, 2),
+        "elapsed_s": round(elapsed, 2),
+        "real_time_factor": round(elapsed / audio_seconds, 3) if audio_seconds else None,
+        "partials": len(partials),
+        "finals": len(finals),
+        "first_partial_ms": round((partials[0].received - start) * 1000, 1) if partials else None,
+        "mean_partial_stability": (round(sum(e.stability for e in partials) / len(partials), 3)
+                                   if partials else None),
+    }
+    if speed:
+        lags = [event.received - start - (event.offset + event.duration) / 10**7 / speed for event in finals]
+        report["final_lag_p50_ms"] = round(percentile(lags, 0.50) * 1000, 1) if lags else None
+        report["final_lag_p95_ms"] = round(percentile(lags, 0.95) * 1000, 1) if lags else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure recognizer latency on a WAV file")
+    parser.add_argument("path", help="WAV file (16-bit mono for Vosk)")
+    parser.add_argument("--recognizer", default=app.RECOGNIZER, choices=["Azure", "Vosk"])
+    parser.add_argument("--languages", nargs=2, default=["en-US", "zh-TW"])
+    parser.add_argument("--speed", type=float, default=1.0, help="0 = feed audio as fast as possible")
+    args = parser.parse_args()
+    report = run(args.path, args.recognizer, tuple(args.languages), args.speed)
+    for key, value in report.items():
+        print(f"{key}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+段落切分微基準：比較每次重新切分的舊版 format_mixed_paragraphs 與增量的 SentenceBuffer
+模擬長句逐字增長的部分結果，並確認兩者輸出相同
+
+用法：python benchmarks/bench_sentences.py [句數] [回合數]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sentences import SentenceBuffer, layout_paragraphs, split_into_sentences  # noqa: E402
+
+WORDS = ["the", "speech", "model", "translates", "live", "captions", "for", "every",
+         "talk", "and", "keeps", "latency", "low", "while", "audience", "reads"]
+MAX_LENGTH = 19 * 12
+
+
+def legacy_format_mixed_paragraphs(current_text, previous_completed):
+    """原本的實作：每次都重新切分三段文字"""
+    return layout_paragraphs(
+        split_into_sentences(current_text),
+        split_into_sentences(previous_completed.get("mix", "")),
+        split_into_sentences(previous_completed.get("prev_prev", "")),
+    )
+
+
+def make_utterance(rng, sentences):
+    parts = []
+    for _ in range(sentences):
+        words = rng.choices(WORDS, k=rng.randint(5, 14))
+        parts.append(" ".join(words).capitalize() + rng.choice([".", "?", "!"]))
+    return " ".join(parts)
+
+
+def partials_of(utterance):
+    """模擬識別器逐字輸出的部分結果"""
+    words = utterance.split(" ")
+    return [" ".join(words[:i]) for i in range(1, len(words) + 1)]
+
+
+def run(sentences, rounds, seed=0):
+    rng = random.Random(seed)
+    utterances = [make_utterance(rng, sentences) for _ in range(rounds)]
+
+    legacy_time = 0.0
+    buffered_time = 0.0
+    calls = 0
+    previous_completed = {"mix": "", "prev_prev": ""}
+    buffer = SentenceBuffer()
+
+    for utterance in utterances:
+        for partial in partials_of(utterance):
+            start = time.perf_counter()
+            expected = legacy_format_mixed_paragraphs(partial, previous_completed)
+            legacy_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            actual = layout_paragraphs(
+                buffer.partial_sentences(partial),
+                buffer.completed["mix"],
+                buffer.completed["prev_prev"],
+            )
+            buffered_time += time.perf_counter() - start
+
+            if actual != expected:
+                raise AssertionError(f"mismatch for {partial!r}: {actual} != {expected}")
+            calls += 1
+
+        # 最終結果：與 ContinuousTranslation 相同的段落更新與長度限制
+        previous_completed["prev_prev"] = previous_completed["mix"]
+        previous_completed["mix"] = utterance[-MAX_LENGTH:]
+        buffer.commit(previous_completed["mix"], previous_completed["prev_prev"])
+
+    return calls, legacy_time, buffered_time
+
+
+def main():
+    sentences = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    calls, legacy_time, buffered_time = run(sentences, rounds)
+    print(f"{calls} partial updates, {sentences} sentences per utterance")
+    print(f"legacy:      {legacy_time * 1e6 / calls:8.1f} us/update")
+    print(f"incremental: {buffered_time * 1e6 / calls:8.1f} us/update")
+    print(f"speedup:     {legacy_time / buffered_time:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
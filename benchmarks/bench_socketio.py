@@ -0,0 +1,305 @@
+"""
+Socket.IO 負載測試：以合成字幕來源啟動 app（threading 或 asgi 模式），模擬大量無頭觀眾，
+量測每位觀眾的送達延遲百分位數、伺服器 CPU 與記憶體，以及遺失與延遲過久的訊息
+
+伺服器在子行程中執行 app.run_threading() / app.serve_asgi()，只把場次換成 SyntheticCaptions：
+不經識別與翻譯，以 --rate 的速率逐字增長部分結果，每 --words 個字完成一句，字幕經由真實的
+格式化、字幕協定（CAPTION_PROTOCOL）與傳送器送出；每則訊息附上送出時間 "sent" 供計算延遲
+觀眾為 benchmarks/sio_clients.py（與 client.js 相同地回覆 ack），可用 --client-procs 分散到多個行程；
+--slow-clients 另外加入每則字幕需處理 --slow-ms 的慢速觀眾，分開統計，比較每位客戶端傳送佇列（--send-queues on/off）的效果
+
+用法：
+    python benchmarks/bench_socketio.py --mode threading asgi --protocol delta full --clients 100 500
+    python benchmarks/bench_socketio.py --clients 1000 --client-procs 4 --duration 30 --output results.json
+    python benchmarks/bench_socketio.py --mode asgi --send-queues on off --clients 200 --slow-clients 20 --slow-ms 400
+結果為 JSON（--output 或 --json），包含 git 版本與設定，可比較不同伺服器模式與協定的變更
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from datetime import datetime
+from threading import Thread
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+import replay  # noqa: E402
+from metrics import percentile  # noqa: E402
+
+WORDS = ("the", "speaker", "is", "now", "talking", "about", "real", "time", "captions", "for", "large",
+         "audiences", "and", "how", "each", "viewer", "receives", "every", "update")
+
+
+class SyntheticCaptions(app.ContinuousTranslation):
+    """合成字幕場次：取代識別器與翻譯，以固定速率送出逐字增長的部分結果"""
+    rate = 8.0
+    words = 12
+
+    async def translation_continuous(self):
+        self.loop = asyncio.get_running_loop()
+        self.done_event = asyncio.Event()
+        language = self.languages[0]
+        current = []
+        count = 0
+        start = time.monotonic()
+        while not self.stop_flag:
+            current.append(WORDS[count % len(WORDS)])
+            count += 1
+            text = " ".join(current)
+            self._emit_caption(text, language)
+            if len(current) == self.words:
+                self._complete(text + ".")
+                current = []
+            delay = start + count / self.rate - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.done_event.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        await self.cleanup()
+
+    def _complete(self, text):
+        """與最終結果相同地更新已完成段落"""
+        self.previous_completed["prev_prev"] = self.previous_completed["mix"]
+        self.previous_completed["mix"] = text[-self.max_completed_length:]
+        self.sentence_buffer.commit(self.previous_completed["mix"], self.previous_completed["prev_prev"])
+
+
+class TimestampingEmitter:
+    """在每則字幕附上送出時間並計數，其餘交給原本的傳送器"""
+    def __init__(self, emitter):
+        self.emitter = emitter
+        self.emitted = 0
+
+    def emit(self, event, data=None, **kwargs):
+        self.emitted += 1
+        if isinstance(data, dict):
+            data = dict(data, sent=time.time())
+        self.emitter.emit(event, data, **kwargs)
+
+    def close(self):
+        close = getattr(self.emitter, "close", None)
+        if close is not None:
+            return close()
+
+
+def serve(args):
+    """子行程：以合成字幕場次執行 app 的伺服器"""
+    emitters = []
+    create_caption_emitter = app.create_caption_emitter
+
+    def timestamping(local, loop=None):
+        emitters.append(TimestampingEmitter(create_caption_emitter(local, loop)))
+        return emitters[-1]
+
+    def usage():
+        rusage = resource.getrusage(resource.RUSAGE_SELF)
+        return app.jsonify({
+            "cpu_s": rusage.ru_utime + rusage.ru_stime,
+            "max_rss_mb": round(rusage.ru_maxrss / 1024, 1),
+            "threads": threading.active_count(),
+            "emitted": sum(emitter.emitted for emitter in emitters),
+            "queues": app.client_outbox.snapshot_stats() if app.client_outbox is not None else None,
+            "time": time.monotonic(),
+        })
+
+    SyntheticCaptions.rate = args.rate
+    SyntheticCaptions.words = args.words
+    app.ContinuousTranslation = SyntheticCaptions
+    app.create_caption_emitter = timestamping
+    app.create_translation_manager = lambda: replay.ReplayTranslationManager(app.TRANSLATOR, {
+        name: replay.FakeBackend(name, *spec) for name, spec in replay.DEFAULT_BACKENDS.items()
+    })
+    app.CAPTION_PROTOCOL = args.protocol
+    app.CLIENT_SEND_QUEUES = args.send_queues == "on"
+    app.HOST = "127.0.0.1"
+    app.PORT = args.port
+    app.app.add_url_rule("/bench/usage", "bench_usage", usage)
+    if args.mode == "asgi":
+        asyncio.run(app.serve_asgi())
+    else:
+        app.run_threading()
+
+
+def fetch_usage(port, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/bench/usage", timeout=5) as response:
+                return json.load(response)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def spawn(*args, **kwargs):
+    return subprocess.Popen([sys.executable, *args], cwd=ROOT, **kwargs)
+
+
+def stop(process):
+    if process.poll() is None:
+        process.send_signal(signal.SIGINT)
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.wait()
+
+
+def summarize(results, emitted):
+    """合併多個觀眾行程的結果"""
+    latencies = [latency for result in results for latency in result["latencies_ms"]]
+    connected = sum(result["connected"] for result in results)
+    expected = emitted * connected
+    return {
+        "connected": connected,
+        "errors": sum(result["errors"] for result in results),
+        "delivered": len(latencies),
+        "delivery_ratio": round(min(1.0, len(latencies) / expected), 4) if expected else None,
+        "gaps": sum(result["gaps"] for result in results),
+        "late": sum(result["late"] for result in results),
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": max(latencies) if latencies else None,
+    }
+
+
+def run(mode, protocol, send_queues, clients, args, port):
+    """啟動一次伺服器與觀眾，回傳報告"""
+    server = spawn(__file__, "serve", "--mode", mode, "--protocol", protocol, "--send-queues", send_queues,
+                   "--port", str(port), "--rate", str(args.rate), "--words", str(args.words),
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    viewers = []
+    try:
+        fetch_usage(port)
+        procs = max(1, min(args.client_procs, clients))
+        groups = [(clients // procs + (index < clients % procs), 0.0) for index in range(procs)]
+        if args.slow_clients:
+            groups.append((args.slow_clients, args.slow_ms))
+        for count, delay_ms in groups:
+            viewers.append(spawn(os.path.join("benchmarks", "sio_clients.py"), "--url", f"http://127.0.0.1:{port}",
+                                 "--clients", str(count), "--duration", str(args.duration),
+                                 "--session", "default", "--late-ms", str(args.late_ms),
+                                 "--ack", "--delay-ms", str(delay_ms),
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True))
+        # 所有觀眾行程連線完成後才開始計算
+        for viewer in viewers:
+            for line in viewer.stderr:
+                if line.strip() == "ready":
+                    break
+            Thread(target=viewer.stderr.read, daemon=True).start()
+        before = fetch_usage(port)
+        time.sleep(args.duration)
+        after = fetch_usage(port)
+        results = [json.loads(viewer.communicate(timeout=args.duration + 60)[0]) for viewer in viewers]
+    finally:
+        for viewer in viewers:
+            if viewer.poll() is None:
+                viewer.kill()
+        stop(server)
+
+    emitted = after["emitted"] - before["emitted"]
+    wall = after["time"] - before["time"]
+    report = {"mode": mode, "protocol": protocol, "send_queues": send_queues, "clients": clients, "emitted": emitted}
+    report.update(summarize(results[:procs], emitted))
+    report.update({
+        "server_cpu_percent": round((after["cpu_s"] - before["cpu_s"]) / wall * 100, 1) if wall else None,
+        "server_max_rss_mb": after["max_rss_mb"],
+        "server_threads": after["threads"],
+        "server_queues": after["queues"],
+    })
+    if args.slow_clients:
+        # 合併後的訊息較少，慢速觀眾的送達比例不代表遺失；延遲是否有上限才是重點
+        report["slow"] = dict(summarize(results[procs:], emitted), clients=args.slow_clients, delay_ms=args.slow_ms)
+    return report
+
+
+def print_report(report):
+    print(f"{report['mode']:9} {report['protocol']:5} queues {report['send_queues']:3} {report['clients']:5} clients: "
+          f"p50 {report['p50_ms']} ms  p95 {report['p95_ms']} ms  p99 {report['p99_ms']} ms  "
+          f"delivered {report['delivery_ratio']}  late {report['late']}  gaps {report['gaps']}  "
+          f"cpu {report['server_cpu_percent']}%  rss {report['server_max_rss_mb']} MB", flush=True)
+    slow = report.get("slow")
+    if slow:
+        print(f"{'':21}{slow['clients']:5} slow ({slow['delay_ms']} ms): p50 {slow['p50_ms']} ms  "
+              f"p95 {slow['p95_ms']} ms  max {slow['max_ms']} ms  delivered {slow['delivered']}  "
+              f"gaps {slow['gaps']}", flush=True)
+    if report["server_queues"]:
+        print(f"{'':21}queues: {report['server_queues']}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Socket.IO caption load test against the app server")
+    commands = parser.add_subparsers(dest="command")
+    server = commands.add_parser("serve", help=argparse.SUPPRESS)
+    server.add_argument("--mode", choices=("threading", "asgi"), default="asgi")
+    server.add_argument("--protocol", choices=("delta", "full"), default="delta")
+    server.add_argument("--send-queues", choices=("on", "off"), default="on")
+    server.add_argument("--port", type=int, default=5015)
+    server.add_argument("--rate", type=float, default=8.0)
+    server.add_argument("--words", type=int, default=12)
+    parser.add_argument("--mode", nargs="+", choices=("threading", "asgi"), default=["threading", "asgi"])
+    parser.add_argument("--protocol", nargs="+", choices=("delta", "full"), default=["delta"])
+    parser.add_argument("--send-queues", nargs="+", choices=("on", "off"), default=["on"],
+                        help="per-client send queues (CLIENT_SEND_QUEUES)")
+    parser.add_argument("--clients", type=int, nargs="+", default=[100, 500])
+    parser.add_argument("--slow-clients", type=int, default=0, help="extra viewers that process captions slowly")
+    parser.add_argument("--slow-ms", type=float, default=500.0, help="processing time per message of a slow viewer")
+    parser.add_argument("--client-procs", type=int, default=1, help="processes to spread the viewers over")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds measured after all viewers joined")
+    parser.add_argument("--rate", type=float, default=8.0, help="partial results per second")
+    parser.add_argument("--words", type=int, default=12, help="words per utterance")
+    parser.add_argument("--late-ms", type=float, default=1000.0, help="latency counted as late")
+    parser.add_argument("--port", type=int, default=5115)
+    parser.add_argument("--output", help="write the results as JSON to this file")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+    if args.command == "serve":
+        return serve(args)
+
+    results = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {"duration": args.duration, "rate": args.rate, "words": args.words, "late_ms": args.late_ms,
+                   "client_procs": args.client_procs, "slow_clients": args.slow_clients, "slow_ms": args.slow_ms},
+        "runs": [],
+    }
+    for mode in args.mode:
+        for protocol in args.protocol:
+            for send_queues in args.send_queues:
+                for clients in args.clients:
+                    report = run(mode, protocol, send_queues, clients, args, args.port)
+                    results["runs"].append(report)
+                    if not args.json:
+                        print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
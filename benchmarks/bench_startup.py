@@ -0,0 +1,130 @@
+"""
+啟動時間基準：量測 import app 的時間，以及場次啟動到第一句字幕的時間（有無預熱各一次）
+import 時間在新的直譯器中量測，並檢查是否有翻譯器或語音 SDK 在 import 時就被載入；
+第一句字幕以 replay.py 的重播識別器送出錄製事件，預設使用模擬第一次連線成本的假翻譯器
+
+用法：
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --cold-start-ms 400 --runs 5
+    python benchmarks/bench_startup.py --real    # 使用 app.py 設定的真實翻譯器（需要金鑰）
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import app  # noqa: E402
+import replay  # noqa: E402
+
+# import app 時不應載入的 SDK
+LAZY_MODULES = ("deepl", "google.cloud.translate", "azure.ai.translation.text", "azure.cognitiveservices.speech")
+
+IMPORT_PROBE = (
+    "import sys, time\n"
+    "start = time.perf_counter()\n"
+    "import app\n"
+    "elapsed = time.perf_counter() - start\n"
+    f"print(elapsed, ','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))\n"
+)
+
+
+def measure_import(runs):
+    """回傳 (各次 import 秒數, import 時就載入的 SDK)"""
+    samples, eager = [], set()
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        elapsed, _, modules = output.partition(" ")
+        samples.append(float(elapsed))
+        eager.update(filter(None, modules.split(",")))
+    return samples, sorted(eager)
+
+
+class FirstCaptionTranslation(replay.ReplayTranslation):
+    """記錄第一個識別事件與第一次送出字幕的時間"""
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.first_event = None
+        self.first_caption = None
+        self.recognizer_started = None
+
+    def _init_recognizer(self):
+        recognizer = super()._init_recognizer()
+        start = recognizer.start
+
+        def timed_start(on_event, on_stopped):
+            self.recognizer_started = time.monotonic()
+            start(on_event, on_stopped)
+
+        recognizer.start = timed_start
+        return recognizer
+
+    def _handle_event(self, event):
+        if self.first_event is None:
+            self.first_event = event.received
+        super()._handle_event(event)
+
+    def _emit_caption(self, display_text, language):
+        if self.first_caption is None:
+            self.first_caption = time.monotonic()
+        super()._emit_caption(display_text, language)
+
+
+def measure_first_caption(events, warm_up, real, cold_start):
+    async def main():
+        if real:
+            manager = app.TranslationManager(app.TRANSLATOR, cache_path=None, fallbacks=app.TRANSLATOR_FALLBACKS)
+        else:
+            fakes = {
+                name: replay.FakeBackend(name, *spec, cold_start=cold_start)
+                for name, spec in replay.DEFAULT_BACKENDS.items()
+            }
+            manager = replay.ReplayTranslationManager(app.TRANSLATOR, fakes, fallbacks=app.TRANSLATOR_FALLBACKS)
+        service = FirstCaptionTranslation(replay.RecordingSocketIO(), manager, events, speed=1.0, warm_up=warm_up)
+        start = time.monotonic()
+        await service.translation_continuous()
+        manager.close()
+        return {
+            "startup_ms": _ms(service.recognizer_started - start),
+            "first_caption_ms": _ms(service.first_caption - service.first_event) if service.first_caption else None,
+            "session_to_caption_ms": _ms(service.first_caption - start) if service.first_caption else None,
+        }
+
+    return asyncio.run(main())
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to first caption")
+    parser.add_argument("--events", default=os.path.join(ROOT, "data", "replay_sample.jsonl"))
+    parser.add_argument("--runs", type=int, default=3, help="import time samples")
+    parser.add_argument("--cold-start-ms", type=float, default=300.0,
+                        help="extra latency of a fake backend's first request (connection setup)")
+    parser.add_argument("--real", action="store_true", help="use the real translators configured in app.py")
+    args = parser.parse_args()
+
+    samples, eager = measure_import(args.runs)
+    print(f"import app: min {_ms(min(samples))} ms, median {_ms(sorted(samples)[len(samples) // 2])} ms")
+    print(f"SDKs loaded at import: {', '.join(eager) or 'none'}")
+
+    # 只取第一句話，量測的是冷啟動
+    events = replay.load_events(args.events)
+    first_final = next(i for i, event in enumerate(events) if event["type"] == replay.FINAL)
+    events = events[:first_final + 1]
+    for warm_up in (False, True):
+        report = measure_first_caption(events, warm_up, args.real, args.cold_start_ms / 1000)
+        print(f"warm_up={warm_up}: " + ", ".join(f"{key} {value}" for key, value in report.items()))
+    return 1 if eager else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+"""
+大量無頭 Socket.IO 客戶端：以 Engine.IO v4 WebSocket 協定直接連線（不需 socketio 客戶端套件），
+一個事件循環可模擬上千個觀眾；每則 caption_delta / update_text 以訊息中的 "sent"（發送端的 time.time()）
+計算送達延遲，並以 seq 偵測遺失的訊息（伺服器合併的增量訊息以 first 起算）；
+--ack 與 client.js 相同地在 join 宣告並回覆 ack，--delay-ms 模擬每則訊息處理（或連線）較慢的觀眾
+
+用法：
+    python benchmarks/sio_clients.py --url http://127.0.0.1:5015 --clients 500 --duration 30
+輸出為 JSON：{"clients", "connected", "messages", "latencies_ms": [...], "gaps", "late", "errors"}
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from urllib.parse import urlparse
+
+try:
+    import websockets
+except ImportError:  # pragma: no cover - 只有執行負載測試時需要
+    websockets = None
+
+
+class ClientStats:
+    """所有模擬客戶端共用的統計"""
+    def __init__(self, late_ms=1000.0):
+        self.late_ms = late_ms
+        self.connected = 0
+        self.messages = 0
+        self.latencies = []
+        self.gaps = 0
+        self.late = 0
+        self.errors = 0
+
+    def record(self, data, received):
+        self.messages += 1
+        sent = data.get("sent") if isinstance(data, dict) else None
+        if sent is None:
+            return
+        latency = (received - sent) * 1000
+        self.latencies.append(round(latency, 2))
+        if latency > self.late_ms:
+            self.late += 1
+
+    def to_dict(self, clients):
+        return {
+            "clients": clients,
+            "connected": self.connected,
+            "messages": self.messages,
+            "latencies_ms": self.latencies,
+            "gaps": self.gaps,
+            "late": self.late,
+            "errors": self.errors,
+        }
+
+
+def _socket_url(url):
+    parsed = urlparse(url)
+    scheme = "wss" if parsed.scheme == "https" else "ws"
+    return f"{scheme}://{parsed.netloc}/socket.io/?EIO=4&transport=websocket"
+
+
+async def run_client(url, join, stats, stop, delay=0.0):
+    """單一觀眾：連線、加入場次、接收字幕直到 stop 被設定；delay 為每則字幕的處理時間（秒），回傳是否成功連線"""
+    last_seq = None
+    try:
+        async with websockets.connect(_socket_url(url), max_size=None, open_timeout=30) as ws:
+            await ws.recv()  # Engine.IO open 封包
+            await ws.send("40")
+            while not (await ws.recv()).startswith("40"):
+                pass
+            await ws.send("42" + json.dumps(["join", join]))
+            stats.connected += 1
+            receive = asyncio.ensure_future(ws.recv())
+            waiter = asyncio.ensure_future(stop.wait())
+            try:
+                while True:
+                    done, _ = await asyncio.wait({receive, waiter}, return_when=asyncio.FIRST_COMPLETED)
+                    if waiter in done:
+                        return True
+                    packet = receive.result()
+                    received = time.time()
+                    receive = asyncio.ensure_future(ws.recv())
+                    if packet == "2":
+                        await ws.send("3")
+                    elif packet.startswith("42"):
+                        # 需要 ack 的訊息在事件名稱前帶有數字 id
+                        body = packet[2:]
+                        ack_id = body[:len(body) - len(body.lstrip("0123456789"))]
+                        event, *args = json.loads(body[len(ack_id):])
+                        data = args[0] if args else None
+                        if event not in ("caption_delta", "update_text"):
+                            continue
+                        if isinstance(data, dict) and "seq" in data and not data.get("full"):
+                            first = data.get("first", data["seq"])
+                            if last_seq is not None and first > last_seq + 1:
+                                stats.gaps += first - last_seq - 1
+                            last_seq = data["seq"]
+                        elif isinstance(data, dict) and data.get("full"):
+                            last_seq = data.get("seq")
+                        if delay:
+                            # 處理完成（顯示）的時間才算送達
+                            await asyncio.sleep(delay)
+                            received = time.time()
+                        stats.record(data, received)
+                        if ack_id:
+                            await ws.send("43" + ack_id + "[]")
+            finally:
+                receive.cancel()
+                waiter.cancel()
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException) as e:
+        stats.errors += 1
+        print(f"client error: {e!r}", file=sys.stderr)
+        return False
+
+
+async def run_clients(urls, clients, duration, join, late_ms=1000.0, ramp=0.002, ready=None, delay=0.0):
+    """
+    依序在 urls 間分配 clients 個觀眾（每 ramp 秒連線一個），所有人連線（或失敗）後呼叫 ready，
+    再接收 duration 秒；回傳 ClientStats
+    """
+    if websockets is None:
+        raise RuntimeError("The load-test clients require the websockets package: pip install websockets")
+    stats = ClientStats(late_ms)
+    stop = asyncio.Event()
+    tasks = []
+    for index in range(clients):
+        tasks.append(asyncio.create_task(run_client(urls[index % len(urls)], join, stats, stop, delay)))
+        await asyncio.sleep(ramp)
+    deadline = time.monotonic() + 30
+    while stats.connected + stats.errors < clients and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    if ready is not None:
+        ready(stats)
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate headless Socket.IO caption viewers")
+    parser.add_argument("--url", action="append", required=True, help="server URL (repeat to spread clients)")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to receive after all clients joined")
+    parser.add_argument("--session", default="default")
+    parser.add_argument("--language", help="caption track to join")
+    parser.add_argument("--late-ms", type=float, default=1000.0)
+    parser.add_argument("--ack", action="store_true", help="announce and send acks like client.js")
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="processing time per caption message")
+    args = parser.parse_args()
+    join = {"session_id": args.session, "language": args.language}
+    if args.ack:
+        join["ack"] = True
+    # 全部連線後在 stderr 輸出 "ready"，供負載測試開始送出字幕
+    stats = asyncio.run(run_clients(args.url, args.clients, args.duration, join, args.late_ms,
+                                    ready=lambda stats: print("ready", file=sys.stderr, flush=True),
+                                    delay=args.delay_ms / 1000))
+    json.dump(stats.to_dict(args.clients), sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+import asyncio
+import os
+import queue
+import re
+import sqlite3
+import time
+import unicodedata
+from collections import namedtuple, deque
+from concurrent.futures import ThreadPoolExecutor
+from difflib import SequenceMatcher
+from threading import Lock, Thread
+
+from cachetools import TTLCache
+from rapidfuzz.distance import Levenshtein
+
+from logs import logger
+
+# 結構化快取鍵：原文、源語言、目標語言、翻譯器，避免不同方向或翻譯器的結果互相覆蓋
+CacheKey = namedtuple("CacheKey", ["text", "source", "target", "backend"])
+
+# 結束寫入執行緒的哨兵
+_STOP = object()
+
+WHITESPACE_PATTERN = re.compile(r"\s+")
+# 近似重複比對的詞：中日韓文以單字為單位，其餘以連續的字母數字（含撇號與連字號）為單位
+TOKEN_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff\uac00-\ud7af]|[\w'’-]+")
+# 改變語意的否定詞，近似重複查詢不可增刪或替換
+NEGATIONS = frozenset({
+    "no", "not", "never", "nor", "none", "nothing", "nobody", "cannot", "without",
+    "不", "沒", "没", "別", "别", "無", "无", "非", "未", "勿", "莫", "못", "안",
+})
+
+
+class NearDuplicateHit(str):
+    """近似重複查詢取得的譯文，只能顯示為部分結果，不可被前綴沿用或成為最終結果"""
+
+
+def normalize_text(text):
+    """
+    快取鍵正規化：Unicode NFKC、合併空白、去除首尾標點並忽略大小寫
+    讓只在格式上不同的部分結果共用同一筆快取
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = WHITESPACE_PATTERN.sub(" ", text)
+    start, end = 0, len(text)
+    while start < end and _is_edge_char(text[start]):
+        start += 1
+    while end > start and _is_edge_char(text[end - 1]):
+        end -= 1
+    return text[start:end].casefold()
+
+
+def _is_edge_char(char):
+    return char.isspace() or unicodedata.category(char).startswith("P")
+
+
+def normalize_key(key):
+    return key._replace(text=normalize_text(key.text))
+
+
+class NearDuplicateIndex:
+    """
+    近似重複查詢：保留各翻譯方向最近的快取鍵，
+    以編輯距離上限找出只有細微差異的已快取文字
+    """
+    def __init__(self, recent_size=64, max_edits=3, max_ratio=0.1, min_length=12):
+        self.recent_size = recent_size
+        self.max_edits = max_edits
+        self.max_ratio = max_ratio
+        self.min_length = min_length
+        self.recent = {}  # {(源語言, 目標語言, 翻譯器): deque[正規化文字]}
+        self.rejected = 0  # 編輯距離在範圍內但詞的差異可能改變語意而捨棄的候選
+
+    def add(self, key):
+        group = self.recent.setdefault(key[1:], deque(maxlen=self.recent_size))
+        if key.text not in group:
+            group.append(key.text)
+
+    def find(self, key):
+        """回傳差異在容許範圍內且不改變詞義的最接近快取鍵，找不到時回傳 None"""
+        text = key.text
+        if len(text) < self.min_length:
+            return None
+        bound = min(self.max_edits, int(len(text) * self.max_ratio))
+        best, best_distance = None, bound + 1
+        for candidate in reversed(self.recent.get(key[1:], ())):
+            if abs(len(candidate) - len(text)) >= best_distance:
+                continue
+            distance = Levenshtein.distance(text, candidate, score_cutoff=best_distance - 1)
+            if distance < best_distance:
+                if not same_words(text, candidate):
+                    self.rejected += 1
+                    continue
+                best, best_distance = candidate, distance
+                if distance == 0:
+                    break
+        return key._replace(text=best) if best is not None else None
+
+
+def same_words(text, candidate):
+    """
+    詞層級的檢查：替換的詞去除空白、撇號與連字號後必須相同（如 e-mail 與 email、text book 與 textbook），
+    增刪的詞只能在句尾（識別器仍在延伸的部分），且不可涉及否定詞或數字；
+    避免 can 與 can't、5 與 6 這類少量編輯即改變語意的差異
+    """
+    words, other = TOKEN_PATTERN.findall(text), TOKEN_PATTERN.findall(candidate)
+    matcher = SequenceMatcher(None, words, other, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if tag == "replace" and _bare(words[i1:i2]) == _bare(other[j1:j2]):
+            continue
+        if tag == "replace" or i2 < len(words) or j2 < len(other):
+            return False
+        if any(_changes_meaning(word) for word in words[i1:i2] + other[j1:j2]):
+            return False
+    return True
+
+
+def _bare(words):
+    return "".join(words).replace("'", "").replace("’", "").replace("-", "")
+
+
+def _changes_meaning(word):
+    return (word in NEGATIONS or word.endswith(("n't", "n’t"))
+            or any(char.isdigit() for char in word))
+
+
+class CountingTTLCache(TTLCache):
+    """
+    記錄淘汰次數的 TTLCache（容量淘汰與過期皆計入）
+    """
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+
+    def expire(self, time=None):
+        size = len(self)
+        super().expire(time)
+        self.evictions += size - len(self)
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+
+class PersistentTranslationCache:
+    """
+    以 SQLite 持久化的第二層快取
+    具 TTL 過期與依最後存取時間的 LRU 淘汰，並限制總筆數；
+    get 只讀取，由專用的讀取執行緒（executor）執行，不與其他預設執行緒池的工作競爭；
+    寫入、刪除與命中記錄排入佇列，由單一寫入執行緒以自己的連線批次寫入
+    """
+    def __init__(self, path, max_entries=50000, ttl=30 * 24 * 3600, max_queue=10000, batch_size=256):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.batch_size = batch_size
+        self.lock = Lock()  # 保護讀取用的連線
+        self.evictions = 0
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats = {"writes": 0, "batches": 0, "dropped": 0}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = self._connect()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS translations (
+                text TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                backend TEXT NOT NULL,
+                value TEXT NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (text, source, target, backend)
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_accessed ON translations (accessed)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_hits ON translations (hits)")
+        self._purge_expired(self.conn)
+        self.size = self.conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+        self.thread = Thread(target=self._run, name="cache-writer", daemon=True)
+        self.thread.start()
+        # 讀取連線以鎖保護，一個讀取執行緒即可
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cache-reader")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key):
+        """讀取快取（會阻塞，不可在事件循環上呼叫），過期的項目排入刪除並視為未命中"""
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, created FROM translations "
+                "WHERE text = ? AND source = ? AND target = ? AND backend = ?",
+                key
+            ).fetchone()
+        if row is None:
+            return None
+        value, created = row
+        if now - created > self.ttl:
+            self._enqueue(("delete", key, now))
+            return None
+        self._enqueue(("hit", key, now))
+        return value
+
+    def set(self, key, value):
+        """排入寫入，不會阻塞呼叫者"""
+        self._enqueue(("set", key, value, time.time()))
+
+    def _enqueue(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _run(self):
+        """寫入執行緒：一次取出佇列中所有的請求（最多 batch_size 筆），以單一交易寫入"""
+        conn = self._connect()
+        stopping = False
+        while not stopping:
+            batch = [self.queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                stopping = True
+                batch = [item for item in batch if item is not _STOP]
+            if batch:
+                try:
+                    self._write_batch(conn, batch)
+                except sqlite3.Error as e:
+                    logger.error(f"Persistent cache write error: {e}")
+            for _ in range(len(batch) + stopping):
+                self.queue.task_done()
+        conn.close()
+
+    def _write_batch(self, conn, batch):
+        """合併同一鍵的請求：寫入以最後一筆為準，命中累加次數並保留最後存取時間"""
+        writes, hits, deletes = {}, {}, {}
+        for kind, key, *rest in batch:
+            if kind == "set":
+                writes[key] = rest
+                deletes.pop(key, None)
+            elif kind == "hit":
+                count, _ = hits.get(key, (0, 0.0))
+                hits[key] = (count + 1, rest[0])
+            else:
+                deletes[key] = rest[0]
+
+        conn.execute("BEGIN")
+        try:
+            for key, now in deletes.items():
+                # 條件中再次檢查過期，避免刪除期間被重新寫入的項目
+                cursor = conn.execute(
+                    "DELETE FROM translations "
+                    "WHERE text = ? AND source = ? AND target = ? AND backend = ? AND created < ?",
+                    (*key, now - self.ttl)
+                )
+                self.size -= cursor.rowcount
+                self.evictions += cursor.rowcount
+            for key, (value, now) in writes.items():
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO translations "
+                    "(text, source, target, backend, value, created, accessed, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+                    (*key, value, now, now)
+                )
+                if cursor.rowcount:
+                    self.size += 1
+                else:
+                    conn.execute(
+                        "UPDATE translations SET value = ?, created = ?, accessed = ? "
+                        "WHERE text = ? AND source = ? AND target = ? AND backend = ?",
+                        (value, now, now, *key)
+                    )
+            conn.executemany(
+                "UPDATE translations SET accessed = MAX(accessed, ?), hits = hits + ? "
+                "WHERE text = ? AND source = ? AND target = ? AND backend = ?",
+                [(accessed, count, *key) for key, (count, accessed) in hits.items()]
+            )
+            if self.size > self.max_entries:
+                self._evict_lru(conn)
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        self.stats["writes"] += len(batch)
+        self.stats["batches"] += 1
+
+    def flush(self):
+        """等待已排入的寫入完成"""
+        self.queue.join()
+
+    def hottest(self, limit):
+        """取得命中次數最多且未過期的項目，供啟動時預熱記憶體層"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT text, source, target, backend, value FROM translations "
+                "WHERE created >= ? ORDER BY hits DESC, accessed DESC LIMIT ?",
+                (time.time() - self.ttl, limit)
+            ).fetchall()
+        return [(CacheKey(*row[:4]), row[4]) for row in rows]
+
+    def _evict_lru(self, conn):
+        """一次淘汰約 10% 容量，避免每次寫入都觸發刪除"""
+        excess = self.size - self.max_entries + max(1, self.max_entries // 10)
+        cursor = conn.execute(
+            "DELETE FROM translations WHERE rowid IN "
+            "(SELECT rowid FROM translations ORDER BY accessed LIMIT ?)",
+            (excess,)
+        )
+        self.size -= cursor.rowcount
+        self.evictions += cursor.rowcount
+
+    def _purge_expired(self, conn):
+        cursor = conn.execute(
+            "DELETE FROM translations WHERE created < ?",
+            (time.time() - self.ttl,)
+        )
+        self.evictions += cursor.rowcount
+
+    def close(self, timeout=5.0):
+        """寫入剩餘的請求並關閉連線（會阻塞，不可在事件循環上呼叫）"""
+        self.executor.shutdown(wait=True)
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join(timeout)
+        with self.lock:
+            self.conn.close()
+
+
+class TranslationCache:
+    """
+    兩層翻譯快取
+    第一層為記憶體中的 TTLCache，未命中時讀穿至第二層的 SQLite 持久化快取
+    """
+    def __init__(self, max_size=1000, expire_time=300, persistent=None, warm_size=200,
+                 near_duplicate=None):
+        self.cache = CountingTTLCache(maxsize=max_size, ttl=expire_time)
+        self.persistent = persistent
+        self.near_duplicate = near_duplicate
+        self.stats = {
+            "memory": {"hits": 0, "misses": 0},
+            "disk": {"hits": 0, "misses": 0},
+            "near_duplicate": {"hits": 0, "misses": 0},
+        }
+        if persistent and warm_size:
+            self.warm_up(min(warm_size, max_size))
+
+    def warm_up(self, limit):
+        """從持久化快取載入最常用的項目"""
+        try:
+            entries = self.persistent.hottest(limit)
+            # 由冷到熱寫入，讓最常用的項目最晚被 LRU 淘汰
+            for key, value in reversed(entries):
+                self.cache[key] = value
+            logger.info(f"Translation cache warmed with {len(entries)} entries")
+        except Exception as e:
+            logger.error(f"Translation cache warm-up error: {e}")
+
+    async def get(self, key, fuzzy=False):
+        """
+        依正規化後的鍵查詢快取；fuzzy 為 True 時，未命中會再嘗試近似重複查詢，
+        近似重複的命中以 NearDuplicateHit 回傳；記憶體層命中時不會讓出事件循環
+        """
+        key = normalize_key(key)
+        value = await self._get(key)
+        if value is not None or not fuzzy or self.near_duplicate is None:
+            return value
+
+        near_key = self.near_duplicate.find(key)
+        value = self.cache.get(near_key) if near_key else None
+        group = "hits" if value is not None else "misses"
+        self.stats["near_duplicate"][group] += 1
+        return NearDuplicateHit(value) if value is not None else None
+
+    async def _get(self, key):
+        value = self.cache.get(key)
+        if value is not None:
+            self.stats["memory"]["hits"] += 1
+            return value
+        self.stats["memory"]["misses"] += 1
+
+        if self.persistent is None:
+            return None
+        try:
+            # SQLite 讀取在快取專用的讀取執行緒上進行，不阻塞事件循環
+            value = await asyncio.get_running_loop().run_in_executor(
+                self.persistent.executor, self.persistent.get, key
+            )
+        except Exception as e:
+            logger.error(f"Persistent cache read error: {e}")
+            return None
+        if value is None:
+            self.stats["disk"]["misses"] += 1
+            return None
+        self.stats["disk"]["hits"] += 1
+        self.cache[key] = value
+        return value
+
+    def set(self, key, value):
+        key = normalize_key(key)
+        self.cache[key] = value
+        if self.near_duplicate is not None:
+            self.near_duplicate.add(key)
+        if self.persistent is not None:
+            try:
+                self.persistent.set(key, value)
+            except Exception as e:
+                logger.error(f"Persistent cache write error: {e}")
+
+    def get_stats(self):
+        """各層的命中、未命中與淘汰計數"""
+        stats = {
+            "memory": dict(self.stats["memory"], evictions=self.cache.evictions, size=len(self.cache)),
+            "disk": dict(self.stats["disk"]),
+            "near_duplicate": dict(self.stats["near_duplicate"]),
+        }
+        if self.near_duplicate is not None:
+            stats["near_duplicate"]["rejected"] = self.near_duplicate.rejected
+        if self.persistent is not None:
+            stats["disk"].update(evictions=self.persistent.evictions, size=self.persistent.size,
+                                 queued=self.persistent.queue.qsize(), **self.persistent.stats)
+        return stats
+
+    def close(self):
+        if self.persistent is not None:
+            self.persistent.close()
@@ -0,0 +1,149 @@
+from sentences import SentenceBuffer, layout_paragraphs
+
+# 增量字幕協定版本
+PROTOCOL_VERSION = 1
+
+
+class CaptionState:
+    """
+    字幕狀態與增量編碼
+    追蹤目前顯示的段落（已完成的段落與當前段落），每次更新只產生變動的尾端與序號，
+    客戶端可依序號偵測遺漏並要求完整快照
+    """
+    def __init__(self):
+        # (序號, 段落清單, 語言) 以單一元組保存，讓其他執行緒讀取快照時不需加鎖
+        self.state = (0, [], None)
+
+    def update(self, segments, lang):
+        """
+        更新顯示段落，回傳增量訊息；內容沒有變化時回傳 None
+        增量訊息：保留前 base 個段落，第 base 個段落保留前 keep 個字元後接上 segments[0]，
+        其餘 segments 依序附加在後
+        """
+        seq, current, current_lang = self.state
+        segments = [segment for segment in segments if segment]
+        if segments == current and lang == current_lang:
+            return None
+
+        base = 0
+        while base < len(segments) and base < len(current) and segments[base] == current[base]:
+            base += 1
+        if base == len(segments):
+            # 段落被移除（例如換段）：從最後一個保留的段落重新送出
+            base = max(0, base - 1)
+        keep = 0
+        if base < len(current) and base < len(segments):
+            old, new = current[base], segments[base]
+            limit = min(len(old), len(new))
+            while keep < limit and old[keep] == new[keep]:
+                keep += 1
+
+        seq += 1
+        self.state = (seq, segments, lang)
+        tail = segments[base:]
+        if tail:
+            tail = [tail[0][keep:]] + tail[1:]
+        return {
+            "v": PROTOCOL_VERSION,
+            "seq": seq,
+            "base": base,
+            "keep": keep,
+            "segments": tail,
+            "lang": lang,
+        }
+
+    def snapshot(self):
+        """完整快照，供新加入或序號不連續的客戶端重新同步"""
+        seq, segments, lang = self.state
+        return {
+            "v": PROTOCOL_VERSION,
+            "seq": seq,
+            "full": True,
+            "segments": list(segments),
+            "lang": lang,
+        }
+
+
+def apply_delta(segments, delta):
+    """將增量訊息套用到段落清單，回傳新的段落清單（與 client.js 相同的規則）"""
+    base, keep, tail = delta["base"], delta["keep"], delta["segments"]
+    kept = segments[:base]
+    if tail:
+        kept.append((segments[base] if base < len(segments) else "")[:keep] + tail[0])
+        kept.extend(tail[1:])
+    return kept
+
+
+def merge_deltas(older, newer):
+    """
+    將同一字幕狀態的兩則訊息合併為一則效果相同的訊息，供傳送佇列合併尚未送出的訊息
+    較新的完整快照直接取代；增量訊息合併後涵蓋序號 first 到 seq，客戶端套用後的段落與依序套用兩則相同，
+    已完成的段落不會遺失；序號不連續時回傳 None
+    """
+    if newer.get("full"):
+        return newer
+    if newer["seq"] <= older["seq"]:
+        return older
+    if newer.get("first", newer["seq"]) != older["seq"] + 1:
+        return None
+    if older.get("full"):
+        merged = {key: value for key, value in newer.items() if key not in ("base", "keep", "first")}
+        merged.update(full=True, segments=apply_delta(older["segments"], newer))
+        return merged
+
+    base, keep, tail = older["base"], older["keep"], older["segments"]
+    new_base, new_keep, new_tail = newer["base"], newer["keep"], newer["segments"]
+    if new_base < base:
+        # 較新的訊息從較前面的段落改寫，與較舊的訊息無關
+        base, keep, tail = new_base, new_keep, new_tail
+    elif new_base == base and new_keep < keep:
+        keep, tail = new_keep, new_tail
+    else:
+        # 以較舊訊息的 base 與 keep 表示較新訊息改寫後的段落：第 base 段已知的部分為較舊訊息的 segments[0]
+        index = new_base - base
+        if index > len(tail):
+            return None
+        if not tail:
+            # 較舊的訊息截斷了段落，較新的訊息接在其後
+            keep, tail = 0, new_tail
+        elif index == 0:
+            tail = [tail[0][:new_keep - keep] + new_tail[0]] + new_tail[1:] if new_tail else []
+        else:
+            current = tail[index] if index < len(tail) else ""
+            tail = tail[:index] + ([current[:new_keep] + new_tail[0]] + new_tail[1:] if new_tail else [])
+    return dict(newer, first=older.get("first", older["seq"]), base=base, keep=keep, segments=tail)
+
+
+class CaptionTrack:
+    """
+    單一目標語言的字幕軌
+    保存該語言已完成的段落、增量句子切分與字幕狀態，並記錄訂閱此語言的客戶端，
+    沒有訂閱者時不需翻譯
+    """
+    def __init__(self, language, room, max_length=19 * 12):
+        self.language = language
+        self.room = room  # Socket.IO 房間名稱
+        self.max_length = max_length
+        self.captions = CaptionState()
+        self.sentence_buffer = SentenceBuffer()
+        self.completed = {"mix": "", "prev_prev": ""}
+        self.subscribers = set()
+
+    def paragraphs(self, current_text):
+        """將已完成的段落與當前段落整理為 [前前段, 前段, 當前段]"""
+        buffer = self.sentence_buffer
+        return layout_paragraphs(
+            buffer.partial_sentences(current_text),
+            buffer.completed["mix"],
+            buffer.completed["prev_prev"],
+        )
+
+    def update(self, current_text):
+        """以當前段落的譯文更新字幕，回傳增量訊息或 None"""
+        return self.captions.update(self.paragraphs(current_text), self.language)
+
+    def commit(self, text):
+        """最終結果的譯文成為已完成的段落"""
+        self.completed["prev_prev"] = self.completed["mix"]
+        self.completed["mix"] = text[-self.max_length:]
+        self.sentence_buffer.commit(self.completed["mix"], self.completed["prev_prev"])
@@ -0,0 +1,90 @@
+import asyncio
+
+from logs import logger
+from metrics import BACKEND_SECONDS, BACKEND_ERRORS
+
+
+class TranslationDispatcher:
+    """
+    翻譯請求微批次調度器
+    在短暫的時間窗內收集請求，依 (翻譯器, 源語言, 目標語言) 分組，
+    以一次批次呼叫送出後再把結果交回各呼叫者的 future
+    """
+    def __init__(self, translation_manager, batch_translators, window=0.02, max_items=16):
+        self.translation_manager = translation_manager
+        self.batch_translators = batch_translators  # {翻譯器名稱: 批次翻譯協程函數}
+        self.window = window
+        self.max_items = max_items
+        self.pending = {}  # {(翻譯器, 源語言, 目標語言): [(文字, future)]}
+        self.timers = {}
+        self.stats = {"requests": 0, "batches": 0, "batched_texts": 0}
+
+    async def translate(self, backend, text, source_lang, target_lang):
+        """
+        排入單筆翻譯請求，回傳譯文；翻譯失敗時回傳 None
+        """
+        loop = asyncio.get_running_loop()
+        key = (backend, source_lang, target_lang)
+        future = loop.create_future()
+        batch = self.pending.setdefault(key, [])
+        batch.append((text, future))
+        self.stats["requests"] += 1
+
+        if len(batch) >= self.max_items:
+            self._flush(key)
+        elif len(batch) == 1:
+            self.timers[key] = loop.call_later(self.window, self._flush, key)
+        try:
+            return await future
+        except asyncio.CancelledError:
+            # 尚未送出的請求直接自批次中移除（例如對沖請求的輸家）
+            if self.pending.get(key) is batch:
+                batch.remove((text, future))
+                if not batch:
+                    self._flush(key)
+                    # 整批都沒有送出，不會有結果記錄，釋放呼叫者取得的半開探測
+                    self.translation_manager.router.release(backend)
+            raise
+
+    def _flush(self, key):
+        """送出指定分組目前累積的請求"""
+        timer = self.timers.pop(key, None)
+        if timer:
+            timer.cancel()
+        batch = self.pending.pop(key, None)
+        if batch:
+            asyncio.get_running_loop().create_task(self._send(key, batch))
+
+    async def _send(self, key, batch):
+        """以一次批次呼叫翻譯整組請求，相同文字只送出一次"""
+        backend, source_lang, target_lang = key
+        texts = list(dict.fromkeys(text for text, _ in batch))
+        self.stats["batches"] += 1
+        self.stats["batched_texts"] += len(texts)
+
+        # 延遲只計算翻譯器呼叫本身，不含等待並發額度的時間
+        results, latency = await self.translation_manager.translate_with_fallback(
+            self.batch_translators[backend], texts, source_lang, target_lang
+        )
+        ok = bool(results) and len(results) == len(texts)
+        if latency is None:
+            # 停止中未送出，不影響翻譯器的健康度
+            self.translation_manager.router.release(backend)
+        else:
+            self.translation_manager.router.record(backend, latency, ok)
+            # 多目標語言的請求（目標為元組）以逗號列出各語言
+            targets = ",".join(target_lang) if isinstance(target_lang, tuple) else target_lang
+            BACKEND_SECONDS.labels(backend, f"{source_lang}->{targets}").observe(latency)
+            if not ok:
+                BACKEND_ERRORS.labels(backend).inc()
+        if ok:
+            translations = dict(zip(texts, results))
+        else:
+            if results:
+                logger.error(f"{backend} batch returned {len(results)} results for {len(texts)} texts")
+            translations = {}
+
+        for text, future in batch:
+            # 呼叫者可能已被取消（例如被取代的部分結果）
+            if not future.done():
+                future.set_result(translations.get(text) or None)
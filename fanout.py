@@ -0,0 +1,458 @@
+"""
+字幕水平擴展：執行 ContinuousTranslation 的行程把字幕事件發布到訊息佇列一次，
+多個無狀態的 Socket.IO 邊緣節點（可在不同行程或主機）訂閱後各自送給自己的客戶端
+
+訊息佇列可使用 Redis（redis://，需要 pip install redis）或本模組內建的本機代理（tcp://，測試與單機多行程用）：
+    python fanout.py broker --port 5017
+    python fanout.py edge --broker tcp://127.0.0.1:5017 --port 5101
+主題：
+    captions      發布端 → 邊緣節點：{"event", "data", "room", "sent"}
+    control       邊緣節點 → 發布端：join、resync、leave、heartbeat
+    edge.{id}     發布端 → 單一邊緣節點：join 與 resync 的回覆（房間與字幕快照）
+"""
+import argparse
+import asyncio
+import json
+import queue
+import socket
+import time
+import uuid
+from threading import Event, Lock, Thread
+from urllib.parse import urlparse
+
+from logs import logger
+
+CAPTIONS = "captions"
+CONTROL = "control"
+
+# 結束背景執行緒的哨兵
+_STOP = object()
+
+
+def edge_topic(edge_id):
+    return f"edge.{edge_id}"
+
+
+class BrokerClient:
+    """
+    訊息佇列客戶端的共同部分：publish 不會阻塞呼叫者（排入有界佇列，由寫入執行緒送出，佇列已滿時丟棄），
+    訂閱的訊息在讀取執行緒上依到達順序呼叫回呼函數
+    """
+    def __init__(self, max_queue=10000):
+        self.handlers = {}  # {主題: 回呼函數}
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stopped = Event()
+        self.stats = {"published": 0, "received": 0, "dropped": 0, "reconnects": 0}
+
+    def subscribe(self, topic, callback):
+        """訂閱主題，需在 start 之前呼叫"""
+        self.handlers[topic] = callback
+
+    def start(self):
+        Thread(target=self._write_loop, name="broker-writer", daemon=True).start()
+        Thread(target=self._read_loop, name="broker-reader", daemon=True).start()
+        return self
+
+    def publish(self, topic, message):
+        try:
+            self.queue.put_nowait((topic, json.dumps(message, ensure_ascii=False)))
+        except queue.Full:
+            self.stats["dropped"] += 1
+
+    def _dispatch(self, topic, payload):
+        handler = self.handlers.get(topic)
+        if handler is None:
+            return
+        self.stats["received"] += 1
+        try:
+            handler(json.loads(payload))
+        except Exception as e:
+            logger.error(f"Broker message handler error ({topic}): {e}")
+
+    def _write_loop(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+            try:
+                self._send(*item)
+                self.stats["published"] += 1
+            except OSError as e:
+                self.stats["dropped"] += 1
+                logger.warning(f"Broker publish failed: {e}")
+
+    def _read_loop(self):
+        delay = 0.5
+        while not self.stopped.is_set():
+            try:
+                self._listen()
+                delay = 0.5
+            except OSError as e:
+                if self.stopped.is_set():
+                    break
+                logger.warning(f"Broker connection lost: {e}, reconnecting in {delay:.1f}s")
+            self.stats["reconnects"] += 1
+            self.stopped.wait(delay)
+            delay = min(delay * 2, 5.0)
+
+    def close(self):
+        self.stopped.set()
+        self.queue.put(_STOP)
+
+
+class TcpBrokerClient(BrokerClient):
+    """本機代理（LocalBroker）的客戶端，一條 TCP 連線同時用於發布與訂閱，斷線時自動重連"""
+    def __init__(self, host, port, max_queue=10000):
+        super().__init__(max_queue)
+        self.address = (host, port)
+        self.sock = None
+        self.connected = Event()
+        self.lock = Lock()
+
+    def _send(self, topic, payload):
+        # 斷線期間等待重連，逾時則丟棄該訊息
+        if not self.connected.wait(5.0):
+            raise OSError("not connected")
+        with self.lock:
+            self.sock.sendall(f"PUB {topic} {payload}\n".encode())
+
+    def _listen(self):
+        sock = socket.create_connection(self.address)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            with self.lock:
+                self.sock = sock
+                sock.sendall("".join(f"SUB {topic}\n" for topic in self.handlers).encode())
+            self.connected.set()
+            logger.info(f"Connected to broker {self.address[0]}:{self.address[1]}")
+            for line in sock.makefile("rb"):
+                _, topic, payload = line.decode().rstrip("\n").split(" ", 2)
+                self._dispatch(topic, payload)
+            raise OSError("connection closed by broker")
+        finally:
+            self.connected.clear()
+            sock.close()
+
+    def close(self):
+        super().close()
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class RedisBrokerClient(BrokerClient):
+    """以 Redis 發布/訂閱作為訊息佇列"""
+    def __init__(self, url, max_queue=10000):
+        super().__init__(max_queue)
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('A redis:// broker requires the redis package: pip install redis') from e
+        self.redis = redis.Redis.from_url(url)
+        self.pubsub = None
+
+    def _send(self, topic, payload):
+        try:
+            self.redis.publish(topic, payload)
+        except Exception as e:
+            raise OSError(str(e)) from e
+
+    def _listen(self):
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        try:
+            if self.handlers:
+                self.pubsub.subscribe(*self.handlers)
+            for message in self.pubsub.listen():
+                if self.stopped.is_set():
+                    return
+                self._dispatch(message["channel"].decode(), message["data"].decode())
+        except OSError:
+            raise
+        except Exception as e:
+            raise OSError(str(e)) from e
+        finally:
+            self.pubsub.close()
+
+    def close(self):
+        super().close()
+        if self.pubsub is not None:
+            self.pubsub.close()
+
+
+def connect_broker(url):
+    """依網址建立訊息佇列客戶端：tcp://主機:埠（本機代理）或 redis://"""
+    parsed = urlparse(url)
+    if parsed.scheme == "tcp":
+        return TcpBrokerClient(parsed.hostname or "127.0.0.1", parsed.port or 5017)
+    if parsed.scheme in ("redis", "rediss"):
+        return RedisBrokerClient(url)
+    raise ValueError(f"Unsupported broker URL: {url}")
+
+
+class LocalBroker:
+    """
+    本機訊息代理（Redis 發布/訂閱的替身），以換行分隔的文字協定轉送訊息：
+    客戶端送出 "SUB 主題" 或 "PUB 主題 內容"，代理將 "MSG 主題 內容" 原樣轉送給所有訂閱者，不解析內容；
+    訂閱者的傳送緩衝超過 max_buffer 時斷開該連線，慢速訂閱者不會拖慢其他訂閱者或佔用無限記憶體
+    """
+    def __init__(self, max_buffer=8 * 1024 * 1024):
+        self.max_buffer = max_buffer
+        self.subscribers = {}  # {主題: {StreamWriter}}
+        self.server = None
+        self.stats = {"published": 0, "delivered": 0, "disconnected_slow": 0}
+
+    async def start(self, host="127.0.0.1", port=5017):
+        self.server = await asyncio.start_server(self._handle, host, port, limit=1024 * 1024)
+        logger.info(f"Local broker listening on {host}:{port}")
+        return self
+
+    async def _handle(self, reader, writer):
+        sock = writer.get_extra_info("socket")
+        if sock is not None:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        topics = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                verb, _, rest = line.partition(b" ")
+                if verb == b"SUB":
+                    topic = rest.strip()
+                    self.subscribers.setdefault(topic, set()).add(writer)
+                    topics.add(topic)
+                elif verb == b"PUB":
+                    topic, _, payload = rest.partition(b" ")
+                    self._deliver(topic, b"MSG " + topic + b" " + payload)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            logger.warning(f"Local broker connection error: {e}")
+        finally:
+            for topic in topics:
+                self.subscribers.get(topic, set()).discard(writer)
+            writer.close()
+
+    def _deliver(self, topic, frame):
+        self.stats["published"] += 1
+        for writer in list(self.subscribers.get(topic, ())):
+            if writer.transport.get_write_buffer_size() > self.max_buffer:
+                self.stats["disconnected_slow"] += 1
+                logger.warning(f"Local broker dropped a slow subscriber of {topic.decode()}")
+                self.subscribers[topic].discard(writer)
+                writer.transport.abort()
+                continue
+            writer.write(frame)
+            self.stats["delivered"] += 1
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+class CaptionPublisher:
+    """
+    發布端：提供與 Socket.IO 相同的 emit(event, data, to) 介面，場次的字幕事件只發布到訊息佇列一次；
+    local 不為 None 時同時送給本行程的客戶端。
+    邊緣節點的 join/resync/leave 以控制訊息送達，由 subscribe(客戶端 ID, 參數) → 房間、
+    snapshot(參數) → 快照、unsubscribe(客戶端 ID) 處理（客戶端 ID 為 "邊緣節點/sid"）；
+    超過 edge_timeout 秒沒有心跳的邊緣節點視為離線，其客戶端的字幕軌訂閱隨之移除。
+    loop 不為 None 時這些處理函數都在該事件循環上依到達順序執行（字幕軌的訂閱集合只在場次的事件循環上修改），
+    否則在訊息佇列的讀取執行緒上執行
+    """
+    def __init__(self, local, broker_url, subscribe, snapshot, unsubscribe, edge_timeout=30.0, loop=None):
+        self.local = local
+        self.subscribe = subscribe
+        self.snapshot = snapshot
+        self.unsubscribe = unsubscribe
+        self.edge_timeout = edge_timeout
+        self.loop = loop
+        self.edges = {}  # {邊緣節點 ID: [最後心跳時間, {客戶端 ID}]}
+        self.lock = Lock()
+        self.broker = connect_broker(broker_url)
+        self.broker.subscribe(CONTROL, self._handle_control)
+        self.broker.start()
+        Thread(target=self._expire_loop, name="fanout-expire", daemon=True).start()
+
+    def emit(self, event, data=None, to=None):
+        if self.local is not None:
+            self.local.emit(event, data, to=to)
+        self.broker.publish(CAPTIONS, {"event": event, "data": data, "room": to, "sent": time.time()})
+
+    def _call(self, callback, *args):
+        if self.loop is None:
+            callback(*args)
+        else:
+            self.loop.call_soon_threadsafe(callback, *args)
+
+    def _handle_control(self, message):
+        """讀取執行緒：交給事件循環處理"""
+        self._call(self._apply_control, message)
+
+    def _apply_control(self, message):
+        edge = message["edge"]
+        with self.lock:
+            clients = self.edges.setdefault(edge, [0.0, set()])
+            clients[0] = time.monotonic()
+        kind = message["type"]
+        client = f"{edge}/{message.get('sid')}"
+        if kind == "join":
+            room = self.subscribe(client, message["data"])
+            with self.lock:
+                clients[1].add(client)
+            self.broker.publish(edge_topic(edge), {
+                "type": "joined", "sid": message["sid"], "room": room, "snapshot": self.snapshot(message["data"])
+            })
+        elif kind == "resync":
+            self.broker.publish(edge_topic(edge), {
+                "type": "snapshot", "sid": message["sid"], "snapshot": self.snapshot(message["data"])
+            })
+        elif kind == "leave":
+            self.unsubscribe(client)
+            with self.lock:
+                clients[1].discard(client)
+
+    def _expire_loop(self):
+        while not self.broker.stopped.wait(self.edge_timeout / 3):
+            now = time.monotonic()
+            with self.lock:
+                expired = [edge for edge, (seen, _) in self.edges.items() if now - seen > self.edge_timeout]
+                clients = [client for edge in expired for client in self.edges.pop(edge)[1]]
+            for client in clients:
+                self._call(self.unsubscribe, client)
+            if expired:
+                logger.warning(f"Fan-out edges timed out: {', '.join(expired)} ({len(clients)} clients)")
+
+    def snapshot_stats(self):
+        with self.lock:
+            edges = len(self.edges)
+            clients = sum(len(entry[1]) for entry in self.edges.values())
+        return dict(self.broker.stats, edges=edges, edge_clients=clients)
+
+    def close(self):
+        self.broker.close()
+
+
+class EdgeWorker:
+    """
+    無狀態的 Socket.IO 邊緣節點：訂閱字幕主題並送給本節點的客戶端，不執行識別與翻譯；
+    join/caption_resync 轉為控制訊息交給發布端處理，回覆（房間與快照）與字幕依到達順序在事件循環上處理
+    """
+    def __init__(self, broker_url, edge_id=None, heartbeat=10.0):
+        self.edge_id = edge_id or uuid.uuid4().hex[:8]
+        self.heartbeat = heartbeat
+        self.broker = connect_broker(broker_url)
+        self.broker.subscribe(CAPTIONS, self._forward)
+        self.broker.subscribe(edge_topic(self.edge_id), self._forward)
+        self.sio = None
+        self.loop = None
+        self.queue = None
+        self.stats = {"emitted": 0, "replies": 0, "errors": 0, "max_queue_depth": 0}
+
+    def _forward(self, message):
+        """讀取執行緒：依到達順序排入事件循環"""
+        self.loop.call_soon_threadsafe(self._enqueue, message)
+
+    def _enqueue(self, message):
+        self.queue.put_nowait(message)
+        self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self.queue.qsize())
+
+    def _control(self, kind, sid=None, data=None):
+        self.broker.publish(CONTROL, {"type": kind, "edge": self.edge_id, "sid": sid, "data": data})
+
+    async def _run(self):
+        while True:
+            message = await self.queue.get()
+            try:
+                if "event" in message:
+                    await self.sio.emit(message["event"], message["data"], to=message["room"])
+                    self.stats["emitted"] += 1
+                else:
+                    if message["type"] == "joined":
+                        await self.sio.enter_room(message["sid"], message["room"])
+                    await self.sio.emit('caption_delta', message["snapshot"], to=message["sid"])
+                    self.stats["replies"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                logger.error(f"Edge emit error: {e}")
+
+    async def _heartbeat(self):
+        while True:
+            self._control("heartbeat")
+            await asyncio.sleep(self.heartbeat)
+
+    def create_app(self):
+        """Socket.IO 由 AsyncServer 處理，頁面與靜態檔交給與主程式相同的模板"""
+        import socketio as python_socketio
+        from flask import Flask, render_template
+        from uvicorn.middleware.wsgi import WSGIMiddleware
+
+        sio = self.sio = python_socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+
+        @sio.event
+        async def join(sid, data):
+            self._control("join", sid, data)
+
+        @sio.event
+        async def caption_resync(sid, data):
+            self._control("resync", sid, data)
+
+        @sio.event
+        async def disconnect(sid):
+            self._control("leave", sid)
+
+        pages = Flask(__name__)
+        pages.add_url_rule('/', 'index', lambda: render_template('index.html'))
+        return python_socketio.ASGIApp(sio, other_asgi_app=WSGIMiddleware(pages))
+
+    async def serve(self, host="0.0.0.0", port=5101):
+        import uvicorn
+
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        server = uvicorn.Server(uvicorn.Config(self.create_app(), host=host, port=port, lifespan="off",
+                                               log_level="warning"))
+        self.broker.start()
+        tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._heartbeat())]
+        logger.info(f"Edge worker {self.edge_id} serving on {host}:{port}")
+        try:
+            await server.serve()
+        finally:
+            for task in tasks:
+                task.cancel()
+            self.broker.close()
+            logger.info(f"Edge worker {self.edge_id} stats: {self.stats}, broker: {self.broker.stats}")
+
+
+async def serve_broker(host, port):
+    broker = await LocalBroker().start(host, port)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await broker.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Caption fan-out: local broker and Socket.IO edge workers")
+    commands = parser.add_subparsers(dest="command", required=True)
+    broker = commands.add_parser("broker", help="run the local message broker")
+    broker.add_argument("--host", default="127.0.0.1")
+    broker.add_argument("--port", type=int, default=5017)
+    edge = commands.add_parser("edge", help="run a Socket.IO edge worker")
+    edge.add_argument("--broker", default="tcp://127.0.0.1:5017")
+    edge.add_argument("--host", default="0.0.0.0")
+    edge.add_argument("--port", type=int, default=5101)
+    edge.add_argument("--edge-id")
+    args = parser.parse_args(argv)
+    try:
+        if args.command == "broker":
+            asyncio.run(serve_broker(args.host, args.port))
+        else:
+            asyncio.run(EdgeWorker(args.broker, args.edge_id).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from array import array
+from threading import Lock
+
+
+class TranscriptHistory:
+    """
+    已完成語句的環形紀錄（每場次一個）
+    以預先配置的陣列保存起訖時間、識別語言、原文與各語言譯文，容量固定，場次再長記憶體也不會增加；
+    語句依時間先後加入，依時間位移查詢時以二分搜尋定位
+    """
+    def __init__(self, capacity=2000):
+        self.capacity = capacity
+        self.starts = array('d', bytes(8 * capacity))
+        self.ends = array('d', bytes(8 * capacity))
+        self.languages = [None] * capacity
+        self.texts = [None] * capacity
+        self.translations = [None] * capacity
+        self.head = 0  # 最舊語句的位置
+        self.size = 0
+        self.next_id = 0  # 下一個語句的 ID（整個場次遞增，不因覆寫而重複）
+        self.lock = Lock()
+
+    @property
+    def first_id(self):
+        """仍保留的最舊語句 ID"""
+        return self.next_id - self.size
+
+    def append(self, start, end, language, text, translations):
+        """加入一個已完成的語句，容量已滿時覆寫最舊的語句；回傳語句 ID"""
+        with self.lock:
+            if self.size == self.capacity:
+                index = self.head
+                self.head = (self.head + 1) % self.capacity
+            else:
+                index = (self.head + self.size) % self.capacity
+                self.size += 1
+            self.starts[index] = start
+            self.ends[index] = end
+            self.languages[index] = language
+            self.texts[index] = text
+            self.translations[index] = dict(translations)
+            segment_id = self.next_id
+            self.next_id += 1
+            return segment_id
+
+    def _segment(self, segment_id):
+        index = (self.head + segment_id - self.first_id) % self.capacity
+        return {
+            "id": segment_id,
+            "start": self.starts[index],
+            "end": self.ends[index],
+            "language": self.languages[index],
+            "text": self.texts[index],
+            "translations": dict(self.translations[index]),
+        }
+
+    def _find_offset(self, seconds):
+        """第一個結束時間晚於 seconds 的語句 ID（二分搜尋）"""
+        low, high = 0, self.size
+        while low < high:
+            middle = (low + high) // 2
+            if self.ends[(self.head + middle) % self.capacity] <= seconds:
+                low = middle + 1
+            else:
+                high = middle
+        return self.first_id + low
+
+    def page(self, after=None, before=None, since=None, limit=50):
+        """
+        分頁查詢，語句依時間先後排列：
+        after 取 ID 之後的語句（往新的方向捲動），before 取 ID 之前的語句（往舊的方向捲動），
+        since 取 since 秒之後仍在進行或之後的語句；都省略時取最新的 limit 句
+        回傳 {"segments", "next", "prev", "first_id", "next_id"}，next/prev 為繼續捲動用的游標（沒有時為 None）
+        """
+        limit = max(1, limit)
+        with self.lock:
+            first_id, next_id = self.first_id, self.next_id
+            if after is not None:
+                start = max(after + 1, first_id)
+                stop = min(start + limit, next_id)
+            elif before is not None:
+                stop = min(before, next_id)
+                start = max(stop - limit, first_id)
+            elif since is not None:
+                start = self._find_offset(since)
+                stop = min(start + limit, next_id)
+            else:
+                stop = next_id
+                start = max(stop - limit, first_id)
+            stop = max(start, stop)
+            segments = [self._segment(segment_id) for segment_id in range(start, stop)]
+        return {
+            "segments": segments,
+            "next": stop - 1 if stop < next_id else None,
+            "prev": start if start > first_id else None,
+            "first_id": first_id,
+            "next_id": next_id,
+        }
@@ -0,0 +1,297 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from threading import RLock
+
+from cache import normalize_text
+from logs import logger
+from metrics import MEMORY_LOOKUP_SECONDS
+
+# 送往翻譯器前取代術語的佔位符，還原時容許翻譯器在括號內外加入空白
+PLACEHOLDER = "⟦{}⟧"
+PLACEHOLDER_PATTERN = re.compile(r"⟦\s*(\d+)\s*⟧")
+
+# 術語對所有目標語言保持原文時使用的目標語言
+ANY_LANGUAGE = "*"
+
+
+def _term_pattern(terms):
+    """依長度由長到短組成術語的正規表示式，英數字術語前後需為詞界"""
+    parts = []
+    for term in sorted(terms, key=len, reverse=True):
+        part = re.escape(term)
+        if term[0].isascii() and (term[0].isalnum() or term[0] == "_"):
+            part = r"(?<!\w)" + part
+        if term[-1].isascii() and (term[-1].isalnum() or term[-1] == "_"):
+            part += r"(?!\w)"
+        parts.append(part)
+    return re.compile("|".join(parts)) if parts else None
+
+
+class TranslationMemory:
+    """
+    翻譯記憶與術語表
+    已核可的 原文→譯文 句段以 SQLite 保存，啟動時載入記憶體索引，查詢只需字典查找（先完全相符，再比對正規化文字）；
+    術語在送往翻譯器前以佔位符保護，譯文回來後換回術語表指定的譯名（未指定則保留原文）
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = RLock()
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path or ":memory:", check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS segments (
+                source_language TEXT NOT NULL,
+                target_language TEXT NOT NULL,
+                normalized TEXT NOT NULL,
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                updated REAL NOT NULL,
+                PRIMARY KEY (source_language, target_language, normalized)
+            )
+        """)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS terms (
+                source_language TEXT NOT NULL,
+                term TEXT NOT NULL,
+                target_language TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                PRIMARY KEY (source_language, term, target_language)
+            )
+        """)
+        # 記憶體索引：{(源語言, 目標語言, 原文): 譯文}、{(源語言, 目標語言, 正規化原文): (原文, 譯文)}
+        self.exact = {}
+        self.normalized = {}
+        # 術語表：{源語言: {術語: {目標語言: 譯名}}}，以及各源語言的比對式
+        self.terms = {}
+        self.patterns = {}
+        self.stats = {
+            "exact_hits": 0,
+            "normalized_hits": 0,
+            "misses": 0,
+            "protected_texts": 0,
+            "protected_terms": 0,
+            "lost_terms": 0,
+        }
+        self._load()
+
+    def _load(self):
+        rows = self.conn.execute(
+            "SELECT source_language, target_language, normalized, source, target FROM segments"
+        ).fetchall()
+        for source_language, target_language, normalized, source, target in rows:
+            self.exact[(source_language, target_language, source)] = target
+            self.normalized[(source_language, target_language, normalized)] = (source, target)
+        for source_language, term, target_language, translation in self.conn.execute(
+                "SELECT source_language, term, target_language, translation FROM terms"):
+            self.terms.setdefault(source_language, {}).setdefault(term, {})[target_language] = translation
+        self.patterns = {language: _term_pattern(terms) for language, terms in self.terms.items()}
+        if rows or self.terms:
+            logger.info(f"Translation memory loaded {len(rows)} segments, "
+                        f"{sum(map(len, self.terms.values()))} terms")
+
+    def lookup(self, text, source_language, target_language):
+        """查詢已核可的譯文，未命中時回傳 None"""
+        start = time.perf_counter()
+        result = self.exact.get((source_language, target_language, text))
+        if result is not None:
+            self.stats["exact_hits"] += 1
+        else:
+            entry = self.normalized.get((source_language, target_language, normalize_text(text)))
+            result = entry[1] if entry is not None else None
+            self.stats["normalized_hits" if entry is not None else "misses"] += 1
+        MEMORY_LOOKUP_SECONDS.observe(time.perf_counter() - start)
+        return result
+
+    def protect(self, text, source_language):
+        """
+        以佔位符取代文字中的術語，回傳 (受保護的文字, 術語列表)
+        佔位符與目標語言無關，同一段受保護的文字可翻譯成多個目標語言
+        """
+        pattern = self.patterns.get(source_language)
+        if pattern is None:
+            return text, ()
+        terms = []
+
+        def replace(match):
+            terms.append(match.group(0))
+            return PLACEHOLDER.format(len(terms) - 1)
+
+        protected = pattern.sub(replace, text)
+        if terms:
+            self.stats["protected_texts"] += 1
+            self.stats["protected_terms"] += len(terms)
+        return protected, tuple(terms)
+
+    def restore(self, translation, terms, source_language, target_language):
+        """將譯文中的佔位符換回術語的譯名"""
+        if not terms or not translation:
+            return translation
+        glossary = self.terms.get(source_language, {})
+        restored = set()
+
+        def replace(match):
+            index = int(match.group(1))
+            if index >= len(terms):
+                return match.group(0)
+            restored.add(index)
+            term = terms[index]
+            translations = glossary.get(term, {})
+            return translations.get(target_language) or translations.get(ANY_LANGUAGE) or term
+
+        translation = PLACEHOLDER_PATTERN.sub(replace, translation)
+        lost = len(terms) - len(restored)
+        if lost:
+            self.stats["lost_terms"] += lost
+        return translation
+
+    def add_segment(self, source_language, target_language, source, target):
+        """新增或更新一筆已核可的句段"""
+        with self.lock:
+            key = self._write_segment(source_language, target_language, source, target)
+            self._apply_segments({key: (source, target)})
+
+    def _write_segment(self, source_language, target_language, source, target):
+        """寫入資料庫，回傳記憶體索引的正規化鍵；記憶體索引由 _apply_segments 更新"""
+        if not source.strip() or not target.strip():
+            raise ValueError("segment source and target must not be empty")
+        normalized = normalize_text(source)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO segments "
+            "(source_language, target_language, normalized, source, target, updated) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (source_language, target_language, normalized, source, target, time.time())
+        )
+        return source_language, target_language, normalized
+
+    def _apply_segments(self, segments):
+        """將已寫入資料庫的句段 {(源語言, 目標語言, 正規化原文): (原文, 譯文)} 加入記憶體索引"""
+        for key, (source, target) in segments.items():
+            # 正規化後相同的舊句段被取代，移除其完全相符索引
+            previous = self.normalized.get(key)
+            if previous is not None and previous[0] != source:
+                self.exact.pop((key[0], key[1], previous[0]), None)
+            self.exact[(key[0], key[1], source)] = target
+            self.normalized[key] = (source, target)
+
+    def add_term(self, source_language, term, translations=None):
+        """新增術語；translations 為 {目標語言: 譯名}，省略時對所有語言保持原文"""
+        with self.lock:
+            translations = self._write_term(source_language, term, translations)
+            self._apply_terms({source_language: {term: translations}})
+
+    def _write_term(self, source_language, term, translations):
+        """寫入資料庫，回傳實際寫入的譯名；術語表由 _apply_terms 更新"""
+        if not term.strip():
+            raise ValueError("term must not be empty")
+        translations = translations or {ANY_LANGUAGE: term}
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO terms (source_language, term, target_language, translation) "
+            "VALUES (?, ?, ?, ?)",
+            [(source_language, term, language, value) for language, value in translations.items()]
+        )
+        return translations
+
+    def _apply_terms(self, updates):
+        """將已寫入資料庫的術語 {源語言: {術語: {目標語言: 譯名}}} 加入術語表並重建比對式"""
+        for source_language, entries in updates.items():
+            terms = dict(self.terms.get(source_language, {}))
+            for term, translations in entries.items():
+                terms[term] = dict(terms.get(term, {}), **translations)
+            # 以新字典整個替換，事件循環上的查詢不需加鎖
+            self.terms = dict(self.terms, **{source_language: terms})
+            self.patterns = dict(self.patterns, **{source_language: _term_pattern(terms)})
+
+    def import_lines(self, lines):
+        """
+        匯入 JSONL（每行一筆），回傳 {"segments": 筆數, "terms": 筆數, "errors": 筆數}
+            {"type": "segment", "source_language": "en-US", "target_language": "zh-TW", "source": "...", "target": "..."}
+            {"type": "term", "source_language": "en-US", "term": "LiveScribe", "translations": {"zh-TW": "LiveScribe"}}
+        """
+        counts = {"segments": 0, "terms": 0, "errors": 0}
+        # 整批匯入使用單一交易；記憶體索引與術語表的更新先收集起來，提交成功後才套用，
+        # 回滾時不會留下資料庫中沒有的項目
+        segments = {}
+        terms = {}
+        with self.lock:
+            self.conn.execute("BEGIN")
+            try:
+                for line in lines:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        entry = json.loads(line)
+                        if entry.get("type", "segment") == "segment":
+                            source, target = entry["source"], entry["target"]
+                            key = self._write_segment(entry["source_language"], entry["target_language"],
+                                                      source, target)
+                            segments[key] = (source, target)
+                            counts["segments"] += 1
+                        elif entry["type"] == "term":
+                            language, term = entry["source_language"], entry["term"]
+                            translations = self._write_term(language, term, entry.get("translations"))
+                            pending = terms.setdefault(language, {})
+                            pending[term] = dict(pending.get(term, {}), **translations)
+                            counts["terms"] += 1
+                        else:
+                            raise ValueError(f"unknown entry type {entry['type']!r}")
+                    except (ValueError, KeyError, TypeError, AttributeError) as e:
+                        counts["errors"] += 1
+                        logger.warning(f"Translation memory import skipped line: {e}")
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+            self._apply_segments(segments)
+            self._apply_terms(terms)
+        return counts
+
+    def import_file(self, path):
+        with open(path, encoding='utf-8') as f:
+            counts = self.import_lines(f)
+        logger.info(f"Translation memory imported {path}: {counts}")
+        return counts
+
+    def export_lines(self):
+        """以匯入格式逐行輸出所有句段與術語"""
+        with self.lock:
+            segments = self.conn.execute(
+                "SELECT source_language, target_language, source, target FROM segments "
+                "ORDER BY source_language, target_language, source"
+            ).fetchall()
+        for source_language, target_language, source, target in segments:
+            yield json.dumps({
+                "type": "segment",
+                "source_language": source_language,
+                "target_language": target_language,
+                "source": source,
+                "target": target,
+            }, ensure_ascii=False) + "\n"
+        for source_language, terms in sorted(self.terms.items()):
+            for term, translations in sorted(terms.items()):
+                entry = {"type": "term", "source_language": source_language, "term": term}
+                if translations != {ANY_LANGUAGE: term}:
+                    entry["translations"] = translations
+                yield json.dumps(entry, ensure_ascii=False) + "\n"
+
+    def get_stats(self):
+        lookups = self.stats["exact_hits"] + self.stats["normalized_hits"] + self.stats["misses"]
+        hits = lookups - self.stats["misses"]
+        return dict(
+            self.stats,
+            segments=len(self.normalized),
+            terms=sum(map(len, self.terms.values())),
+            hit_rate=round(hits / lookups, 3) if lookups else None,
+        )
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
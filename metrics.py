@@ -0,0 +1,228 @@
+from bisect import bisect_left
+
+# 延遲直方圖的預設區間（秒），涵蓋快取查詢的微秒級到翻譯服務的秒級
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def percentile(samples, q):
+    """樣本的第 q 百分位數（0 到 1 之間，取最接近的排名），沒有樣本時回傳 None"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _HistogramChild:
+    """單一標籤組合的直方圖；觀測不加鎖，多個執行緒同時觀測時計數可能有極少量誤差"""
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.children = {}
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values):
+        """取得標籤組合對應的子指標；熱路徑上應預先取得並重複使用"""
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        for values, child in list(self.children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class Histogram(_Metric):
+    """
+    Prometheus 直方圖
+    觀測只需一次二分搜尋與兩次加法，累計值在輸出時才計算，沒有抓取時幾乎沒有額外負擔
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), list(child.counts)):
+            cumulative += count
+            labels = _format_labels(self.labelnames, values, ("le", _format_value(float(bound))))
+            yield f"{self.name}_bucket{labels} {cumulative}"
+        labels = _format_labels(self.labelnames, values)
+        yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+        yield f"{self.name}_count{labels} {child.count}"
+
+
+class Counter(_Metric):
+    """Prometheus 計數器"""
+    type = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Registry:
+    """
+    指標登錄表
+    收集器（collector）在輸出時才被呼叫，用於把既有的 stats 字典轉為 gauge，熱路徑上沒有額外負擔
+    收集器回傳 [(名稱, 說明, [(標籤字典, 數值)])]
+    """
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+
+    def register_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        """以 Prometheus 文字格式輸出所有指標"""
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            for name, documentation, samples in collector():
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    if value is None:
+                        continue
+                    label_text = _format_labels(tuple(labels), tuple(labels.values()))
+                    lines.append(f"{name}{label_text} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Prometheus 文字格式的 Content-Type
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = Registry()
+
+# 各處理階段的耗時
+STAGE_SECONDS = Histogram(
+    "livescribe_stage_seconds",
+    "Time spent in each caption pipeline stage",
+    ("stage",)
+)
+# SDK 回呼到事件排入管線
+ENQUEUE_SECONDS = STAGE_SECONDS.labels("enqueue")
+# 事件排入管線到開始處理
+QUEUE_WAIT_SECONDS = STAGE_SECONDS.labels("queue_wait")
+CACHE_LOOKUP_SECONDS = STAGE_SECONDS.labels("cache_lookup")
+MEMORY_LOOKUP_SECONDS = STAGE_SECONDS.labels("memory_lookup")
+FORMAT_SECONDS = STAGE_SECONDS.labels("format")
+EMIT_SECONDS = STAGE_SECONDS.labels("emit")
+FILE_WRITE_SECONDS = STAGE_SECONDS.labels("file_write")
+
+# 翻譯器批次呼叫的延遲，依翻譯器與翻譯方向
+BACKEND_SECONDS = Histogram(
+    "livescribe_backend_request_seconds",
+    "Latency of batched translation backend calls",
+    ("backend", "direction")
+)
+
+# 端到端字幕延遲：識別器回呼到字幕送出
+CAPTION_LATENCY_SECONDS = Histogram(
+    "livescribe_caption_latency_seconds",
+    "Time from recognizer callback to caption emit"
+)
+
+CACHE_LOOKUPS = Counter(
+    "livescribe_cache_lookups_total",
+    "Translation cache lookups by result",
+    ("result",)
+)
+CACHE_HITS = CACHE_LOOKUPS.labels("hit")
+CACHE_MISSES = CACHE_LOOKUPS.labels("miss")
+
+FALLBACKS = Counter(
+    "livescribe_fallbacks_total",
+    "Translations served by a backend other than the first in the route",
+    ("backend",)
+)
+
+BACKEND_ERRORS = Counter(
+    "livescribe_backend_errors_total",
+    "Failed batched translation backend calls",
+    ("backend",)
+)
+
+PARTIAL_DECISIONS = Counter(
+    "livescribe_partial_decisions_total",
+    "Partial translation policy decisions",
+    ("decision",)
+)
+
+ERRORS = Counter(
+    "livescribe_errors_total",
+    "Errors by source",
+    ("source",)
+)
+
@@ -0,0 +1,166 @@
+import time
+from collections import deque
+from functools import partial
+from threading import Lock
+
+from captions import merge_deltas
+
+
+def coalesce(event, older, newer):
+    """
+    合併同一客戶端佇列中同一事件的兩則訊息，無法合併時回傳 None
+    update_text 每則都是完整字幕，直接取代；caption_delta 以 merge_deltas 合併，已完成的段落不會遺失
+    """
+    if event == "caption_delta":
+        return merge_deltas(older, newer)
+    if event == "update_text":
+        return newer
+    return None
+
+
+class _Client:
+    __slots__ = ("room", "queue", "unacked", "deadline")
+
+    def __init__(self, room):
+        self.room = room
+        self.queue = deque()  # 尚未送出的 (事件, 資料)
+        self.unacked = 0      # 上次確認後送出的訊息數
+        self.deadline = None  # 等待 ack 時的逾時時間，None 表示未等待
+
+
+class ClientOutbox:
+    """
+    每位客戶端的傳送佇列與 ack 流量控制（credit）
+    每位客戶端確認前最多收到 window 則訊息，第 window 則要求 ack，確認後（訊息依序送達，代表之前的都已處理）額度重置；
+    等待 ack 的客戶端，新的訊息留在佇列，並與佇列尾端同一事件的訊息合併，慢速客戶端只會收到較新的字幕，
+    不會累積過時的部分結果，也不會拖慢其他客戶端；佇列超過 depth 則時丟棄最舊的訊息（客戶端依序號要求重新同步）；
+    ack 超過 ack_timeout 秒未到時視為已確認
+    不需要 ack 的訊息以同一次 emit 送給房間內所有可直接接收的客戶端，封包只編碼一次
+
+    emitter 為底層傳送器（Flask-SocketIO 或 AsyncEmitter），需支援 emit(event, data, to=sid 或 [sid, ...], callback=...)；
+    未使用佇列的客戶端（舊版頁面）仍加入 Socket.IO 房間，由房間廣播接收
+    """
+    def __init__(self, emitter, window=4, depth=8, ack_timeout=10.0):
+        self.emitter = emitter
+        self.window = max(1, window)
+        self.depth = depth
+        self.ack_timeout = ack_timeout
+        self.lock = Lock()
+        self.clients = {}  # sid -> _Client
+        self.rooms = {}    # 房間 -> {sid}
+        self.stats = {"sent": 0, "acks": 0, "coalesced": 0, "dropped": 0, "ack_timeouts": 0, "max_depth": 0}
+
+    def emit(self, event, data=None, to=None):
+        """送往房間：房間廣播給未使用佇列的客戶端，佇列為空且有額度的客戶端一起送出，其餘排入各自的佇列"""
+        self.emitter.emit(event, data, to=to)
+        with self.lock:
+            ready = []
+            for sid in self.rooms.get(to, ()):
+                client = self.clients[sid]
+                if client.queue or self._waiting(client):
+                    self._push(sid, client, event, data)
+                elif client.unacked + 1 < self.window:
+                    client.unacked += 1
+                    ready.append(sid)
+                else:
+                    self._send(sid, client, event, data)
+            if ready:
+                self.emitter.emit(event, data, to=ready)
+                self.stats["sent"] += len(ready)
+
+    def join(self, sid, room, event=None, data=None):
+        """客戶端改由佇列接收房間的訊息；event 與 data 為第一則訊息（加入時的字幕快照）"""
+        with self.lock:
+            self._remove(sid)
+            client = self.clients[sid] = _Client(room)
+            self.rooms.setdefault(room, set()).add(sid)
+            if event is not None:
+                self._push(sid, client, event, data)
+
+    def send(self, sid, event, data=None):
+        """經由客戶端的佇列送出單則訊息（例如重新同步的快照），回傳客戶端是否使用佇列"""
+        with self.lock:
+            client = self.clients.get(sid)
+            if client is None:
+                return False
+            self._push(sid, client, event, data)
+            return True
+
+    def leave(self, sid):
+        with self.lock:
+            self._remove(sid)
+
+    def _remove(self, sid):
+        client = self.clients.pop(sid, None)
+        if client is not None:
+            members = self.rooms.get(client.room)
+            members.discard(sid)
+            if not members:
+                del self.rooms[client.room]
+
+    def _waiting(self, client):
+        """是否正在等待 ack；逾時則視為已確認"""
+        if client.deadline is None:
+            return False
+        if client.deadline > time.monotonic():
+            return True
+        client.deadline = None
+        client.unacked = 0
+        self.stats["ack_timeouts"] += 1
+        return False
+
+    def _push(self, sid, client, event, data):
+        queue = client.queue
+        if queue and queue[-1][0] == event:
+            merged = coalesce(event, queue[-1][1], data)
+            if merged is not None:
+                queue[-1] = (event, merged)
+                self.stats["coalesced"] += 1
+                self._pump(sid, client)
+                return
+        if len(queue) >= self.depth:
+            queue.popleft()
+            self.stats["dropped"] += 1
+        queue.append((event, data))
+        if len(queue) > self.stats["max_depth"]:
+            self.stats["max_depth"] = len(queue)
+        self._pump(sid, client)
+
+    def _pump(self, sid, client):
+        """在額度內依序送出佇列中的訊息（持有鎖時呼叫，底層 emit 只排入傳送佇列，不會阻塞）"""
+        while client.queue and not self._waiting(client):
+            event, data = client.queue.popleft()
+            if client.unacked + 1 < self.window:
+                client.unacked += 1
+                self.emitter.emit(event, data, to=sid)
+                self.stats["sent"] += 1
+            else:
+                self._send(sid, client, event, data)
+
+    def _send(self, sid, client, event, data):
+        """送出用完額度的訊息並要求 ack"""
+        client.unacked += 1
+        client.deadline = time.monotonic() + self.ack_timeout
+        self.emitter.emit(event, data, to=sid, callback=partial(self._ack, sid, client))
+        self.stats["sent"] += 1
+
+    def _ack(self, sid, client, *args):
+        with self.lock:
+            # 重新加入或已斷線的客戶端忽略舊的 ack
+            if self.clients.get(sid) is not client or client.deadline is None:
+                return
+            client.deadline = None
+            client.unacked = 0
+            self.stats["acks"] += 1
+            self._pump(sid, client)
+
+    def snapshot_stats(self):
+        """目前的客戶端數、排隊與等待 ack 的客戶端數，以及累計計數"""
+        with self.lock:
+            clients = list(self.clients.values())
+            return dict(
+                self.stats,
+                clients=len(clients),
+                queued=sum(len(client.queue) for client in clients),
+                waiting=sum(1 for client in clients if client.deadline is not None),
+            )
@@ -0,0 +1,100 @@
+import asyncio
+import time
+from collections import deque
+
+from logs import logger
+from metrics import ENQUEUE_SECONDS, QUEUE_WAIT_SECONDS, ERRORS
+
+# 事件種類
+PARTIAL = "recognizing"
+FINAL = "recognized"
+
+
+class RecognitionPipeline:
+    """
+    識別事件管線
+    識別器回呼執行緒只負責排入事件，由事件循環上的消費者依序翻譯與傳送
+    部分結果採最新優先：被取代的舊部分結果會被丟棄或取消，最終結果永不丟棄
+    """
+    def __init__(self, loop, handlers):
+        self.loop = loop
+        self.handlers = handlers  # {事件種類: 協程函數}
+        self.queue = deque()
+        self.wakeup = asyncio.Event()
+        self.closed = False
+        self.current_task = None
+        self.current_kind = None
+        self.stats = {
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "dropped_partials": 0,
+            "cancelled_partials": 0,
+            "processed_partials": 0,
+            "processed_finals": 0,
+        }
+
+    def submit(self, kind, payload):
+        """從識別器回呼執行緒排入 RecognitionEvent（執行緒安全）"""
+        self.loop.call_soon_threadsafe(self._enqueue, kind, payload)
+
+    def _enqueue(self, kind, payload):
+        """在事件循環上排入事件，並丟棄被取代的部分結果"""
+        if self.closed:
+            return
+        now = time.monotonic()
+        ENQUEUE_SECONDS.observe(now - payload.received)
+        # 佇列尾端的部分結果一定已被新事件取代
+        if self.queue and self.queue[-1][0] == PARTIAL:
+            self.queue.pop()
+            self.stats["dropped_partials"] += 1
+        # 最終結果到達時，正在翻譯的部分結果已無意義
+        if kind == FINAL and self.current_kind == PARTIAL and self.current_task:
+            self.current_task.cancel()
+        self.queue.append((kind, payload, now))
+        self._update_depth()
+        self.wakeup.set()
+
+    def _update_depth(self):
+        depth = len(self.queue)
+        self.stats["queue_depth"] = depth
+        if depth > self.stats["max_queue_depth"]:
+            self.stats["max_queue_depth"] = depth
+
+    async def run(self):
+        """消費者主循環，關閉後仍會處理完剩餘的最終結果"""
+        while True:
+            if not self.queue:
+                if self.closed:
+                    break
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            kind, payload, enqueued = self.queue.popleft()
+            self._update_depth()
+            QUEUE_WAIT_SECONDS.observe(time.monotonic() - enqueued)
+            if self.closed and kind == PARTIAL:
+                self.stats["dropped_partials"] += 1
+                continue
+
+            self.current_kind = kind
+            self.current_task = self.loop.create_task(self.handlers[kind](payload))
+            try:
+                await asyncio.wait({self.current_task})
+                if self.current_task.cancelled():
+                    self.stats["cancelled_partials"] += 1
+                elif self.current_task.exception():
+                    ERRORS.labels("pipeline").inc()
+                    logger.error(f"Pipeline {kind} handler error: {self.current_task.exception()}")
+                elif kind == PARTIAL:
+                    self.stats["processed_partials"] += 1
+                else:
+                    self.stats["processed_finals"] += 1
+            finally:
+                self.current_task = None
+                self.current_kind = None
+
+    def close(self):
+        """停止接收新事件，並喚醒消費者處理剩餘的最終結果"""
+        self.closed = True
+        self.wakeup.set()
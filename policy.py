@@ -0,0 +1,113 @@
+import re
+import time
+
+from logs import logger
+import metrics
+
+# 決策結果
+TRANSLATE = "translate"
+TOO_SOON = "too_soon"
+FEW_WORDS = "few_words"
+UNSTABLE = "unstable"
+BUDGET = "budget"
+
+# 中日文沒有空白分詞，每個字視為一個詞
+CJK_CHARACTERS = "\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+WORD_PATTERN = re.compile(rf"[{CJK_CHARACTERS}]|[^\s{CJK_CHARACTERS}]+")
+
+
+def count_words(text):
+    return len(WORD_PATTERN.findall(text))
+
+
+class PartialPolicy:
+    """
+    部分結果翻譯策略（每場次一個，只在事件循環上使用）
+    依新增詞數、距上次翻譯的時間與穩定度決定部分結果是否值得翻譯，超過 max_wait 未翻譯時只看最短間隔；
+    並以令牌桶限制每秒翻譯請求數，令牌用盡時降級為只翻譯最終結果，回復到突發上限的 recover 比例後才恢復
+    """
+    def __init__(self, min_new_words=2, min_interval=0.25, max_wait=1.0, min_stability=0.5,
+                 budget_per_second=4.0, budget_burst=8.0, recover=0.5, name="default"):
+        self.min_new_words = min_new_words
+        self.min_interval = min_interval
+        self.max_wait = max_wait
+        self.min_stability = min_stability
+        self.budget_per_second = budget_per_second
+        self.budget_burst = budget_burst
+        self.recover = recover
+        self.name = name
+        self.tokens = budget_burst
+        self.refilled = time.monotonic()
+        self.degraded = False
+        self.last_translated = 0.0
+        self.last_words = 0
+        self.stats = {TRANSLATE: 0, TOO_SOON: 0, FEW_WORDS: 0, UNSTABLE: 0, BUDGET: 0,
+                      "finals": 0, "degradations": 0}
+
+    def settings(self):
+        """目前的門檻設定，供指標輸出"""
+        return {
+            "min_new_words": self.min_new_words,
+            "min_interval_seconds": self.min_interval,
+            "max_wait_seconds": self.max_wait,
+            "min_stability": self.min_stability,
+            "budget_per_second": self.budget_per_second,
+            "budget_burst": self.budget_burst,
+        }
+
+    def _refill(self, now):
+        if self.budget_per_second:
+            self.tokens = min(self.budget_burst, self.tokens + max(0.0, now - self.refilled) * self.budget_per_second)
+        self.refilled = now
+        if self.degraded and self.tokens >= self.budget_burst * self.recover:
+            self.degraded = False
+            logger.info(f"Partial translation resumed for session {self.name}")
+
+    def _charge(self, cost):
+        if not self.budget_per_second:
+            return
+        self.tokens = max(0.0, self.tokens - cost)
+        if self.tokens < 1 and not self.degraded:
+            self.degraded = True
+            self.stats["degradations"] += 1
+            logger.warning(f"Partial translation budget exhausted for session {self.name}, translating finals only")
+
+    def decide(self, text, stability, cost=1, now=None):
+        """
+        判斷部分結果是否翻譯，回傳決策結果；cost 為預估的請求數（語言數），只用於判斷預算是否足夠，
+        實際送往翻譯器的請求數在翻譯後以 charge 計費
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        words = count_words(text)
+        elapsed = now - self.last_translated
+        if self.budget_per_second and (self.degraded or self.tokens < min(cost, self.budget_burst)):
+            decision = BUDGET
+        elif elapsed < self.min_interval:
+            decision = TOO_SOON
+        elif elapsed < self.max_wait and words - self.last_words < self.min_new_words:
+            decision = FEW_WORDS
+        elif elapsed < self.max_wait and stability is not None and stability < self.min_stability:
+            decision = UNSTABLE
+        else:
+            decision = TRANSLATE
+            self.last_translated = now
+            self.last_words = words
+        self.stats[decision] += 1
+        metrics.PARTIAL_DECISIONS.labels(decision).inc()
+        return decision
+
+    def charge(self, cost, now=None):
+        """計入實際送往翻譯器的請求數（快取命中或沿用部分結果的譯文不計費）"""
+        if not cost:
+            return
+        self._refill(time.monotonic() if now is None else now)
+        self._charge(cost)
+
+    def final(self):
+        """最終結果一律翻譯，請求數由 charge 計入預算；下一句重新計算新增詞數"""
+        self.last_words = 0
+        self.stats["finals"] += 1
+
+    def snapshot(self):
+        return dict(self.stats, tokens=round(self.tokens, 2), degraded=int(self.degraded))
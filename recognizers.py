@@ -0,0 +1,266 @@
+import json
+import os
+import time
+from threading import Lock
+
+from audio import AudioStreamPump
+from logs import logger
+from pipeline import PARTIAL, FINAL
+import metrics
+
+
+class RecognitionEvent:
+    """
+    識別事件，識別器回呼執行緒建立後直接作為管線的事件內容
+    offset 與 duration 為 100 奈秒單位；stability 為 0～1 的穩定度，最終結果為 1
+    """
+    __slots__ = ("kind", "text", "offset", "duration", "language", "stability", "received")
+
+    def __init__(self, kind, text, offset=0, duration=0, language=None, stability=1.0, received=None):
+        self.kind = kind
+        self.text = text
+        self.offset = offset
+        self.duration = duration
+        self.language = language
+        self.stability = stability
+        self.received = time.monotonic() if received is None else received
+
+    def to_dict(self):
+        """錄製用的字典（不含只在本行程有意義的 received）"""
+        return {
+            "type": self.kind,
+            "text": self.text,
+            "offset": self.offset,
+            "duration": self.duration,
+            "language": self.language,
+            "stability": self.stability,
+        }
+
+
+def prefix_stability(previous, text):
+    """
+    部分結果的穩定度：與前一次部分結果的共同前綴佔目前文字的比例
+    識別器只在尾端追加或修改時接近 1，整句改寫時接近 0
+    """
+    if not text:
+        return 1.0
+    return len(os.path.commonprefix((previous, text))) / len(text)
+
+
+class Recognizer:
+    """
+    識別器介面
+    start(on_event, on_stopped) 後，識別結果以 RecognitionEvent 在識別器的執行緒上回呼 on_event，
+    結束時以原因回呼 on_stopped（只呼叫一次）；stop() 可在任何執行緒呼叫
+    """
+    name = None
+
+    def __init__(self, languages):
+        self.languages = tuple(languages)
+        self.on_event = None
+        self.on_stopped = None
+        self.last_partial = ""
+        self.finished = False
+        self.lock = Lock()
+
+    def add_phrases(self, phrases):
+        """加入提示詞彙，不支援的識別器忽略"""
+
+    def warm_up(self):
+        """開始識別前預先建立連線或載入資源，不需要的識別器忽略"""
+
+    def start(self, on_event, on_stopped):
+        self.on_event = on_event
+        self.on_stopped = on_stopped
+        self._start()
+
+    def _start(self):
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+    def _language(self, language):
+        """語言不在語言對中時（例如 "Unknown" 或未提供）視為主要語言"""
+        return language if language in self.languages else self.languages[0]
+
+    def _emit(self, kind, text, offset, duration, language):
+        if kind == PARTIAL:
+            stability = prefix_stability(self.last_partial, text)
+            self.last_partial = text
+        else:
+            stability = 1.0
+            self.last_partial = ""
+        self.on_event(RecognitionEvent(kind, text, offset, duration, self._language(language), stability))
+
+    def _finish(self, reason):
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+        logger.info(f"Recognition stopped: {reason}")
+        if self.on_stopped:
+            self.on_stopped(reason)
+
+
+def load_speech_sdk():
+    """延遲匯入 Azure Speech SDK，只使用 Vosk 識別器時不需載入"""
+    import azure.cognitiveservices.speech as speechsdk
+    return speechsdk
+
+
+class AzureRecognizer(Recognizer):
+    """
+    Azure Speech 連續識別
+    語言由結果屬性中的自動偵測結果取得，不需逐筆解析 JSON
+    """
+    name = "Azure"
+
+    def __init__(self, speech_config, audio_config, languages):
+        super().__init__(languages)
+        speechsdk = self.sdk = load_speech_sdk()
+        self.connection = None
+        language_config = speechsdk.languageconfig.AutoDetectSourceLanguageConfig(
+            languages=list(self.languages)
+        )
+        self.recognizer = speechsdk.SpeechRecognizer(
+            speech_config=speech_config,
+            audio_config=audio_config,
+            auto_detect_source_language_config=language_config
+        )
+        self.recognizer.session_started.connect(lambda evt: logger.info(f'Session started: {evt}'))
+        self.recognizer.session_stopped.connect(lambda evt: self._finish(evt))
+        self.recognizer.canceled.connect(lambda evt: self._finish(evt))
+        self.recognizer.recognizing.connect(
+            lambda evt: self._handle_result(evt, PARTIAL, speechsdk.ResultReason.RecognizingSpeech)
+        )
+        self.recognizer.recognized.connect(
+            lambda evt: self._handle_result(evt, FINAL, speechsdk.ResultReason.RecognizedSpeech)
+        )
+
+    def add_phrases(self, phrases):
+        phrase_list = self.sdk.PhraseListGrammar.from_recognizer(self.recognizer)
+        for phrase in phrases:
+            phrase_list.addPhrase(phrase)
+
+    def warm_up(self):
+        # 預先建立服務連線，開始識別時不必再等待 TLS 與 WebSocket 握手
+        self.connection = self.sdk.Connection.from_recognizer(self.recognizer)
+        self.connection.open(True)
+
+    def _start(self):
+        self.recognizer.start_continuous_recognition_async()
+
+    def stop(self):
+        self.recognizer.stop_continuous_recognition_async()
+
+    def _handle_result(self, evt, kind, reason):
+        try:
+            result = evt.result
+            if result.reason != reason:
+                return
+            language = result.properties.get(
+                self.sdk.PropertyId.SpeechServiceConnection_AutoDetectSourceLanguageResult
+            )
+            self._emit(kind, result.text, result.offset, result.duration, language)
+        except Exception as e:
+            metrics.ERRORS.labels("recognizer").inc()
+            logger.error(f"Azure recognizer {kind} error: {e}")
+
+
+# 已載入的 Vosk 模型，同一模型由所有場次共用（載入需數秒且佔用大量記憶體）
+_vosk_models = {}
+_vosk_models_lock = Lock()
+
+
+def _load_vosk_model(path):
+    try:
+        import vosk
+    except ImportError as e:
+        raise RuntimeError('RECOGNIZER = "Vosk" requires the vosk package: pip install vosk') from e
+    with _vosk_models_lock:
+        model = _vosk_models.get(path)
+        if model is None:
+            vosk.SetLogLevel(-1)
+            start = time.perf_counter()
+            model = _vosk_models[path] = vosk.Model(path)
+            logger.info(f"Loaded Vosk model {path} in {time.perf_counter() - start:.1f}s")
+        return vosk, model
+
+
+class VoskRecognizer(Recognizer):
+    """
+    本機 CPU 串流識別（Vosk / Kaldi），不需網路往返
+    音訊從環形緩衝區由 AudioStreamPump 依實際時間餵入（本類別即為推送目標，提供 write/close），
+    模型只支援單一語言，識別結果一律標記為語言對的主要語言
+    """
+    name = "Vosk"
+
+    def __init__(self, model_path, ring, audio_format, languages, speed=1.0):
+        super().__init__(languages)
+        rate, bits, channels = audio_format
+        if bits != 16 or channels != 1:
+            raise ValueError(f"Vosk requires 16-bit mono PCM, got {bits}-bit {channels}-channel audio")
+        vosk, model = _load_vosk_model(model_path)
+        self.recognizer = vosk.KaldiRecognizer(model, rate)
+        self.recognizer.SetWords(True)
+        self.ring = ring
+        self.bytes_per_second = rate * 2
+        self.speed = speed
+        self.language = self.languages[0]
+        self.stopping = False
+        # 已餵入的位元組數與目前語句的起點，換算為 100 奈秒單位的 offset/duration
+        self.position = 0
+        self.utterance_start = 0
+
+    def _start(self):
+        AudioStreamPump(self.ring, self, self.bytes_per_second, speed=self.speed).start()
+
+    def stop(self):
+        """放棄緩衝區中尚未識別的音訊，推送執行緒隨即結束"""
+        self.stopping = True
+        self.ring.close()
+
+    def _ticks(self, position):
+        return position * 10**7 // self.bytes_per_second
+
+    def write(self, data):
+        """推送執行緒餵入一段 PCM"""
+        if self.stopping:
+            return
+        self.position += len(data)
+        if self.recognizer.AcceptWaveform(data):
+            self._emit_final(self.recognizer.Result())
+            return
+        # Vosk 只提供 JSON 字串形式的部分結果
+        text = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        if text and text != self.last_partial:
+            offset = self._ticks(self.utterance_start)
+            self._emit(PARTIAL, text, offset, self._ticks(self.position) - offset, self.language)
+
+    def close(self):
+        """音訊結束：送出最後一句後結束場次"""
+        try:
+            if not self.stopping:
+                self._emit_final(self.recognizer.FinalResult())
+        except Exception as e:
+            metrics.ERRORS.labels("recognizer").inc()
+            logger.error(f"Vosk recognizer final result error: {e}")
+        finally:
+            self._finish("stopped" if self.stopping else "end of audio")
+
+    def _emit_final(self, result_json):
+        result = json.loads(result_json)
+        text = result.get("text", "")
+        words = result.get("result")
+        if words:
+            offset = int(words[0]["start"] * 10**7)
+            duration = int(words[-1]["end"] * 10**7) - offset
+        else:
+            offset = self._ticks(self.utterance_start)
+            duration = self._ticks(self.position) - offset
+        self.utterance_start = self.position
+        if text:
+            self._emit(FINAL, text, offset, duration, self.language)
+        else:
+            self.last_partial = ""
@@ -0,0 +1,326 @@
+"""
+離線重播與端到端延遲基準
+將錄製的 recognizing/recognized 事件（JSONL，見 RECORD_EVENTS）依時間重播，
+經由 ContinuousTranslation 與可設定延遲、錯誤率的假翻譯器處理，不需要麥克風、Azure Speech 或網路
+
+用法：
+    python replay.py data/replay_sample.jsonl --speed 10
+    python replay.py events.jsonl --speed 0 --backend Google=0.08:0.5:0.02 --json
+    python replay.py events.jsonl --max-p95-ms 250   # p95 超過門檻時以非零狀態結束，供 CI 使用
+    python replay.py data/replay_sample.jsonl --memory data/translation_memory_sample.jsonl
+
+事件格式（每行一筆）：
+    {"type": "recognizing" | "recognized", "text": "...", "offset": 100 奈秒單位,
+     "duration": 100 奈秒單位, "language": "en-US"}
+    （舊格式以 "json": "{\"PrimaryLanguage\": {\"Language\": \"en-US\"}}" 提供語言）
+事件在 (offset + duration) 時到達，也可用 "t"（秒）指定到達時間
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+from threading import Event, Thread
+
+import app
+from memory import TranslationMemory
+from metrics import percentile
+from pipeline import PARTIAL, FINAL
+from policy import TRANSLATE
+from recognizers import Recognizer
+from writer import TranscriptWriter
+from segments import SegmentStore
+from backends import TranslatorBackends
+
+# 假翻譯器的預設延遲分佈：(中位數秒數, 對數常態 sigma, 錯誤率)
+DEFAULT_BACKENDS = {
+    "Google": (0.08, 0.4, 0.0),
+    "Azure": (0.10, 0.4, 0.0),
+    "DeepL": (0.15, 0.4, 0.0),
+}
+
+
+def load_events(path):
+    """讀取錄製的事件，依到達時間排序"""
+    events = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            event = json.loads(line)
+            if "language" not in event:
+                # 舊格式的錄製檔只有 SDK 的 JSON 結果，載入時解析一次
+                event["language"] = json.loads(event.get("json") or "{}").get("PrimaryLanguage", {}).get("Language")
+            if "t" not in event:
+                event["t"] = (event.get("offset", 0) + event.get("duration", 0)) / 10**7
+            events.append(event)
+    events.sort(key=lambda event: event["t"])
+    return events
+
+
+class FakeBackend:
+    """
+    假翻譯器：以對數常態分佈模擬延遲，依錯誤率回傳空結果（與真實翻譯器失敗時相同）；
+    cold_start 為第一次請求額外的連線建立時間（秒）
+    """
+    def __init__(self, name, median=0.1, sigma=0.4, error_rate=0.0, seed=0, cold_start=0.0):
+        self.name = name
+        self.median = median
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.cold_start = cold_start
+        self.random = random.Random(f"{name}:{seed}")
+        self.stats = {"calls": 0, "items": 0, "errors": 0}
+        self.__name__ = f"fake_{name}"
+
+    async def __call__(self, texts, source_lang, target_lang):
+        self.stats["calls"] += 1
+        self.stats["items"] += len(texts)
+        latency = self.median * math.exp(self.random.gauss(0.0, self.sigma)) if self.sigma else self.median
+        if self.stats["calls"] == 1:
+            latency += self.cold_start
+        failed = self.random.random() < self.error_rate
+        await asyncio.sleep(latency)
+        if failed:
+            self.stats["errors"] += 1
+            return []
+        if isinstance(target_lang, tuple):
+            # 多目標語言（Azure）：每段文字回傳依序對應的譯文元組
+            return [tuple(f"[{target}] {text}" for target in target_lang) for text in texts]
+        return [f"[{target_lang}] {text}" for text in texts]
+
+
+class ReplayTranslationManager(app.TranslationManager):
+    """以假翻譯器取代真實客戶端，並統計快取命中"""
+    def __init__(self, primary, backends, **kwargs):
+        self.fake_backends = backends
+        self.replay_stats = {"requests": 0, "cache_misses": 0}
+        super().__init__(primary, **kwargs)
+
+    def _setup_translation_service(self):
+        self.translators = dict(self.fake_backends)
+        self.backends = TranslatorBackends(
+            self.router.backends,
+            factories={name: (lambda backend=backend: backend) for name, backend in self.fake_backends.items()}
+        )
+
+    async def translate(self, text, source_language, target_language, partial=False):
+        if text and text.strip():
+            self.replay_stats["requests"] += 1
+        return await super().translate(text, source_language, target_language, partial)
+
+    async def _translate_with_hedge(self, text, languages, route):
+        # 只有快取未命中時才會送往翻譯器
+        self.replay_stats["cache_misses"] += 1
+        return await super()._translate_with_hedge(text, languages, route)
+
+
+class ReplayRecognizer(Recognizer):
+    """
+    重播識別器：在背景執行緒依到達時間送出錄製的事件，行為與識別器的回呼執行緒相同
+    speed 為加速倍率，0 表示不等待
+    """
+    name = "Replay"
+
+    def __init__(self, events, languages, speed=1.0):
+        super().__init__(languages)
+        self.events = events
+        self.speed = speed
+        self.stopped = Event()
+
+    def _start(self):
+        Thread(target=self._run, name="replay-recognizer", daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _run(self):
+        start = time.monotonic()
+        for event in self.events:
+            if self.speed:
+                delay = start + event["t"] / self.speed - time.monotonic()
+                if delay > 0 and self.stopped.wait(delay):
+                    break
+            if self.stopped.is_set():
+                break
+            self._emit(event["type"], event["text"], event.get("offset", 0), event.get("duration", 0),
+                       event["language"])
+        self._finish("replay finished")
+
+
+class ReplayTranslation(app.ContinuousTranslation):
+    """以重播識別器取代麥克風，並記錄各事件從回呼到處理完成的延遲"""
+    def __init__(self, socketio, translation_manager, events, speed=1.0,
+                 languages=("en-US", "zh-TW"), output_dir=None, warm_up=False):
+        super().__init__(socketio, translation_manager, session_id="replay", languages=languages)
+        # 預設不預熱，探測請求不計入翻譯器呼叫次數
+        self.warm_up = warm_up
+        self.events = events
+        self.speed = speed
+        self.latencies = {PARTIAL: [], FINAL: []}
+        # 逐字稿寫入暫存目錄，避免重播污染 logs/
+        output_dir = output_dir or tempfile.mkdtemp(prefix="replay_")
+        self.transcript_writer.close()
+        self.transcript_writer = TranscriptWriter({
+            kind: os.path.join(output_dir, os.path.basename(path))
+            for kind, path in self.file_paths.items()
+        }, sinks={"segments": SegmentStore()})
+
+    def _init_recognizer(self):
+        return ReplayRecognizer(self.events, self.languages, self.speed)
+
+    async def _process_recognizing(self, event):
+        translated = self.partial_policy.stats[TRANSLATE]
+        await super()._process_recognizing(event)
+        # 只統計經策略放行並送出的部分結果
+        if self.partial_policy.stats[TRANSLATE] > translated:
+            self.latencies[PARTIAL].append(time.monotonic() - event.received)
+
+    async def _process_recognized(self, event):
+        await super()._process_recognized(event)
+        self.latencies[FINAL].append(time.monotonic() - event.received)
+
+
+class RecordingSocketIO:
+    """記錄送出的訊息數量的 Socket.IO 替身"""
+    def __init__(self):
+        self.emits = 0
+
+    def emit(self, event, data=None, **kwargs):
+        self.emits += 1
+
+
+def run_replay(events, speed=1.0, backends=None, primary=app.TRANSLATOR,
+               languages=("en-US", "zh-TW"), seed=0, memory_path=None):
+    """重播事件並回傳統計報告；memory_path 為翻譯記憶 JSONL，匯入暫存的記憶體資料庫"""
+    backends = backends or DEFAULT_BACKENDS
+    fakes = {
+        name: FakeBackend(name, *backends.get(name, DEFAULT_BACKENDS[name]), seed=seed)
+        for name in DEFAULT_BACKENDS
+    }
+    socketio = RecordingSocketIO()
+
+    async def main():
+        memory = None
+        if memory_path:
+            memory = TranslationMemory()
+            memory.import_file(memory_path)
+        manager = ReplayTranslationManager(
+            primary,
+            fakes,
+            near_duplicate=app.CACHE_NEAR_DUPLICATE,
+            hedge_percentile=app.HEDGE_PERCENTILE,
+            hedge_budget=app.HEDGE_BUDGET,
+            batch_window=app.BATCH_WINDOW_MS / 1000,
+            batch_max_items=app.BATCH_MAX_ITEMS,
+            memory=memory
+        )
+        service = ReplayTranslation(socketio, manager, events, speed, languages)
+        start = time.monotonic()
+        await service.translation_continuous()
+        elapsed = time.monotonic() - start
+        manager.close()
+        return manager, service, elapsed
+
+    manager, service, elapsed = asyncio.run(main())
+
+    utterances = sum(1 for event in events if event["type"] == FINAL)
+    requests = manager.replay_stats["requests"]
+    misses = manager.replay_stats["cache_misses"]
+
+    def summarize(samples):
+        return {
+            "count": len(samples),
+            "p50_ms": _ms(percentile(samples, 0.50)),
+            "p95_ms": _ms(percentile(samples, 0.95)),
+            "p99_ms": _ms(percentile(samples, 0.99)),
+        }
+
+    return {
+        "events": len(events),
+        "utterances": utterances,
+        "elapsed_s": round(elapsed, 3),
+        "caption_latency": summarize(service.latencies[PARTIAL]),
+        "final_latency": summarize(service.latencies[FINAL]),
+        "translation_requests": requests,
+        "backend_calls": {name: dict(fake.stats) for name, fake in fakes.items()},
+        "backend_calls_per_utterance": round(
+            sum(fake.stats["calls"] for fake in fakes.values()) / utterances, 2) if utterances else None,
+        "cache_hit_rate": round(1 - misses / requests, 3) if requests else None,
+        "cache": manager.cache.get_stats(),
+        "emits": socketio.emits,
+        "emits_per_second": round(socketio.emits / elapsed, 2) if elapsed else None,
+        "pipeline": dict(service.pipeline.stats),
+        "hedge": dict(manager.hedge_stats),
+        "partial_policy": service.partial_policy.snapshot(),
+        "memory": manager.memory.get_stats() if manager.memory else None,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def _parse_backend(value):
+    """解析 NAME=中位數秒數:sigma:錯誤率"""
+    name, _, spec = value.partition("=")
+    if name not in DEFAULT_BACKENDS:
+        raise argparse.ArgumentTypeError(f"Unknown backend: {name}")
+    parts = [float(part) for part in spec.split(":")] if spec else []
+    defaults = DEFAULT_BACKENDS[name]
+    return name, tuple(parts + list(defaults[len(parts):]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded recognition events through the translation pipeline")
+    parser.add_argument("events", help="recorded events (JSONL)")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier, 0 = as fast as possible")
+    parser.add_argument("--backend", action="append", type=_parse_backend, default=[],
+                        help="fake backend NAME=median_s:sigma:error_rate, e.g. Google=0.08:0.4:0.01")
+    parser.add_argument("--primary", default=app.TRANSLATOR, choices=sorted(DEFAULT_BACKENDS))
+    parser.add_argument("--languages", default="en-US,zh-TW", help="language pair, e.g. en-US,zh-TW")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--memory", help="translation memory JSONL consulted before the fake backends")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-p95-ms", type=float, help="exit with status 1 when caption p95 exceeds this")
+    args = parser.parse_args(argv)
+
+    report = run_replay(
+        load_events(args.events),
+        speed=args.speed,
+        backends=dict(args.backend),
+        primary=args.primary,
+        languages=tuple(args.languages.split(",")),
+        seed=args.seed,
+        memory_path=args.memory
+    )
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        caption, final = report["caption_latency"], report["final_latency"]
+        print(f"events: {report['events']}, utterances: {report['utterances']}, elapsed: {report['elapsed_s']}s")
+        print(f"caption latency ms: p50 {caption['p50_ms']}  p95 {caption['p95_ms']}  p99 {caption['p99_ms']}  (n={caption['count']})")
+        print(f"final latency ms:   p50 {final['p50_ms']}  p95 {final['p95_ms']}  p99 {final['p99_ms']}  (n={final['count']})")
+        print(f"backend calls per utterance: {report['backend_calls_per_utterance']}  {report['backend_calls']}")
+        print(f"cache hit rate: {report['cache_hit_rate']}  ({report['translation_requests']} requests)")
+        print(f"cache tiers: {report['cache']}")
+        print(f"emits: {report['emits']} ({report['emits_per_second']}/s)")
+        print(f"partial policy: {report['partial_policy']}")
+        if report["memory"]:
+            print(f"translation memory: {report['memory']}")
+
+    p95 = report["caption_latency"]["p95_ms"]
+    if args.max_p95_ms is not None and p95 is not None and p95 > args.max_p95_ms:
+        print(f"caption p95 {p95}ms exceeds {args.max_p95_ms}ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
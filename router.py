@@ -0,0 +1,179 @@
+import time
+from collections import deque
+
+from metrics import percentile
+
+# 熔斷器狀態
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    單一翻譯器的熔斷器
+    連續失敗達門檻後斷開，冷卻時間過後進入半開狀態，只放行一個探測請求
+    """
+    def __init__(self, failure_threshold=3, reset_timeout=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started = None
+
+    def available(self, peek=False):
+        """是否可以送出請求；冷卻結束時轉為半開狀態，peek 為 True 時只檢查，不改變狀態"""
+        if self.state == OPEN and self.clock() - self.opened_at >= self.reset_timeout:
+            if peek:
+                return True
+            self.state = HALF_OPEN
+            self.probe_started = None
+        if self.state == HALF_OPEN:
+            # 探測請求遲遲沒有結果時允許重新探測
+            return self.probe_started is None or self.clock() - self.probe_started >= self.reset_timeout
+        return self.state == CLOSED
+
+    def acquire(self):
+        """送出請求前呼叫，半開狀態下標記探測請求"""
+        if self.state == HALF_OPEN:
+            self.probe_started = self.clock()
+
+    def release(self):
+        """取得的探測請求沒有送出時呼叫，讓下一個請求可以立即探測"""
+        if self.state == HALF_OPEN:
+            self.probe_started = None
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self.probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = OPEN
+            self.opened_at = self.clock()
+            self.probe_started = None
+
+
+class BackendHealth:
+    """
+    翻譯器健康度：EWMA 延遲與錯誤率，並保留近期成功延遲的滑動視窗供百分位計算
+    """
+    def __init__(self, alpha=0.2, window=200):
+        self.alpha = alpha
+        self.latency = None
+        self.error_rate = 0.0
+        self.samples = deque(maxlen=window)
+        self.successes = 0
+        self.failures = 0
+
+    def record(self, latency, ok):
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.successes += 1
+            self.samples.append(latency)
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency += self.alpha * (latency - self.latency)
+        else:
+            self.failures += 1
+
+    def percentile(self, q):
+        return percentile(self.samples, q)
+
+
+class AdaptiveRouter:
+    """
+    依延遲與錯誤率自動選擇翻譯器的路由器
+    只在事件循環上使用，不需要鎖
+    """
+    def __init__(self, primary, fallback_order, failure_threshold=3, reset_timeout=30.0,
+                 switch_margin=0.2, error_penalty=4.0, explore_interval=30.0, clock=time.monotonic):
+        self.primary = primary
+        self.clock = clock
+        self.explore_interval = explore_interval
+        self.fallback_order = fallback_order
+        self.switch_margin = switch_margin
+        self.error_penalty = error_penalty
+        self.backends = [primary] + list(fallback_order.get(primary, []))
+        self.breakers = {
+            name: CircuitBreaker(failure_threshold, reset_timeout, clock)
+            for name in self.backends
+        }
+        self.health = {name: BackendHealth() for name in self.backends}
+        self.last_attempt = {name: 0.0 for name in self.backends}
+
+    def score(self, backend):
+        """分數越低越好：EWMA 延遲乘上錯誤率懲罰，設定的主要翻譯器享有切換門檻"""
+        health = self.health[backend]
+        if health.latency is None:
+            return None
+        score = health.latency * (1.0 + self.error_penalty * health.error_rate)
+        if backend == self.primary:
+            score /= 1.0 + self.switch_margin
+        return score
+
+    def route(self, peek=False):
+        """
+        回傳依序嘗試的翻譯器清單：可用的翻譯器依分數排序（尚無樣本者依設定順序排在後面），
+        全部斷開時仍回傳設定順序作為最後手段；peek 為 True 時不改變熔斷器狀態，供其他執行緒檢視
+        """
+        available = [name for name in self.backends if self.breakers[name].available(peek)]
+        if not available:
+            return list(self.backends)
+        scored = [name for name in available if self.score(name) is not None]
+        unscored = [name for name in available if self.score(name) is None]
+        # 主要翻譯器尚無樣本時維持設定順序，避免啟動時偏離設定
+        if self.primary in unscored:
+            return available
+        ordered = sorted(scored, key=self.score) + unscored
+        # 主要翻譯器被取代一段時間後，讓它重新嘗試一次以更新延遲資料
+        if (ordered[0] != self.primary and self.primary in ordered
+                and self.clock() - self.last_attempt[self.primary] >= self.explore_interval):
+            ordered.remove(self.primary)
+            ordered.insert(0, self.primary)
+        return ordered
+
+    def acquire(self, backend):
+        """送出請求前呼叫"""
+        if backend in self.breakers:
+            self.breakers[backend].acquire()
+            self.last_attempt[backend] = self.clock()
+
+    def release(self, backend):
+        """acquire 後請求沒有送出（例如對沖請求在批次送出前被取消）時呼叫"""
+        if backend in self.breakers:
+            self.breakers[backend].release()
+
+    def record(self, backend, latency, ok):
+        """記錄一次呼叫的結果"""
+        if backend not in self.health:
+            return
+        self.health[backend].record(latency, ok)
+        if ok:
+            self.breakers[backend].record_success()
+        else:
+            self.breakers[backend].record_failure()
+
+    def snapshot(self):
+        """路由狀態快照，供檢視；唯讀，可在事件循環以外的執行緒呼叫"""
+        return {
+            "primary": self.primary,
+            "route": self.route(peek=True),
+            "backends": {
+                name: {
+                    "state": self.breakers[name].state,
+                    "consecutive_failures": self.breakers[name].failures,
+                    "ewma_latency": self.health[name].latency,
+                    "ewma_error_rate": self.health[name].error_rate,
+                    "successes": self.health[name].successes,
+                    "failures": self.health[name].failures,
+                    "score": self.score(name),
+                }
+                for name in self.backends
+            },
+        }
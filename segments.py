@@ -0,0 +1,189 @@
+import json
+import os
+import struct
+
+from logs import logger
+
+# 索引記錄：語句 ID、開始與結束時間（秒）、該語句在 JSONL 檔中的位元組位移
+INDEX_RECORD = struct.Struct("<QddQ")
+
+# 匯出格式
+FORMATS = {
+    "srt": "application/x-subrip",
+    "vtt": "text/vtt",
+    "json": "application/json",
+}
+
+
+def index_path(path):
+    """語句檔對應的索引檔路徑"""
+    return os.path.splitext(path)[0] + ".idx"
+
+
+class SegmentStore:
+    """
+    只附加的語句存放區（由 TranscriptWriter 的背景執行緒寫入）
+    每個已完成的語句以一行 JSON 寫入 .jsonl（原文與各語言譯文在同一筆，以語句 ID 對齊），
+    並在 .idx 附加一筆固定長度的索引記錄，匯出時以二分搜尋定位時間範圍，不需讀入整個檔案；
+    同一檔案內的時間保持遞增，場次重新開始時接續前一次的結束時間
+    """
+    def __init__(self):
+        self.files = {}  # {路徑: (語句檔, 索引檔)}
+        self.positions = {}  # {路徑: [下一個語句 ID, 檔案位移, 最後結束時間, 時間平移]}
+
+    def write_batch(self, path, records):
+        """寫入一批語句，records 為 {"start", "end", "language", "text", "translations"}"""
+        data, index = self._open(path)
+        position = self.positions[path]
+        lines, entries = [], []
+        for record in records:
+            next_id, offset, last_end, shift = position
+            # 時間倒退（場次重新開始）時平移到前一語句之後
+            if record["start"] + shift < last_end:
+                shift = last_end - record["start"]
+            start = round(record["start"] + shift, 3)
+            end = round(max(record["end"] + shift, start), 3)
+            segment = {"id": next_id, **record, "start": start, "end": end}
+            line = json.dumps(segment, ensure_ascii=False).encode() + b"\n"
+            lines.append(line)
+            entries.append(INDEX_RECORD.pack(next_id, start, end, offset))
+            position[:] = [next_id + 1, offset + len(line), end, shift]
+        # 先寫語句再寫索引，索引中的每筆記錄都指向完整的一行
+        data.write(b"".join(lines))
+        data.flush()
+        index.write(b"".join(entries))
+        index.flush()
+
+    def _open(self, path):
+        current = self.files.get(path)
+        if current:
+            return current
+        for data, index in self.files.values():
+            data.close()
+            index.close()
+        self.files.clear()
+        self.positions.clear()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.positions[path] = self._recover(path)
+        self.files[path] = (open(path, "ab"), open(index_path(path), "ab"))
+        return self.files[path]
+
+    @staticmethod
+    def _recover(path):
+        """
+        檢查既有檔案：截掉不完整的索引記錄與未寫完的最後一行，補上索引中缺少的語句
+        回傳寫入位置 [下一個語句 ID, 檔案位移, 最後結束時間, 0]
+        """
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        idx = index_path(path)
+        index_size = os.path.getsize(idx) if os.path.exists(idx) else 0
+        count = index_size // INDEX_RECORD.size
+        next_id, offset, last_end = 0, 0, 0.0
+        with open(idx, "ab+") as index:
+            index.truncate(count * INDEX_RECORD.size)
+            if count:
+                index.seek((count - 1) * INDEX_RECORD.size)
+                segment_id, _, last_end, last_offset = INDEX_RECORD.unpack(index.read(INDEX_RECORD.size))
+                next_id = segment_id + 1
+                with open(path, "rb") as data:
+                    data.seek(last_offset)
+                    offset = last_offset + len(data.readline())
+            if offset < size:
+                recovered = 0
+                with open(path, "rb+") as data:
+                    data.seek(offset)
+                    for line in data:
+                        if not line.endswith(b"\n"):
+                            break
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            break
+                        index.write(INDEX_RECORD.pack(next_id, record["start"], record["end"], offset))
+                        next_id, offset, last_end = next_id + 1, offset + len(line), record["end"]
+                        recovered += 1
+                    data.truncate(offset)
+                logger.warning(f"Segment store {path} recovered {recovered} unindexed segments")
+        return [next_id, offset, last_end, 0.0]
+
+    def close(self):
+        for data, index in self.files.values():
+            data.close()
+            index.close()
+        self.files.clear()
+
+
+def _find_start(index, count, seconds):
+    """第一個結束時間晚於 seconds 的索引記錄位置（二分搜尋）"""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        index.seek(middle * INDEX_RECORD.size)
+        _, _, end, _ = INDEX_RECORD.unpack(index.read(INDEX_RECORD.size))
+        if end <= seconds:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def iter_segments(path, start=None, end=None):
+    """依時間先後逐筆讀出 [start, end) 範圍內（含跨越邊界）的語句"""
+    idx = index_path(path)
+    # 只讀取目前已完整寫入的索引記錄，寫入中的檔案也能安全讀取
+    count = os.path.getsize(idx) // INDEX_RECORD.size
+    with open(idx, "rb") as index, open(path, "rb") as data:
+        position = _find_start(index, count, start) if start is not None else 0
+        if position >= count:
+            return
+        index.seek(position * INDEX_RECORD.size)
+        _, _, _, offset = INDEX_RECORD.unpack(index.read(INDEX_RECORD.size))
+        data.seek(offset)
+        for _ in range(count - position):
+            segment = json.loads(data.readline())
+            if end is not None and segment["start"] >= end:
+                return
+            yield segment
+
+
+def _timestamp(seconds, separator):
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3600000)
+    minutes, milliseconds = divmod(milliseconds, 60000)
+    seconds, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+
+def _segment_text(segment, language):
+    """語句在指定語言的文字：原文或譯文，language 為 None 時取原文"""
+    if language is None or segment["language"] == language:
+        return segment["text"]
+    return segment["translations"].get(language)
+
+
+def export_segments(path, fmt, start=None, end=None, language=None):
+    """
+    以產生器逐段輸出 SRT、WebVTT 或 JSON 陣列，字幕編號為語句 ID + 1，
+    因此同一時間範圍的原文與譯文字幕編號一致；沒有該語言譯文的語句略過
+    """
+    if fmt == "vtt":
+        yield "WEBVTT\n\n"
+    elif fmt == "json":
+        yield "["
+    first = True
+    for segment in iter_segments(path, start, end):
+        if fmt == "json":
+            yield ("\n" if first else ",\n") + json.dumps(segment, ensure_ascii=False)
+            first = False
+            continue
+        text = _segment_text(segment, language)
+        if not text:
+            continue
+        separator = "," if fmt == "srt" else "."
+        yield (f"{segment['id'] + 1}\n"
+               f"{_timestamp(segment['start'], separator)} --> {_timestamp(segment['end'], separator)}\n"
+               f"{text}\n\n")
+    if fmt == "json":
+        yield "\n]\n"
@@ -0,0 +1,108 @@
+import re
+
+# 句子切分規則，句尾標點後切開
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?。！？])\s*')
+
+# 每個段落最多的句子數
+MAX_SENTENCES_PER_PARAGRAPH = 4
+
+
+def split_into_sentences(text):
+    """依句尾標點切分句子，並移除空白句"""
+    sentences = SENTENCE_PATTERN.split(text)
+    return [s for s in sentences if s.strip()]
+
+
+def layout_paragraphs(current_sentences, prev_text_sentences, prev_prev_text_sentences):
+    """
+    將當前句子與已完成段落的句子整理為 [前前段, 前段, 當前段]
+    當前句子超過段落上限時，前面的句子會被推入前段與前前段
+    """
+    def join_sentences(sentences):
+        return ''.join(sentences)
+
+    prev_prev_sentences = []
+    prev_sentences = []
+
+    if len(current_sentences) > MAX_SENTENCES_PER_PARAGRAPH:
+        sentences_to_move = current_sentences[:MAX_SENTENCES_PER_PARAGRAPH]
+        current_sentences = current_sentences[MAX_SENTENCES_PER_PARAGRAPH:]
+        prev_sentences.extend(sentences_to_move)
+
+        if len(prev_sentences) > MAX_SENTENCES_PER_PARAGRAPH:
+            num_extra = len(prev_sentences) - MAX_SENTENCES_PER_PARAGRAPH
+            extra_sentences = prev_sentences[:num_extra]
+            prev_sentences = prev_sentences[num_extra:]
+
+            prev_prev_sentences.extend(extra_sentences)
+
+            if len(prev_prev_sentences) > MAX_SENTENCES_PER_PARAGRAPH:
+                prev_prev_sentences = prev_prev_sentences[-MAX_SENTENCES_PER_PARAGRAPH:]
+        else:
+            prev_prev_sentences = prev_text_sentences
+    else:
+        prev_sentences = prev_text_sentences
+        prev_prev_sentences = prev_prev_text_sentences
+
+    return [
+        join_sentences(prev_prev_sentences[-MAX_SENTENCES_PER_PARAGRAPH:]),
+        join_sentences(prev_sentences[-MAX_SENTENCES_PER_PARAGRAPH:]),
+        join_sentences(current_sentences)
+    ]
+
+
+class SentenceBuffer:
+    """
+    增量句子切分狀態
+    已完成段落的句子只在最終結果時切分一次；當前部分結果記住已結束句子的前綴，
+    新的部分結果延續同一前綴時只掃描新增的字元
+    """
+    def __init__(self):
+        self.completed = {"mix": [], "prev_prev": []}
+        self.reset_partial()
+
+    def commit(self, mix_text, prev_prev_text):
+        """最終結果時更新已完成段落的句子，並重置部分結果狀態"""
+        self.completed = {
+            "mix": split_into_sentences(mix_text),
+            "prev_prev": split_into_sentences(prev_prev_text),
+        }
+        self.reset_partial()
+
+    def reset_partial(self):
+        self.partial_text = ""
+        self.closed_prefix = ""  # 最後一個句子邊界（句尾標點）之前的文字
+        self.closed_sentences = []
+        self.sentences = []
+
+    def partial_sentences(self, text):
+        """回傳部分結果的句子清單，結果與 split_into_sentences(text) 相同"""
+        if text == self.partial_text:
+            return self.sentences
+        if not text.startswith(self.closed_prefix):
+            self.reset_partial()
+
+        # 邊界後的空白在完整切分時會被吃掉，這裡直接略過；文字開頭的空白則保留
+        start = len(self.closed_prefix)
+        remainder = text[start:]
+        stripped = remainder.lstrip() if start else remainder
+        offset = start + len(remainder) - len(stripped)
+
+        new_sentences = []
+        piece_start = 0
+        last_boundary = None
+        for match in SENTENCE_PATTERN.finditer(stripped):
+            piece = stripped[piece_start:match.start()]
+            if piece.strip():
+                new_sentences.append(piece)
+            piece_start = match.end()
+            last_boundary = match.start()
+
+        if last_boundary is not None:
+            self.closed_prefix = text[:offset + last_boundary]
+            self.closed_sentences = self.closed_sentences + new_sentences
+        tail = stripped[piece_start:]
+
+        self.partial_text = text
+        self.sentences = self.closed_sentences + ([tail] if tail.strip() else [])
+        return self.sentences
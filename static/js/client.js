@@ -1,9 +1,19 @@
 document.addEventListener("DOMContentLoaded", function() {  
     console.log("Socket.IO client script loaded");  
     let socket = io();  
+    // 場次 ID 由網址參數 ?session= 指定，預設為 default
+    const params = new URLSearchParams(window.location.search);
+    const sessionId = params.get('session') || 'default';
+    // 字幕語言由 ?lang= 指定（例如 ja-JP），省略時顯示語言對的混合字幕
+    const trackLanguage = params.get('lang');
   
     socket.on('connect', function() {  
         console.log("Connected to server");  
+        // 伺服器在 join 後立即送出完整快照，收到前忽略增量訊息；ack 表示每則字幕處理後回覆確認，
+        // 伺服器依確認控制傳送速度，來不及處理的部分結果在伺服器端合併
+        lastSeq = null;
+        resyncPending = true;
+        socket.emit('join', { session_id: sessionId, language: trackLanguage, ack: true });
 
         setInterval(function() {
             socket.emit('ping');
@@ -23,13 +33,9 @@ document.addEventListener("DOMContentLoaded", function() {
         let contentDiv = document.getElementById('content');  
   
         contentDiv.innerHTML = content; 
+        delete contentDiv.dataset.segmented;
 
-        contentDiv.classList.remove('zh', 'en');  
-        if (lang === 'zh-TW' || lang === 'zh') {  
-            contentDiv.classList.add('en');  
-        } else if (lang === 'en-US' || lang === 'en') {  
-            contentDiv.classList.add('zh');  
-        }
+        setLanguageClass(contentDiv, lang);
 
         if (contentDiv.scrollHeight > contentDiv.clientHeight) {  
             contentDiv.scrollTop = contentDiv.scrollHeight;  
@@ -48,13 +54,110 @@ document.addEventListener("DOMContentLoaded", function() {
     }  
 
     const debouncedUpdateContent = debounce(updateContent, 100);  
+
+    // 增量字幕協定狀態：目前的段落與最後套用的序號
+    let segments = [];
+    let lastSeq = null;
+    let resyncPending = false;
+
+    function setLanguageClass(contentDiv, lang) {
+        contentDiv.classList.remove('zh', 'en');  
+        // 單一語言字幕軌的 lang 為顯示語言；混合字幕的 lang 為識別語言，顯示的是另一個語言
+        if (trackLanguage) {
+            if (lang.startsWith('zh')) {
+                contentDiv.classList.add('zh');
+            } else if (lang.startsWith('en')) {
+                contentDiv.classList.add('en');
+            }
+            return;
+        }
+        if (lang === 'zh-TW' || lang === 'zh') {  
+            contentDiv.classList.add('en');  
+        } else if (lang === 'en-US' || lang === 'en') {  
+            contentDiv.classList.add('zh');  
+        }
+    }
+
+    function requestResync() {
+        if (!resyncPending) {
+            resyncPending = true;
+            socket.emit('caption_resync', { session_id: sessionId, language: trackLanguage });
+        }
+    }
+
+    function applyDelta(msg) {
+        if (msg.full) {
+            segments = msg.segments.slice();
+            resyncPending = false;
+        } else {
+            if (resyncPending || (lastSeq !== null && msg.seq <= lastSeq)) {
+                return;
+            }
+            // 伺服器合併的增量訊息涵蓋序號 first 到 seq
+            let first = msg.first !== undefined ? msg.first : msg.seq;
+            if (lastSeq === null || first !== lastSeq + 1) {
+                requestResync();
+                return;
+            }
+            // 保留前 base 段，第 base 段保留前 keep 個字元後接上新內容；
+            // keep 以 Unicode 字元（code point）計算，與伺服器的 Python 字串相同，不可直接以 UTF-16 單元切割
+            let kept = segments.slice(0, msg.base);
+            if (msg.segments.length) {
+                let prefix = Array.from(segments[msg.base] || '').slice(0, msg.keep).join('');
+                kept.push(prefix + msg.segments[0]);
+                kept = kept.concat(msg.segments.slice(1));
+            }
+            segments = kept;
+        }
+        lastSeq = msg.seq;
+        renderSegments(msg.lang);
+    }
+
+    function renderSegments(lang) {
+        let contentDiv = document.getElementById('content');
+        if (!contentDiv.dataset.segmented) {
+            contentDiv.textContent = '';
+            contentDiv.dataset.segmented = 'true';
+        }
+        // 只更新內容有變動的段落節點
+        let nodes = contentDiv.children;
+        for (let i = 0; i < segments.length; i++) {
+            let node = nodes[i];
+            if (!node) {
+                node = document.createElement('div');
+                node.className = 'segment';
+                contentDiv.appendChild(node);
+            }
+            if (node.textContent !== segments[i]) {
+                node.textContent = segments[i];
+            }
+        }
+        while (nodes.length > segments.length) {
+            contentDiv.removeChild(contentDiv.lastChild);
+        }
+
+        setLanguageClass(contentDiv, lang);
+        if (contentDiv.scrollHeight > contentDiv.clientHeight) {  
+            contentDiv.scrollTop = contentDiv.scrollHeight;  
+        }  
+    }
+
+    socket.on('caption_delta', function(msg, ack) {
+        applyDelta(msg);
+        if (ack) {
+            ack();
+        }
+    });
   
-    socket.on('update_text', function(msg) {  
+    socket.on('update_text', function(msg, ack) {  
         console.log("Received translated text:", msg.text);  
         let content = msg.text;  
         let lang = msg.lang;  
   
         debouncedUpdateContent(content, lang);  
+        if (ack) {
+            ack();
+        }
     });  
   
     socket.on('disconnect', function() {  
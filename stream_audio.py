@@ -0,0 +1,64 @@
+"""
+將 WAV 檔以即時速度串流到伺服器的 audio_chunk 端點，模擬遠端麥克風
+WAV 格式需與 app.AUDIO_INGEST_FORMAT 相同（預設 16 kHz、16 位元、單聲道）
+
+用法：
+    curl -X POST http://localhost:5015/sessions -H "Content-Type: application/json" \
+         -d '{"session_id": "remote", "audio": "stream"}'
+    python stream_audio.py data/talk.wav --session remote
+"""
+import argparse
+import time
+import wave
+
+import socketio
+
+
+def stream(url, session_id, path, chunk_ms=100, speed=1.0):
+    client = socketio.Client()
+    client.connect(url)
+    dropped_chunks = 0
+    try:
+        with wave.open(path, 'rb') as wav:
+            frames = wav.getframerate() * chunk_ms // 1000
+            started = time.monotonic()
+            sent_seconds = 0.0
+            while True:
+                data = wav.readframes(frames)
+                if not data:
+                    break
+                # 以 ack 做流量控制：等待伺服器寫入緩衝區後才送出下一段
+                ack = client.call("audio_chunk", {"session_id": session_id, "audio": data}, timeout=10)
+                if not ack.get("accepted"):
+                    dropped_chunks += 1
+                    if "error" in ack:
+                        raise RuntimeError(ack["error"])
+                sent_seconds += chunk_ms / 1000
+                # 緩衝區接近滿時多等一段，其餘時間依即時速度傳送
+                if (ack.get("fill") or 0.0) > 0.8:
+                    time.sleep(chunk_ms / 1000)
+                if speed:
+                    delay = started + sent_seconds / speed - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+        client.emit("audio_end", {"session_id": session_id})
+        time.sleep(0.5)
+    finally:
+        client.disconnect()
+    return dropped_chunks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream a WAV file to a LiveScribe audio_chunk endpoint")
+    parser.add_argument("path", help="16 kHz 16-bit mono WAV file")
+    parser.add_argument("--url", default="http://localhost:5015")
+    parser.add_argument("--session", default="default")
+    parser.add_argument("--chunk-ms", type=int, default=100)
+    parser.add_argument("--speed", type=float, default=1.0, help="0 = send as fast as acks allow")
+    args = parser.parse_args()
+    dropped = stream(args.url, args.session, args.path, args.chunk_ms, args.speed)
+    print(f"Finished streaming {args.path}, {dropped} chunks reported drops")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+
+from cache import CacheKey, PersistentTranslationCache, TranslationCache
+
+
+def key(text):
+    return CacheKey(text, "en", "zh-Hant", "Google")
+
+
+def row(cache, text):
+    with cache.lock:
+        return cache.conn.execute(
+            "SELECT value, hits FROM translations WHERE text = ?", (text,)
+        ).fetchone()
+
+
+def test_writes_and_hits_are_batched_on_the_writer_thread(tmp_path):
+    cache = PersistentTranslationCache(str(tmp_path / "cache.sqlite3"))
+    try:
+        for i in range(10):
+            cache.set(key(f"text {i}"), f"譯文 {i}")
+        cache.set(key("text 0"), "新譯文")
+        cache.flush()
+        assert cache.get(key("text 0")) == "新譯文"
+        assert cache.get(key("text 0")) == "新譯文"
+        assert cache.get(key("missing")) is None
+        cache.flush()
+        assert row(cache, "text 0") == ("新譯文", 2)
+        assert cache.size == 10
+        assert cache.stats["writes"] == 13
+    finally:
+        cache.close()
+
+
+def test_expired_entries_are_deleted_by_the_writer(tmp_path):
+    cache = PersistentTranslationCache(str(tmp_path / "cache.sqlite3"), ttl=-1)
+    try:
+        cache.set(key("old"), "舊譯文")
+        cache.flush()
+        assert cache.get(key("old")) is None
+        cache.flush()
+        assert row(cache, "old") is None
+        assert (cache.size, cache.evictions) == (0, 1)
+    finally:
+        cache.close()
+
+
+def test_least_recently_accessed_entries_are_evicted(tmp_path):
+    cache = PersistentTranslationCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    try:
+        for i in range(11):
+            cache.set(key(f"text {i}"), f"譯文 {i}")
+            cache.flush()
+        assert cache.size <= 10
+        assert row(cache, "text 0") is None
+        assert row(cache, "text 10") is not None
+    finally:
+        cache.close()
+
+
+def test_close_writes_pending_entries(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = PersistentTranslationCache(path)
+    cache.set(key("pending"), "待寫入")
+    cache.close()
+    reopened = PersistentTranslationCache(path)
+    try:
+        assert reopened.get(key("pending")) == "待寫入"
+    finally:
+        reopened.close()
+
+
+def test_disk_reads_run_off_the_event_loop(tmp_path):
+    persistent = PersistentTranslationCache(str(tmp_path / "cache.sqlite3"))
+    persistent.set(key("on disk"), "磁碟")
+    persistent.flush()
+    threads = []
+    read = persistent.get
+
+    def get(cache_key):
+        threads.append(threading.get_ident())
+        return read(cache_key)
+
+    persistent.get = get
+    cache = TranslationCache(persistent=persistent, warm_size=0)
+    try:
+        async def main():
+            first = await cache.get(key("On disk."))
+            # 第二次由記憶體層命中
+            second = await cache.get(key("on disk"))
+            return first, second
+
+        assert asyncio.run(main()) == ("磁碟", "磁碟")
+        assert len(threads) == 1 and threads[0] != threading.get_ident()
+        assert cache.get_stats()["disk"]["hits"] == 1
+        assert cache.get_stats()["memory"]["hits"] == 1
+    finally:
+        cache.close()
+
+
+def test_near_duplicate_marker_survives_term_restoration():
+    from app import NearDuplicateHit
+    from memory import TranslationMemory
+    from replay import FakeBackend, ReplayTranslationManager
+
+    memory = TranslationMemory()
+    memory.add_term("en-US", "LiveScribe", {"zh-TW": "即時字幕"})
+    backends = {name: FakeBackend(name, median=0.0, sigma=0.0) for name in ("Google", "Azure", "DeepL")}
+
+    async def main():
+        manager = ReplayTranslationManager("Google", backends, near_duplicate=True, memory=memory)
+        try:
+            exact = await manager.translate("Welcome to the LiveScribe demo today", "en-US", "zh-TW")
+            # 只在句尾延伸的部分結果以近似重複命中，術語換回後仍須保留標記
+            single = await manager.translate("Welcome to the LiveScribe demo today so", "en-US", "zh-TW",
+                                             partial=True)
+            many = await manager.translate_many("Welcome to the LiveScribe demo today so", "en-US",
+                                                ["zh-TW"], partial=True)
+            return exact, single, many["zh-TW"]
+        finally:
+            manager.close()
+
+    exact, single, many = asyncio.run(main())
+    assert "即時字幕" in exact and not isinstance(exact, NearDuplicateHit)
+    assert single == many == exact
+    assert isinstance(single, NearDuplicateHit)
+    assert isinstance(many, NearDuplicateHit)
+
+
+def test_disk_reads_use_the_cache_reader_thread(tmp_path):
+    persistent = PersistentTranslationCache(str(tmp_path / "cache.sqlite3"))
+    persistent.set(key("hello"), "你好")
+    persistent.flush()
+    threads = []
+    get = persistent.get
+
+    def recording_get(cache_key):
+        threads.append(threading.current_thread().name)
+        return get(cache_key)
+
+    persistent.get = recording_get
+    cache = TranslationCache(persistent=persistent, warm_size=0)
+    try:
+        assert asyncio.run(cache.get(key("hello"))) == "你好"
+        assert threads and threads[0].startswith("cache-reader")
+    finally:
+        cache.close()
+
+
+def test_near_duplicate_find_rejects_changes_of_meaning():
+    from cache import NearDuplicateIndex
+
+    index = NearDuplicateIndex()
+    cached = [
+        "good morning everyone and welcome to the show",
+        "please send me the e-mail address today",
+        "please bring the laptop and charger",
+        "we can ship the release today",
+        "the answer to your question is",
+        "the meeting will be in room",
+        "the meeting starts at 5 pm",
+    ]
+    for text in cached:
+        index.add(key(text))
+
+    def find(text):
+        found = index.find(key(text))
+        return found.text if found else None
+
+    # 只在句尾延伸，或只差在空白、撇號與連字號
+    assert find("good morning everyone and welcome to the show so") == cached[0]
+    assert find("please send me the email address today") == cached[1]
+    # 句中增刪、否定、數字
+    assert find("please bring the laptop and a charger") is None
+    assert find("we can't ship the release today") is None
+    assert find("the answer to your question is no") is None
+    assert find("the meeting will be in room 5") is None
+    assert find("the meeting starts at 6 pm") is None
+    assert index.rejected == 5
+    # 太短的文字不做近似查詢
+    index.add(key("ok thanks"))
+    assert find("ok thanks!") is None
@@ -0,0 +1,51 @@
+import random
+
+from captions import CaptionState, apply_delta, merge_deltas
+
+
+def test_keep_counts_code_points_for_astral_characters():
+    state = CaptionState()
+    first = state.update(["字幕 😀 𠀋 abc"], "zh-TW")
+    second = state.update(["字幕 😀 𠀋 abd"], "zh-TW")
+    # keep 以 code point 計算（client.js 以 Array.from 切割），不是 UTF-16 單元
+    assert second["keep"] == len("字幕 😀 𠀋 ab") == 9
+    assert second["segments"] == ["d"]
+    assert apply_delta(apply_delta([], first), second) == ["字幕 😀 𠀋 abd"]
+
+
+def test_merged_deltas_apply_like_the_sequence():
+    rng = random.Random(7)
+    words = ["Hello", "world.", "今天", "天氣", "很好。", "Next", "line", "😀"]
+    for _ in range(200):
+        state = CaptionState()
+        displayed = []
+        frames = []
+        for _ in range(rng.randint(2, 6)):
+            segments = [" ".join(rng.choice(words) for _ in range(rng.randint(1, 4)))
+                        for _ in range(rng.randint(1, 3))]
+            frame = state.update(segments, "zh-TW")
+            if frame:
+                frames.append(frame)
+        if not frames:
+            continue
+        merged = frames[0]
+        expected = apply_delta(displayed, frames[0])
+        for frame in frames[1:]:
+            merged = merge_deltas(merged, frame)
+            expected = apply_delta(expected, frame)
+        assert apply_delta(displayed, merged) == expected
+        assert merged.get("first", merged["seq"]) == frames[0]["seq"]
+
+
+def test_merge_rejects_gaps_and_prefers_snapshots():
+    state = CaptionState()
+    first = state.update(["one"], None)
+    state.update(["one two"], None)
+    third = state.update(["one two three"], None)
+    assert merge_deltas(first, third) is None
+    snapshot = state.snapshot()
+    assert merge_deltas(first, snapshot) is snapshot
+    # 較舊的完整快照與增量合併後仍是完整快照
+    fourth = state.update(["one two three", "four"], None)
+    merged = merge_deltas(snapshot, fourth)
+    assert merged["full"] and merged["segments"] == ["one two three", "four"]
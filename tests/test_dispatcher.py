@@ -0,0 +1,323 @@
+import asyncio
+import time
+
+from dispatcher import TranslationDispatcher
+from router import HALF_OPEN, AdaptiveRouter
+
+
+class FakeClient:
+    """假批次翻譯客戶端：記錄每次批次呼叫的文字，依 results 決定回傳內容"""
+    def __init__(self, name, results=None, error=None, delay=0.0):
+        self.name = name
+        self.__name__ = f"fake_{name}"
+        self.results = results  # 函數 texts -> 結果清單，None 表示逐一回傳譯文
+        self.error = error
+        self.delay = delay
+        self.calls = []
+
+    async def __call__(self, texts, source_lang, target_lang):
+        self.calls.append((list(texts), source_lang, target_lang))
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        if self.results:
+            return self.results(texts)
+        return [f"{self.name}:{target_lang}:{text}" for text in texts]
+
+
+class FakeRouter:
+    def __init__(self):
+        self.records = []
+        self.latencies = []
+        self.released = []
+
+    def record(self, backend, latency, ok):
+        self.records.append((backend, ok))
+        self.latencies.append(latency)
+
+    def release(self, backend):
+        self.released.append(backend)
+
+
+class FakeManager:
+    """與 TranslationManager.translate_with_fallback 相同的並發限制、計時與錯誤處理"""
+    def __init__(self, router=None, max_workers=4):
+        self.router = router or FakeRouter()
+        self.semaphore = asyncio.Semaphore(max_workers)
+
+    async def translate_with_fallback(self, translator_func, texts, source_lang, target_lang):
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                results = await translator_func(texts, source_lang, target_lang)
+            except Exception:
+                results = None
+            return results, time.perf_counter() - start
+
+
+def make_dispatcher(*clients, window=0.02, max_items=16, manager=None):
+    return TranslationDispatcher(
+        manager or FakeManager(), {client.name: client for client in clients}, window=window, max_items=max_items
+    )
+
+
+def test_groups_by_backend_and_language_pair():
+    google, azure = FakeClient("Google"), FakeClient("Azure")
+
+    async def main():
+        dispatcher = make_dispatcher(google, azure)
+        return dispatcher, await asyncio.gather(
+            dispatcher.translate("Google", "hello", "en", "zh"),
+            dispatcher.translate("Google", "world", "en", "zh"),
+            dispatcher.translate("Google", "hello", "en", "ja"),
+            dispatcher.translate("Azure", "hello", "en", "zh"),
+        )
+
+    dispatcher, results = asyncio.run(main())
+    assert results == ["Google:zh:hello", "Google:zh:world", "Google:ja:hello", "Azure:zh:hello"]
+    assert sorted(google.calls) == [(["hello"], "en", "ja"), (["hello", "world"], "en", "zh")]
+    assert azure.calls == [(["hello"], "en", "zh")]
+    assert dispatcher.stats == {"requests": 4, "batches": 3, "batched_texts": 4}
+
+
+def test_window_flushes_requests_arriving_within_it():
+    google = FakeClient("Google")
+
+    async def main():
+        dispatcher = make_dispatcher(google, window=0.05)
+        first = asyncio.ensure_future(dispatcher.translate("Google", "one", "en", "zh"))
+        await asyncio.sleep(0.01)
+        second = asyncio.ensure_future(dispatcher.translate("Google", "two", "en", "zh"))
+        await asyncio.sleep(0)
+        # 時間窗結束前不送出
+        assert google.calls == []
+        await asyncio.gather(first, second)
+        # 時間窗結束後的請求進入新的批次
+        await dispatcher.translate("Google", "three", "en", "zh")
+
+    asyncio.run(main())
+    assert [texts for texts, _, _ in google.calls] == [["one", "two"], ["three"]]
+
+
+def test_max_items_flushes_without_waiting_for_the_window():
+    google = FakeClient("Google")
+
+    async def main():
+        dispatcher = make_dispatcher(google, window=10.0, max_items=3)
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        results = await asyncio.gather(
+            *(dispatcher.translate("Google", f"text {i}", "en", "zh") for i in range(3))
+        )
+        return results, loop.time() - start, dispatcher
+
+    results, elapsed, dispatcher = asyncio.run(main())
+    assert results == [f"Google:zh:text {i}" for i in range(3)]
+    assert elapsed < 1.0
+    assert len(google.calls) == 1
+    assert dispatcher.timers == {}
+
+
+def test_identical_texts_are_sent_once():
+    google = FakeClient("Google")
+
+    async def main():
+        dispatcher = make_dispatcher(google)
+        return await asyncio.gather(
+            dispatcher.translate("Google", "same", "en", "zh"),
+            dispatcher.translate("Google", "other", "en", "zh"),
+            dispatcher.translate("Google", "same", "en", "zh"),
+        )
+
+    results = asyncio.run(main())
+    assert results == ["Google:zh:same", "Google:zh:other", "Google:zh:same"]
+    assert google.calls == [(["same", "other"], "en", "zh")]
+
+
+def test_cancelled_waiter_is_removed_from_pending_batch():
+    google = FakeClient("Google")
+
+    async def main():
+        dispatcher = make_dispatcher(google, window=0.05)
+        kept = asyncio.ensure_future(dispatcher.translate("Google", "kept", "en", "zh"))
+        dropped = asyncio.ensure_future(dispatcher.translate("Google", "dropped", "en", "zh"))
+        await asyncio.sleep(0)
+        dropped.cancel()
+        await asyncio.sleep(0)
+        assert [text for text, _ in dispatcher.pending[("Google", "en", "zh")]] == ["kept"]
+        return await kept, dropped.cancelled()
+
+    result, cancelled = asyncio.run(main())
+    assert (result, cancelled) == ("Google:zh:kept", True)
+    assert google.calls == [(["kept"], "en", "zh")]
+
+
+def test_cancelling_the_only_waiter_sends_nothing():
+    google = FakeClient("Google")
+
+    async def main():
+        dispatcher = make_dispatcher(google, window=0.05)
+        task = asyncio.ensure_future(dispatcher.translate("Google", "gone", "en", "zh"))
+        await asyncio.sleep(0)
+        task.cancel()
+        await asyncio.sleep(0.1)
+        return dispatcher
+
+    dispatcher = asyncio.run(main())
+    assert google.calls == []
+    assert dispatcher.pending == {} and dispatcher.timers == {}
+    assert dispatcher.stats["batches"] == 0
+
+
+def test_partial_results_resolve_each_caller():
+    # 個別文字翻譯失敗（空字串）時只有該呼叫者取得 None
+    google = FakeClient("Google", results=lambda texts: ["" if text == "bad" else text.upper() for text in texts])
+
+    async def main():
+        dispatcher = make_dispatcher(google)
+        results = await asyncio.gather(
+            dispatcher.translate("Google", "good", "en", "zh"),
+            dispatcher.translate("Google", "bad", "en", "zh"),
+        )
+        return results, dispatcher
+
+    results, dispatcher = asyncio.run(main())
+    assert results == ["GOOD", None]
+    assert dispatcher.translation_manager.router.records == [("Google", True)]
+
+
+def test_mismatched_batch_fails_every_caller():
+    # 回傳筆數與文字數不符時無法對應，整批視為失敗
+    google = FakeClient("Google", results=lambda texts: texts[:1])
+
+    async def main():
+        dispatcher = make_dispatcher(google)
+        results = await asyncio.gather(
+            dispatcher.translate("Google", "one", "en", "zh"),
+            dispatcher.translate("Google", "two", "en", "zh"),
+        )
+        return results, dispatcher
+
+    results, dispatcher = asyncio.run(main())
+    assert results == [None, None]
+    assert dispatcher.translation_manager.router.records == [("Google", False)]
+
+
+def test_failed_batch_resolves_every_caller_with_none():
+    google = FakeClient("Google", error=RuntimeError("boom"))
+
+    async def main():
+        dispatcher = make_dispatcher(google)
+        results = await asyncio.gather(
+            dispatcher.translate("Google", "one", "en", "zh"),
+            dispatcher.translate("Google", "two", "en", "zh"),
+        )
+        return results, dispatcher
+
+    results, dispatcher = asyncio.run(main())
+    assert results == [None, None]
+    assert dispatcher.translation_manager.router.records == [("Google", False)]
+
+
+def test_latency_excludes_waiting_for_a_concurrency_slot():
+    google = FakeClient("Google", delay=0.1)
+
+    async def main():
+        dispatcher = make_dispatcher(google, manager=FakeManager(max_workers=1))
+        await asyncio.gather(
+            dispatcher.translate("Google", "one", "en", "zh"),
+            dispatcher.translate("Google", "two", "en", "ja"),
+        )
+        return dispatcher.translation_manager.router.latencies
+
+    latencies = asyncio.run(main())
+    # 第二批等待第一批釋放並發額度約 0.1 秒，不計入延遲
+    assert len(latencies) == 2
+    assert all(0.09 <= latency < 0.15 for latency in latencies)
+
+
+def test_cancelled_probe_is_released():
+    now = [0.0]
+    router = AdaptiveRouter("Google", {"Google": []}, failure_threshold=1, reset_timeout=30.0,
+                            clock=lambda: now[0])
+    router.record("Google", 0.1, False)
+    now[0] = 31.0
+    breaker = router.breakers["Google"]
+    assert breaker.available() and breaker.state == HALF_OPEN
+    google = FakeClient("Google")
+
+    async def main():
+        dispatcher = make_dispatcher(google, window=0.05, manager=FakeManager(router))
+        router.acquire("Google")
+        task = asyncio.ensure_future(dispatcher.translate("Google", "hedge", "en", "zh"))
+        await asyncio.sleep(0)
+        # 探測進行中，其他請求不可使用
+        assert not breaker.available()
+        task.cancel()
+        await asyncio.sleep(0.1)
+
+    asyncio.run(main())
+    assert google.calls == []
+    assert breaker.state == HALF_OPEN and breaker.available()
+
+
+def test_fallback_is_recorded_against_its_own_backend():
+    from replay import FakeBackend, ReplayTranslationManager
+
+    backends = {
+        "Google": FakeBackend("Google", median=0.05, sigma=0.0, error_rate=1.0),
+        "Azure": FakeBackend("Azure", median=0.01, sigma=0.0),
+        "DeepL": FakeBackend("DeepL", median=0.01, sigma=0.0),
+    }
+
+    async def main():
+        manager = ReplayTranslationManager("Google", backends, hedge_budget=0.0)
+        try:
+            return await manager.translate("Good morning everyone", "en-US", "zh-TW"), manager.router
+        finally:
+            manager.close()
+
+    translation, router = asyncio.run(main())
+    assert translation
+    google, azure = router.health["Google"], router.health["Azure"]
+    assert (google.failures, google.successes) == (1, 0)
+    assert (azure.failures, azure.successes) == (0, 1)
+    # 備援的延遲只包含自己的呼叫，不含首選翻譯器失敗前的等待
+    assert azure.latency < 0.04
+
+
+def _hedge_stats(google, azure, hedge_after):
+    from replay import FakeBackend, ReplayTranslationManager
+
+    backends = {
+        "Google": FakeBackend("Google", **google),
+        "Azure": FakeBackend("Azure", **azure),
+        "DeepL": FakeBackend("DeepL", median=0.01, sigma=0.0),
+    }
+
+    async def main():
+        manager = ReplayTranslationManager("Google", backends)
+        manager.hedge_delay = lambda backend: hedge_after
+        try:
+            assert await manager.translate("Good morning everyone", "en-US", "zh-TW")
+            return manager.hedge_stats
+        finally:
+            manager.close()
+
+    return asyncio.run(main())
+
+
+def test_hedge_that_beats_a_pending_primary_is_a_win():
+    stats = _hedge_stats(dict(median=0.3, sigma=0.0), dict(median=0.01, sigma=0.0), hedge_after=0.01)
+    assert (stats["hedged"], stats["hedge_wins"], stats["failovers"]) == (1, 1, 0)
+
+
+def test_fallback_after_the_primary_failed_is_a_failover():
+    # 對沖送出後首選才失敗：對沖結果晚於首選失敗，不算勝出
+    stats = _hedge_stats(dict(median=0.05, sigma=0.0, error_rate=1.0), dict(median=0.2, sigma=0.0),
+                         hedge_after=0.01)
+    assert (stats["hedged"], stats["hedge_wins"], stats["failovers"]) == (1, 0, 1)
+    # 沒有對沖：首選失敗後才改用下一個翻譯器
+    stats = _hedge_stats(dict(median=0.05, sigma=0.0, error_rate=1.0), dict(median=0.01, sigma=0.0),
+                         hedge_after=None)
+    assert (stats["hedged"], stats["hedge_wins"], stats["failovers"]) == (0, 0, 1)
@@ -0,0 +1,29 @@
+import asyncio
+
+import metrics
+from emitter import AsyncEmitter
+
+
+class SlowServer:
+    def __init__(self, delay):
+        self.delay = delay
+        self.sent = []
+
+    async def emit(self, event, data=None, to=None, callback=None):
+        await asyncio.sleep(self.delay)
+        self.sent.append((event, data, to))
+
+
+def test_emit_seconds_cover_the_actual_send():
+    async def run():
+        count, total = metrics.EMIT_SECONDS.count, metrics.EMIT_SECONDS.sum
+        server = SlowServer(0.05)
+        emitter = AsyncEmitter(server, asyncio.get_running_loop())
+        emitter.emit("caption_delta", {"seq": 1}, to="room")
+        emitter.emit("caption_delta", {"seq": 2}, to="room")
+        await emitter.close()
+        assert [data["seq"] for _, data, _ in server.sent] == [1, 2]
+        assert metrics.EMIT_SECONDS.count - count == 2
+        assert metrics.EMIT_SECONDS.sum - total >= 0.09
+
+    asyncio.run(run())
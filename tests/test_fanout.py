@@ -0,0 +1,208 @@
+import asyncio
+import socket
+import threading
+
+from fanout import CAPTIONS, CONTROL, CaptionPublisher, EdgeWorker, LocalBroker
+
+
+class FakeServer:
+    """假 Socket.IO 伺服器：依房間記錄每位客戶端收到的訊息"""
+    def __init__(self):
+        self.rooms = {}
+        self.inboxes = {}
+
+    def connect(self, sid):
+        self.inboxes[sid] = []
+        return self.inboxes[sid]
+
+    async def enter_room(self, sid, room):
+        self.rooms.setdefault(room, set()).add(sid)
+
+    async def emit(self, event, data=None, to=None):
+        recipients = self.rooms.get(to) or ({to} if to in self.inboxes else set())
+        for sid in recipients:
+            self.inboxes[sid].append((event, data))
+
+
+class Captions:
+    """發布端的字幕狀態與字幕軌訂閱（與 app.py 的 subscribe_client、caption_snapshot、unsubscribe_client 相同的角色）"""
+    def __init__(self):
+        self.seq = 0
+        self.tracks = {"fr-FR": set(), "ja-JP": set()}
+        self.threads = set()  # 修改訂閱集合的執行緒
+
+    def subscribe(self, client, data):
+        self.threads.add(threading.get_ident())
+        language = data.get("language")
+        if language in self.tracks:
+            self.tracks[language].add(client)
+            return f"default/{language}"
+        return "default"
+
+    def snapshot(self, data):
+        return {"seq": self.seq, "full": True}
+
+    def unsubscribe(self, client):
+        self.threads.add(threading.get_ident())
+        for subscribers in self.tracks.values():
+            subscribers.discard(client)
+
+    def delta(self):
+        self.seq += 1
+        return {"seq": self.seq}
+
+
+async def wait_for(condition, timeout=5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+
+class Cluster:
+    """行程內的本機代理、發布端與邊緣節點（邊緣節點以假伺服器取代 uvicorn）"""
+    def __init__(self, edge_timeout=30.0):
+        self.edge_timeout = edge_timeout
+        self.captions = Captions()
+        self.edges = {}
+        self.tasks = []
+
+    async def __aenter__(self):
+        self.broker = await LocalBroker().start("127.0.0.1", 0)
+        port = self.broker.server.sockets[0].getsockname()[1]
+        self.url = f"tcp://127.0.0.1:{port}"
+        captions = self.captions
+        self.publisher = CaptionPublisher(None, self.url, captions.subscribe, captions.snapshot,
+                                          captions.unsubscribe, edge_timeout=self.edge_timeout,
+                                          loop=asyncio.get_running_loop())
+        await self.wait_for_subscribers(CONTROL, 1)
+        return self
+
+    async def __aexit__(self, *exc):
+        for task in self.tasks:
+            task.cancel()
+        for edge in self.edges.values():
+            edge.broker.close()
+        self.publisher.close()
+        await self.broker.close()
+
+    async def wait_for_subscribers(self, topic, count):
+        await wait_for(lambda: len(self.broker.subscribers.get(topic.encode(), ())) == count)
+
+    async def add_edge(self, edge_id):
+        edge = EdgeWorker(self.url, edge_id, heartbeat=0.05)
+        edge.sio = FakeServer()
+        edge.loop = asyncio.get_running_loop()
+        edge.queue = asyncio.Queue()
+        edge.broker.start()
+        self.tasks += [asyncio.ensure_future(edge._run()), asyncio.ensure_future(edge._heartbeat())]
+        self.edges[edge_id] = edge
+        await self.wait_for_subscribers(CAPTIONS, len(self.edges))
+        return edge
+
+    async def join(self, edge, sid, **data):
+        """模擬客戶端在邊緣節點 join，等待收到快照"""
+        inbox = edge.sio.connect(sid)
+        edge._control("join", sid, dict(data, session_id="default"))
+        await wait_for(lambda: inbox)
+        return inbox
+
+    def publish(self, room="default"):
+        self.publisher.emit('caption_delta', self.captions.delta(), to=room)
+
+
+def seqs(inbox):
+    return [data["seq"] for event, data in inbox if event == 'caption_delta']
+
+
+def test_caption_reaches_every_edge_once_and_in_order():
+    async def main():
+        async with Cluster() as cluster:
+            first, second = await cluster.add_edge("a"), await cluster.add_edge("b")
+            inboxes = [await cluster.join(edge, sid) for edge in (first, second) for sid in ("s1", "s2")]
+            other = await cluster.join(second, "s3", language="fr-FR")
+            for _ in range(50):
+                cluster.publish()
+            await wait_for(lambda: all(len(inbox) == 51 for inbox in inboxes))
+            # 多等一下，確認沒有重複送達
+            await asyncio.sleep(0.1)
+            return inboxes, other
+
+    inboxes, other = asyncio.run(main())
+    for inbox in inboxes:
+        assert seqs(inbox) == list(range(51))
+        assert inbox[0][1]["full"]
+    # 其他房間的客戶端只收到自己的快照
+    assert seqs(other) == [0]
+
+
+def test_join_and_leave_update_tracks():
+    async def main():
+        async with Cluster() as cluster:
+            edge = await cluster.add_edge("a")
+            await cluster.join(edge, "s1", language="fr-FR")
+            await cluster.join(edge, "s2", language="ja-JP")
+            await cluster.join(edge, "s3")
+            joined = {language: set(clients) for language, clients in cluster.captions.tracks.items()}
+
+            edge._control("leave", "s1")
+            await wait_for(lambda: not cluster.captions.tracks["fr-FR"])
+            left = {language: set(clients) for language, clients in cluster.captions.tracks.items()}
+            edges = cluster.publisher.snapshot_stats()
+            return joined, left, edges, cluster.captions.threads
+
+    joined, left, edges, threads = asyncio.run(main())
+    # 控制訊息在事件循環上處理，不在訊息佇列的讀取執行緒
+    assert threads == {threading.get_ident()}
+    assert joined == {"fr-FR": {"a/s1"}, "ja-JP": {"a/s2"}}
+    assert left == {"fr-FR": set(), "ja-JP": {"a/s2"}}
+    assert (edges["edges"], edges["edge_clients"]) == (1, 2)
+
+
+def test_silent_edge_expires_and_its_clients_are_unsubscribed():
+    async def main():
+        async with Cluster(edge_timeout=0.3) as cluster:
+            edge = await cluster.add_edge("a")
+            await cluster.join(edge, "s1", language="fr-FR")
+            # 邊緣節點停止心跳
+            for task in cluster.tasks[1::2]:
+                task.cancel()
+            await wait_for(lambda: not cluster.captions.tracks["fr-FR"], timeout=3.0)
+            return cluster.publisher.snapshot_stats(), cluster.captions.threads
+
+    stats, threads = asyncio.run(main())
+    assert stats["edges"] == 0
+    assert threads == {threading.get_ident()}
+
+
+def test_edge_that_comes_back_resyncs():
+    async def main():
+        async with Cluster() as cluster:
+            first, second = await cluster.add_edge("a"), await cluster.add_edge("b")
+            dropped, steady = await cluster.join(first, "s1"), await cluster.join(second, "s1")
+            cluster.publish()
+            await wait_for(lambda: seqs(dropped) == [0, 1])
+
+            # 邊緣節點與代理的連線中斷，期間的字幕遺失
+            first.broker.sock.shutdown(socket.SHUT_RDWR)
+            await cluster.wait_for_subscribers(CAPTIONS, 1)
+            for _ in range(3):
+                cluster.publish()
+            await wait_for(lambda: seqs(steady) == [0, 1, 2, 3, 4])
+
+            # 重新連線後，客戶端依序號發現遺漏並要求重新同步
+            await cluster.wait_for_subscribers(CAPTIONS, 2)
+            await cluster.wait_for_subscribers(f"edge.{first.edge_id}", 1)
+            assert seqs(dropped) == [0, 1]
+            first._control("resync", "s1", {"session_id": "default"})
+            await wait_for(lambda: len(dropped) == 3)
+            cluster.publish()
+            await wait_for(lambda: len(dropped) == 4 and len(steady) == 6)
+            return dropped, steady, first.broker.stats
+
+    dropped, steady, stats = asyncio.run(main())
+    assert seqs(dropped) == [0, 1, 4, 5]
+    assert dropped[2][1]["full"]
+    assert seqs(steady) == [0, 1, 2, 3, 4, 5]
+    assert stats["reconnects"] >= 1
@@ -0,0 +1,53 @@
+from history import TranscriptHistory
+
+
+def filled(count, capacity):
+    history = TranscriptHistory(capacity)
+    for i in range(count):
+        history.append(i * 2.0, i * 2.0 + 1.5, "en-US", f"text {i}", {"zh-TW": f"譯文 {i}"})
+    return history
+
+
+def ids(page):
+    return [segment["id"] for segment in page["segments"]]
+
+
+def test_ring_overwrites_the_oldest_segments():
+    history = filled(7, capacity=4)
+    assert (history.size, history.first_id, history.next_id) == (4, 3, 7)
+    page = history.page(limit=10)
+    assert ids(page) == [3, 4, 5, 6]
+    assert [segment["text"] for segment in page["segments"]] == ["text 3", "text 4", "text 5", "text 6"]
+    assert page["segments"][0]["translations"] == {"zh-TW": "譯文 3"}
+    assert page["next"] is None and page["prev"] is None
+
+
+def test_cursors_page_forward_and_back():
+    history = filled(10, capacity=8)
+    newest = history.page(limit=3)
+    assert ids(newest) == [7, 8, 9]
+    assert (newest["next"], newest["prev"]) == (None, 7)
+
+    older = history.page(before=newest["prev"], limit=3)
+    assert ids(older) == [4, 5, 6]
+    oldest = history.page(before=older["prev"], limit=3)
+    # 只剩 2 與 3 仍保留
+    assert ids(oldest) == [2, 3]
+    assert oldest["prev"] is None
+
+    forward = history.page(after=oldest["segments"][-1]["id"], limit=3)
+    assert ids(forward) == [4, 5, 6]
+    assert forward["next"] == 6
+    assert ids(history.page(after=forward["next"], limit=5)) == [7, 8, 9]
+    # 已被覆寫的游標從最舊仍保留的語句繼續
+    assert ids(history.page(after=0, limit=2)) == [2, 3]
+    assert ids(history.page(after=9)) == []
+
+
+def test_since_finds_segments_still_running_at_the_offset():
+    history = filled(10, capacity=8)
+    # 語句 i 的時間為 [2i, 2i + 1.5]
+    assert ids(history.page(since=10.0, limit=2)) == [5, 6]
+    assert ids(history.page(since=11.6, limit=2)) == [6, 7]
+    assert ids(history.page(since=0.0, limit=1)) == [2]
+    assert ids(history.page(since=100.0)) == []
@@ -0,0 +1,87 @@
+import json
+
+import pytest
+
+from memory import TranslationMemory
+
+
+def segment(source, target):
+    return json.dumps({"type": "segment", "source_language": "en-US", "target_language": "zh-TW",
+                       "source": source, "target": target})
+
+
+def term(name, translation):
+    return json.dumps({"type": "term", "source_language": "en-US", "term": name,
+                       "translations": {"zh-TW": translation}})
+
+
+def test_rolled_back_import_leaves_memory_unchanged(tmp_path):
+    path = str(tmp_path / "memory.sqlite3")
+    memory = TranslationMemory(path)
+    memory.add_segment("en-US", "zh-TW", "Good morning.", "早安。")
+
+    def lines():
+        yield segment("Good morning.", "大家早安。")
+        yield segment("See you tomorrow.", "明天見。")
+        yield term("LiveScribe", "即時字幕")
+        raise OSError("upload interrupted")
+
+    with pytest.raises(OSError):
+        memory.import_lines(lines())
+    assert memory.lookup("Good morning.", "en-US", "zh-TW") == "早安。"
+    assert memory.lookup("See you tomorrow.", "en-US", "zh-TW") is None
+    assert memory.protect("LiveScribe is live", "en-US") == ("LiveScribe is live", ())
+    # 與資料庫內容一致
+    reopened = TranslationMemory(path)
+    assert reopened.exact == memory.exact and reopened.normalized == memory.normalized
+    assert reopened.terms == memory.terms
+
+
+def test_committed_import_updates_memory():
+    memory = TranslationMemory()
+    counts = memory.import_lines([
+        segment("Good morning.", "早安。"),
+        segment("good morning", "大家早安。"),
+        term("LiveScribe", "即時字幕"),
+        "not json",
+    ])
+    assert counts == {"segments": 2, "terms": 1, "errors": 1}
+    # 正規化後相同的句段由較新的取代
+    assert memory.lookup("Good morning.", "en-US", "zh-TW") == "大家早安。"
+    assert ("en-US", "zh-TW", "Good morning.") not in memory.exact
+    protected, terms = memory.protect("Welcome to LiveScribe", "en-US")
+    assert terms == ("LiveScribe",)
+    assert memory.restore(protected, terms, "en-US", "zh-TW") == "Welcome to 即時字幕"
+
+
+def test_lookup_prefers_exact_then_normalized_text():
+    memory = TranslationMemory()
+    memory.add_segment("en-US", "zh-TW", "Good morning, everyone.", "大家早安。")
+    assert memory.lookup("Good morning, everyone.", "en-US", "zh-TW") == "大家早安。"
+    # 大小寫、空白與首尾標點不同仍可命中
+    assert memory.lookup("  good   morning, EVERYONE ", "en-US", "zh-TW") == "大家早安。"
+    assert memory.lookup("Good morning everyone", "en-US", "zh-TW") is None
+    assert memory.lookup("Good morning, everyone.", "en-US", "ja-JP") is None
+    assert (memory.stats["exact_hits"], memory.stats["normalized_hits"], memory.stats["misses"]) == (1, 1, 2)
+
+
+def test_terms_are_protected_and_restored_per_target_language():
+    memory = TranslationMemory()
+    memory.add_term("en-US", "Azure Speech", {"zh-TW": "Azure 語音服務", "ja-JP": "Azure Speech"})
+    memory.add_term("en-US", "Azure")
+    memory.add_term("en-US", "LiveScribe")
+
+    protected, terms = memory.protect("LiveScribe uses Azure Speech, not Azure. LiveScribers", "en-US")
+    # 較長的術語優先，英數字術語需在詞界上
+    assert terms == ("LiveScribe", "Azure Speech", "Azure")
+    assert protected == "⟦0⟧ uses ⟦1⟧, not ⟦2⟧. LiveScribers"
+
+    # 翻譯器可能在佔位符內外加入空白
+    translated = "⟦ 0 ⟧ 使用 ⟦1⟧，不是 ⟦2 ⟧。"
+    assert memory.restore(translated, terms, "en-US", "zh-TW") == "LiveScribe 使用 Azure 語音服務，不是 Azure。"
+    assert memory.restore("⟦0⟧ は ⟦1⟧ と ⟦2⟧ を使う", terms, "en-US", "ja-JP") == (
+        "LiveScribe は Azure Speech と Azure を使う")
+    # 遺失的佔位符只計數
+    assert memory.restore("⟦0⟧ 使用語音服務", terms, "en-US", "zh-TW") == "LiveScribe 使用語音服務"
+    assert memory.stats["lost_terms"] == 2
+    assert memory.protect("No glossary here", "fr-FR") == ("No glossary here", ())
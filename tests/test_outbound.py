@@ -0,0 +1,88 @@
+from captions import CaptionState, apply_delta
+from outbound import ClientOutbox
+
+
+class RecordingEmitter:
+    """記錄送出的訊息，callback 保留供測試模擬客戶端 ack"""
+    def __init__(self):
+        self.sent = []
+        self.callbacks = []
+
+    def emit(self, event, data=None, to=None, callback=None):
+        self.sent.append((event, data, to, callback is not None))
+        if callback is not None:
+            self.callbacks.append(callback)
+
+    def ack(self):
+        self.callbacks.pop(0)()
+
+    def take(self):
+        sent, self.sent = self.sent, []
+        return sent
+
+
+def test_window_waits_for_ack_and_coalesces_update_text():
+    emitter = RecordingEmitter()
+    outbox = ClientOutbox(emitter, window=2, depth=8, ack_timeout=60.0)
+    outbox.join("a", "room")
+    outbox.emit("update_text", {"text": "1"}, to="room")
+    outbox.emit("update_text", {"text": "2"}, to="room")
+    # 房間廣播給舊版客戶端，第 1 則一起送給 a，第 2 則用完額度並要求 ack
+    assert emitter.take() == [
+        ("update_text", {"text": "1"}, "room", False),
+        ("update_text", {"text": "1"}, ["a"], False),
+        ("update_text", {"text": "2"}, "room", False),
+        ("update_text", {"text": "2"}, "a", True),
+    ]
+    outbox.emit("update_text", {"text": "3"}, to="room")
+    outbox.emit("update_text", {"text": "4"}, to="room")
+    # 等待 ack 期間只留下最新的完整字幕
+    assert [to for _, _, to, _ in emitter.take()] == ["room", "room"]
+    assert outbox.snapshot_stats()["queued"] == 1 and outbox.stats["coalesced"] == 1
+    emitter.ack()
+    assert emitter.take() == [("update_text", {"text": "4"}, "a", False)]
+    assert outbox.stats["acks"] == 1
+
+
+def test_queued_deltas_merge_into_one_equivalent_frame():
+    emitter = RecordingEmitter()
+    outbox = ClientOutbox(emitter, window=1, depth=8, ack_timeout=60.0)
+    state = CaptionState()
+    outbox.join("a", "room", "caption_delta", state.snapshot())
+    frames = [state.update(segments, "zh-TW") for segments in (
+        ["Hello"], ["Hello wor"], ["Hello world.", "Next"], ["Hello world.", "Next line"],
+    )]
+    for frame in frames:
+        outbox.emit("caption_delta", frame, to="room")
+    emitter.ack()
+    sent = [data for event, data, to, _ in emitter.take() if to == "a"]
+    # 加入時的快照，之後 4 則增量合併為一則
+    assert len(sent) == 2 and sent[1]["first"] == 1 and sent[1]["seq"] == 4
+    assert apply_delta([], sent[1]) == ["Hello world.", "Next line"]
+
+
+def test_overflow_drops_the_oldest_frame_and_leave_stops_delivery():
+    emitter = RecordingEmitter()
+    outbox = ClientOutbox(emitter, window=1, depth=2, ack_timeout=60.0)
+    outbox.join("a", "room")
+    outbox.emit("caption_resync", {"n": 0}, to="room")
+    for n in range(1, 4):
+        outbox.emit("caption_resync" if n % 2 else "status", {"n": n}, to="room")
+    assert outbox.stats["dropped"] == 1
+    emitter.take()
+    emitter.ack()
+    assert [data["n"] for _, data, to, _ in emitter.take() if to == "a"] == [2]
+    outbox.leave("a")
+    outbox.emit("status", {"n": 4}, to="room")
+    assert emitter.take() == [("status", {"n": 4}, "room", False)]
+    assert outbox.snapshot_stats()["clients"] == 0
+
+
+def test_missing_ack_times_out():
+    emitter = RecordingEmitter()
+    outbox = ClientOutbox(emitter, window=1, depth=8, ack_timeout=0.0)
+    outbox.join("a", "room")
+    outbox.emit("status", {"n": 1}, to="room")
+    outbox.emit("status", {"n": 2}, to="room")
+    assert [data["n"] for _, data, to, _ in emitter.take() if to != "room"] == [1, 2]
+    assert outbox.stats["ack_timeouts"] == 1
@@ -0,0 +1,96 @@
+import asyncio
+
+from policy import BUDGET, FEW_WORDS, TOO_SOON, TRANSLATE, UNSTABLE, PartialPolicy, count_words
+
+
+def make_policy(**kwargs):
+    options = dict(min_new_words=1, min_interval=0.0, max_wait=1.0, min_stability=0.0,
+                   budget_per_second=1.0, budget_burst=4.0)
+    options.update(kwargs)
+    return PartialPolicy(**options)
+
+
+def test_final_without_backend_requests_costs_nothing():
+    policy = make_policy()
+    for _ in range(10):
+        policy.final()
+        policy.charge(0, now=0.0)
+    assert policy.tokens == 4.0 and not policy.degraded
+    assert policy.stats["finals"] == 10
+
+
+def test_backend_requests_are_counted_per_session_event():
+    import app
+    from replay import DEFAULT_BACKENDS, FakeBackend, ReplayTranslationManager
+
+    async def main():
+        manager = ReplayTranslationManager(
+            "Google", {name: FakeBackend(name, *spec) for name, spec in DEFAULT_BACKENDS.items()}
+        )
+        counts = []
+        try:
+            for text in ("Good morning everyone.", "Good morning everyone.", "See you tomorrow."):
+                requests = [0]
+                token = app.backend_requests.set(requests)
+                try:
+                    await manager.translate_many(text, "en-US", ["zh-TW", "ja-JP"])
+                finally:
+                    app.backend_requests.reset(token)
+                counts.append(requests[0])
+        finally:
+            manager.close()
+        return counts
+
+    # 第二次為快取命中，不送出請求
+    assert asyncio.run(main()) == [2, 0, 2]
+
+
+def test_decide_checks_the_estimate_but_does_not_charge():
+    policy = make_policy()
+    assert policy.decide("one two", 1.0, cost=3, now=0.0) == TRANSLATE
+    assert policy.tokens == 4.0
+    policy.charge(4, now=0.0)
+    assert policy.degraded
+    assert policy.decide("one two three", 1.0, cost=1, now=0.1) == BUDGET
+
+
+def test_partials_are_gated_by_words_interval_and_stability():
+    policy = make_policy(min_new_words=2, min_interval=0.25, max_wait=1.0, min_stability=0.5,
+                         budget_per_second=0.0)
+    assert policy.decide("one two", 1.0, now=1.0) == TRANSLATE
+    assert policy.decide("one two three four", 1.0, now=1.1) == TOO_SOON
+    assert policy.decide("one two three", 1.0, now=1.4) == FEW_WORDS
+    assert policy.decide("one two three four", 0.2, now=1.5) == UNSTABLE
+    # 超過 max_wait 未翻譯時只看最短間隔
+    assert policy.decide("one two three", 0.2, now=2.1) == TRANSLATE
+    # 中日文每個字視為一個詞
+    assert count_words("今天天氣 good") == 5
+
+
+def test_budget_degrades_to_finals_only_and_recovers_at_half_burst():
+    policy = make_policy(budget_per_second=1.0, budget_burst=4.0, recover=0.5)
+    now, words = 0.0, []
+    while not policy.degraded:
+        now += 0.01
+        words.append("word")
+        assert policy.decide(" ".join(words), 1.0, now=now) == TRANSLATE
+        policy.charge(1, now=now)
+    assert policy.stats["degradations"] == 1
+    # 降級期間即使有令牌也不翻譯部分結果，最終結果照常
+    assert policy.decide("a new sentence", 1.0, now=now + 1.0) == BUDGET
+    policy.final()
+    # 回復到突發上限的一半（2 個令牌）才恢復
+    assert policy.decide("a new sentence", 1.0, now=now + 2.1) == TRANSLATE
+    assert not policy.degraded
+    assert policy.stats["degradations"] == 1
+
+
+def test_decide_needs_enough_tokens_for_every_language():
+    policy = make_policy(budget_per_second=1.0, budget_burst=4.0)
+    policy.charge(2, now=0.0)
+    assert policy.decide("one two", 1.0, cost=3, now=0.0) == BUDGET
+    assert not policy.degraded
+    assert policy.decide("one two", 1.0, cost=2, now=0.0) == TRANSLATE
+    # 預估成本超過突發上限時，滿桶仍可翻譯
+    policy = make_policy(budget_per_second=1.0, budget_burst=4.0)
+    assert policy.decide("one two", 1.0, cost=6, now=0.0) == TRANSLATE
@@ -0,0 +1,37 @@
+from router import CLOSED, HALF_OPEN, OPEN, AdaptiveRouter
+
+
+def make_router(now):
+    return AdaptiveRouter("Google", {"Google": ["Azure"]}, failure_threshold=1, reset_timeout=30.0,
+                          clock=lambda: now[0])
+
+
+def test_snapshot_does_not_change_breakers():
+    now = [0.0]
+    router = make_router(now)
+    router.record("Google", 0.1, False)
+    now[0] = 31.0
+    breaker = router.breakers["Google"]
+    # 冷卻已結束：快照顯示主要翻譯器會被嘗試，但不轉為半開，也不佔用探測額度
+    snapshot = router.snapshot()
+    assert snapshot["route"] == ["Google", "Azure"]
+    assert snapshot["backends"]["Google"]["state"] == OPEN
+    assert breaker.state == OPEN and breaker.probe_started is None
+    assert router.route() == ["Google", "Azure"]
+    assert breaker.state == HALF_OPEN
+
+
+def test_snapshot_does_not_take_the_probe():
+    now = [0.0]
+    router = make_router(now)
+    router.record("Google", 0.1, False)
+    now[0] = 31.0
+    router.route()
+    router.snapshot()
+    breaker = router.breakers["Google"]
+    assert breaker.available()
+    router.acquire("Google")
+    assert not breaker.available()
+    assert router.snapshot()["route"] == ["Azure"]
+    router.record("Google", 0.1, True)
+    assert breaker.state == CLOSED
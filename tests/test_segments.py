@@ -0,0 +1,63 @@
+import json
+import os
+
+from segments import INDEX_RECORD, SegmentStore, export_segments, index_path, iter_segments
+
+
+def record(i):
+    return {"start": i * 2.0, "end": i * 2.0 + 1.5, "language": "en-US",
+            "text": f"text {i}", "translations": {"zh-TW": f"譯文 {i}"}}
+
+
+def write(path, records):
+    store = SegmentStore()
+    store.write_batch(path, records)
+    store.close()
+
+
+def ids(segments):
+    return [segment["id"] for segment in segments]
+
+
+def test_reopen_truncates_torn_writes_and_reindexes_lines(tmp_path):
+    path = str(tmp_path / "segments.jsonl")
+    write(path, [record(i) for i in range(3)])
+    # 索引寫到一半、另有一行已寫入但未建索引，以及一行未寫完
+    with open(index_path(path), "r+b") as index:
+        index.truncate(2 * INDEX_RECORD.size + 5)
+    with open(path, "ab") as data:
+        data.write(json.dumps({"id": 3, **record(3)}).encode() + b"\n")
+        data.write(b'{"id": 4, "start": 8.0')
+
+    write(path, [record(5)])
+    segments = list(iter_segments(path))
+    assert ids(segments) == [0, 1, 2, 3, 4]
+    assert [segment["text"] for segment in segments] == ["text 0", "text 1", "text 2", "text 3", "text 5"]
+    assert os.path.getsize(index_path(path)) == 5 * INDEX_RECORD.size
+    with open(path, "rb") as data:
+        assert all(line.endswith(b"\n") for line in data)
+
+
+def test_restarted_session_continues_after_the_previous_end(tmp_path):
+    path = str(tmp_path / "segments.jsonl")
+    write(path, [record(0), record(1)])
+    write(path, [record(0)])
+    segments = list(iter_segments(path))
+    assert [(segment["start"], segment["end"]) for segment in segments] == [(0.0, 1.5), (2.0, 3.5), (3.5, 5.0)]
+
+
+def test_export_range_uses_the_index(tmp_path):
+    path = str(tmp_path / "segments.jsonl")
+    write(path, [record(i) for i in range(50)])
+    # 語句 i 的時間為 [2i, 2i + 1.5]，跨越起點的語句也包含在內
+    assert ids(iter_segments(path, start=21.0, end=27.0)) == [10, 11, 12, 13]
+    assert ids(iter_segments(path, start=21.6, end=24.0)) == [11]
+    assert ids(iter_segments(path, start=200.0)) == []
+    assert ids(iter_segments(path, end=3.0)) == [0, 1]
+
+    srt = "".join(export_segments(path, "srt", start=20.0, end=22.0, language="zh-TW"))
+    assert srt == "11\n00:00:20,000 --> 00:00:21,500\n譯文 10\n\n"
+    vtt = "".join(export_segments(path, "vtt", start=98.0))
+    assert vtt == "WEBVTT\n\n50\n00:01:38.000 --> 00:01:39.500\ntext 49\n\n"
+    exported = json.loads("".join(export_segments(path, "json", start=96.0)))
+    assert ids(exported) == [48, 49]
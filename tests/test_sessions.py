@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+import app
+from replay import DEFAULT_BACKENDS, FakeBackend, ReplayTranslationManager
+
+
+class NullEmitter:
+    def emit(self, event, data=None, to=None, **kwargs):
+        pass
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not met in time"
+        time.sleep(0.01)
+
+
+def test_session_is_removed_when_the_recognizer_cannot_start(monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "RECOGNIZER", "Missing")
+    monkeypatch.setattr(app, "TRANSLATOR_WARM_UP", False)
+    monkeypatch.chdir(tmp_path)
+    manager = ReplayTranslationManager(
+        "Google", {name: FakeBackend(name, *spec) for name, spec in DEFAULT_BACKENDS.items()}
+    )
+    sessions = app.SessionManager(NullEmitter(), manager)
+    try:
+        service = sessions.create("broken")
+        wait_for(lambda: not sessions.list())
+        assert service.stop_flag
+        wait_for(lambda: not service.transcript_writer.thread.is_alive())
+        # 同一 ID 可以重新建立
+        sessions.create("broken")
+    finally:
+        sessions.shutdown(timeout=5.0)
+
+
+def test_recognizer_is_prepared_off_the_event_loop(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    threads = []
+
+    def init_recognizer(service):
+        threads.append(threading.current_thread())
+        raise RuntimeError("model not found")
+
+    monkeypatch.setattr(app.ContinuousTranslation, "_init_recognizer", init_recognizer)
+    manager = ReplayTranslationManager(
+        "Google", {name: FakeBackend(name, *spec) for name, spec in DEFAULT_BACKENDS.items()}
+    )
+    sessions = app.SessionManager(NullEmitter(), manager)
+    try:
+        sessions.create("slow")
+        wait_for(lambda: not sessions.list())
+        # 載入模型等耗時工作不在所有場次共用的事件循環執行緒上執行
+        assert threads and threads[0] is not sessions.thread
+    finally:
+        sessions.shutdown(timeout=5.0)
+
+
+class RecordingSessions:
+    def __init__(self):
+        self.created = []
+
+    def create(self, **kwargs):
+        self.created.append(kwargs)
+        raise ValueError("not started in tests")
+
+
+def test_create_session_rejects_unsafe_parameters(monkeypatch, tmp_path):
+    sessions = RecordingSessions()
+    monkeypatch.setattr(app, "session_manager", sessions)
+    monkeypatch.setattr(app, "AUDIO_FILE_DIR", str(tmp_path))
+    client = app.app.test_client()
+    for body in (
+        {"session_id": "../../../tmp/evil"},
+        {"session_id": ""},
+        {"languages": "en-US"},
+        {"languages": ["en-US", 3]},
+        {"targets": "ja-JP"},
+        {"file_name": "/etc/passwd"},
+        {"file_name": str(tmp_path / ".." / "talk.wav")},
+    ):
+        assert client.post("/sessions", json=body).status_code == 400, body
+    assert sessions.created == []
+
+    client.post("/sessions", json={"session_id": "room-2", "file_name": str(tmp_path / "talk.wav")})
+    assert sessions.created[0]["session_id"] == "room-2"
+    assert sessions.created[0]["file_name"] == str((tmp_path / "talk.wav").resolve())
+
+
+def test_session_manager_rejects_path_like_ids():
+    # 驗證在建立場次物件之前進行，不需要啟動事件循環
+    sessions = app.SessionManager.__new__(app.SessionManager)
+    with pytest.raises(ValueError):
+        sessions.create("a/b")
@@ -0,0 +1,126 @@
+import os
+import queue
+import time
+from datetime import datetime
+from threading import Thread
+
+from logs import logger
+from metrics import FILE_WRITE_SECONDS, ERRORS
+
+# 結束背景執行緒的哨兵
+_STOP = object()
+
+
+class TranscriptWriter:
+    """
+    緩衝的逐字稿寫入器
+    以有界佇列接收寫入請求，由背景執行緒批次寫入，保持檔案開啟並依日期切換檔案；
+    sinks 中的種類不寫成文字，而是將整批內容交給該物件的 write_batch(路徑, 內容列表)
+    """
+    def __init__(self, path_templates, max_queue=1000, flush_interval=1.0,
+                 flush_bytes=64 * 1024, fsync=False, sinks=None):
+        self.path_templates = path_templates  # {種類: 含 {date} 的路徑範本}
+        self.sinks = sinks or {}  # {種類: 具有 write_batch 與 close 的物件}
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.flush_interval = flush_interval
+        self.flush_bytes = flush_bytes
+        self.fsync = fsync
+        self.handles = {}  # {種類: (路徑, 檔案)}
+        self.buffer = {}  # {種類: (路徑, [內容])}
+        self.buffered_bytes = 0
+        self.stats = {"written": 0, "flushes": 0, "dropped": 0}
+        self.thread = Thread(target=self._run, name="transcript-writer", daemon=True)
+        self.thread.start()
+
+    def path_for(self, kind, date=None):
+        """取得指定種類在某日的檔案路徑"""
+        date = date or datetime.now().strftime('%Y%m%d')
+        return self.path_templates[kind].format(date=date)
+
+    def write(self, kind, content):
+        """排入一筆寫入請求，不會阻塞呼叫者；佇列已滿時丟棄並記錄錯誤"""
+        try:
+            self.queue.put_nowait((kind, self.path_for(kind), content))
+        except queue.Full:
+            self.stats["dropped"] += 1
+            ERRORS.labels("writer_dropped").inc()
+            logger.error(f"Transcript writer queue full, dropped {kind} line")
+
+    def _run(self):
+        """背景執行緒：收集寫入請求，達到大小門檻或時間間隔時寫入檔案"""
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush()
+                break
+            if item is not None:
+                kind, path, content = item
+                buffered_path, chunks = self.buffer.get(kind, (path, []))
+                # 換日時先寫出前一天的內容
+                if buffered_path != path:
+                    self._flush()
+                    chunks = []
+                chunks.append(content)
+                self.buffer[kind] = (path, chunks)
+                self.buffered_bytes += len(content) if isinstance(content, str) else 256
+
+            if self.buffered_bytes >= self.flush_bytes or time.monotonic() >= deadline:
+                self._flush()
+                deadline = time.monotonic() + self.flush_interval
+
+        for _, handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
+        for sink in self.sinks.values():
+            sink.close()
+
+    def _flush(self):
+        """寫出所有緩衝內容"""
+        if not self.buffer:
+            return
+        start = time.perf_counter()
+        for kind, (path, chunks) in self.buffer.items():
+            try:
+                if kind in self.sinks:
+                    self.sinks[kind].write_batch(path, chunks)
+                    self.stats["written"] += len(chunks)
+                    continue
+                handle = self._handle(kind, path)
+                handle.write(''.join(chunks))
+                handle.flush()
+                if self.fsync:
+                    os.fsync(handle.fileno())
+                self.stats["written"] += len(chunks)
+            except Exception as e:
+                ERRORS.labels("writer").inc()
+                logger.error(f"File writing error: {e}")
+        self.stats["flushes"] += 1
+        FILE_WRITE_SECONDS.observe(time.perf_counter() - start)
+        self.buffer.clear()
+        self.buffered_bytes = 0
+
+    def _handle(self, kind, path):
+        """取得保持開啟的檔案，路徑改變（換日）時關閉舊檔"""
+        current = self.handles.get(kind)
+        if current and current[0] == path:
+            return current[1]
+        if current:
+            current[1].close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handle = open(path, 'a', encoding='utf-8')
+        self.handles[kind] = (path, handle)
+        return handle
+
+    def close(self, timeout=5.0):
+        """寫出剩餘內容並關閉檔案"""
+        if not self.thread.is_alive():
+            return
+        self.queue.put(_STOP)
+        self.thread.join(timeout)